@@ -21,6 +21,19 @@ def create_app(config_class=Config):
     jwt.init_app(app)
     bcrypt.init_app(app)
     
+    from app.utils.cache import report_cache
+    report_cache.init_app(app)
+    
+    from app.utils.auth import permission_versions
+    permission_versions.init_app(app)
+    
+    from app.utils.product_lookup import product_lookup
+    product_lookup.init_app(app)
+    
+    # Request timing and the /metrics endpoint
+    from app.utils.metrics import request_metrics
+    request_metrics.init_app(app)
+    
     # CORS configuration - Allow GitHub Pages and localhost
     CORS(app, 
          resources={r"/api/*": {"origins": [
@@ -50,6 +63,12 @@ def create_app(config_class=Config):
     with app.app_context():
         db.create_all()
         
+        # create_all skips tables that already exist, so add any indexes
+        # declared on them since the database was first created
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+        
         # Seed default users only if no users exist
         try:
             from app.models import User
@@ -58,5 +77,29 @@ def create_app(config_class=Config):
                 seed_default_users()
         except Exception as e:
             print(f"Note: Could not seed users: {e}")
+        
+        # Build the daily reporting rollups for databases that predate them
+        try:
+            from app.services.rollups import ensure_rollups
+            ensure_rollups()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Note: Could not build daily rollups: {e}")
+        
+        # Full-text product search: FTS5 on SQLite, a tsvector GIN index on PostgreSQL
+        try:
+            from app.services.search import ensure_search_index
+            app.extensions['product_search'] = ensure_search_index()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Note: Could not build the product search index: {e}")
+        
+        # Warm this worker's SKU lookup so the first scan does not pay for it
+        try:
+            product_lookup.warm()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Note: Could not warm the SKU lookup: {e}")
     
     return app
@@ -112,7 +112,7 @@ class Product(db.Model):
     
     @property
     def estimated_profit(self):
-        return float(self.selling_price - self.total_cost)
+        return float(self.selling_price) - self.total_cost
     
     @property
     def profit_margin(self):
@@ -149,6 +149,10 @@ class InventoryStatus(enum.Enum):
 
 class InventoryLog(db.Model):
     __tablename__ = 'inventory_logs'
+    __table_args__ = (
+        # Per-product movement lookups (slow movers, last movement)
+        db.Index('ix_inventory_logs_product_created', 'product_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
@@ -159,7 +163,7 @@ class InventoryLog(db.Model):
     reference_number = db.Column(db.String(50))
     balance_after = db.Column(db.Integer, default=0)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -205,7 +209,7 @@ class Sale(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
-    sale_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sale_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True)
     salesperson_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     
@@ -223,7 +227,7 @@ class Sale(db.Model):
     
     # Metadata
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -276,12 +280,19 @@ class SaleItem(db.Model):
             'line_total': float(self.line_total)
         }
 
+class InvoiceCounter(db.Model):
+    """Last invoice number issued per day; incremented atomically by app.services.invoices"""
+    __tablename__ = 'invoice_counters'
+    
+    counter_date = db.Column(db.Date, primary_key=True)
+    last_number = db.Column(db.Integer, nullable=False, default=0)
+
 class PayrollRecord(db.Model):
     __tablename__ = 'payroll_records'
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    pay_period_start = db.Column(db.Date, nullable=False)
+    pay_period_start = db.Column(db.Date, nullable=False, index=True)
     pay_period_end = db.Column(db.Date, nullable=False)
     
     # Work Hours
@@ -347,6 +358,47 @@ class PayrollRecord(db.Model):
             'notes': self.notes
         }
 
+class PayrollDisbursement(db.Model):
+    """A batch of payroll records marked paid together; its id is the batch id"""
+    __tablename__ = 'payroll_disbursements'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    payment_date = db.Column(db.Date, nullable=False)
+    payment_method = db.Column(db.String(50))
+    filters = db.Column(db.JSON)  # the selection the batch was made from
+    
+    # Totals of the records in the batch
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    gross_pay = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_deductions = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    net_pay = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    notes = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'payment_date': self.payment_date.isoformat() if self.payment_date else None,
+            'payment_method': self.payment_method,
+            'filters': self.filters,
+            'record_count': self.record_count,
+            'gross_pay': float(self.gross_pay or 0),
+            'total_deductions': float(self.total_deductions or 0),
+            'net_pay': float(self.net_pay or 0),
+            'notes': self.notes,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class PayrollDisbursementItem(db.Model):
+    """Membership of a payroll record in the one disbursement batch that paid it"""
+    __tablename__ = 'payroll_disbursement_items'
+    
+    payroll_record_id = db.Column(db.Integer, db.ForeignKey('payroll_records.id'), primary_key=True)
+    disbursement_id = db.Column(db.Integer, db.ForeignKey('payroll_disbursements.id'), nullable=False, index=True)
+
 class TabPermission(db.Model):
     __tablename__ = 'tab_permissions'
     
@@ -375,6 +427,14 @@ class TabPermission(db.Model):
             } if self.user else None
         }
 
+class PermissionVersion(db.Model):
+    """Per-user counter bumped when a user's role or tab locks change; see app.utils.auth"""
+    __tablename__ = 'permission_versions'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class FileUpload(db.Model):
     """Model to track all uploaded files in the unified storage system"""
     __tablename__ = 'file_uploads'
@@ -413,8 +473,52 @@ class FileUpload(db.Model):
             'processed_at': self.processed_at.isoformat() if self.processed_at else None
         }
 
-# Import financial models to make them available from app.models
+class ImportJob(db.Model):
+    """Progress of a background Excel import of an uploaded file; see app.services.import_jobs"""
+    __tablename__ = 'import_jobs'
+    
+    upload_id = db.Column(db.Integer, db.ForeignKey('file_uploads.id'), primary_key=True)
+    import_type = db.Column(db.String(50), nullable=False)  # products, sales, payroll
+    options = db.Column(db.JSON)  # importer options, e.g. {'existing': 'merge'}
+    rows_total = db.Column(db.Integer)  # known once the sheet has been read
+    rows_processed = db.Column(db.Integer, default=0)
+    counts = db.Column(db.JSON)  # imported/updated/merged/skipped so far
+    error_count = db.Column(db.Integer, default=0)
+    error_preview = db.Column(db.JSON)  # first few row errors
+    error_report_path = db.Column(db.String(500))
+    message = db.Column(db.Text)  # why the job failed
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    upload = db.relationship('FileUpload', backref=db.backref('import_job', uselist=False))
+    
+    def to_dict(self):
+        upload = self.upload
+        return {
+            'id': self.upload_id,
+            'import_type': self.import_type,
+            'status': upload.status,
+            'original_filename': upload.original_filename,
+            'options': self.options or {},
+            'rows_total': self.rows_total,
+            'rows_processed': self.rows_processed or 0,
+            'progress': round((self.rows_processed or 0) * 100 / self.rows_total, 1) if self.rows_total else 0,
+            'records_imported': upload.records_imported or 0,
+            'counts': self.counts or {},
+            'error_count': self.error_count or 0,
+            'errors': self.error_preview or [],
+            'has_error_report': bool(self.error_report_path),
+            'message': self.message,
+            'created_at': upload.created_at.isoformat() if upload.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'processed_at': upload.processed_at.isoformat() if upload.processed_at else None
+        }
+
+# Import financial and reporting models to make them available from app.models
 from app.models.financial import (
     ExpenseCategory, Expense, Asset, Liability, Equity, 
     CashFlow, BudgetTarget, BusinessSettings
 )
+from app.models.reporting import DailyRollup, DailyExpenseRollup, DataVersion, PeriodClose
@@ -19,7 +19,7 @@ class Expense(db.Model):
     __tablename__ = 'expenses'
     
     id = db.Column(db.Integer, primary_key=True)
-    expense_date = db.Column(db.Date, nullable=False)
+    expense_date = db.Column(db.Date, nullable=False, index=True)
     category = db.Column(Enum(ExpenseCategory), nullable=False)
     description = db.Column(db.String(500), nullable=False)
     amount = db.Column(db.Numeric(12, 2), nullable=False)
@@ -136,7 +136,7 @@ class CashFlow(db.Model):
     __tablename__ = 'cash_flows'
     
     id = db.Column(db.Integer, primary_key=True)
-    transaction_date = db.Column(db.Date, nullable=False)
+    transaction_date = db.Column(db.Date, nullable=False, index=True)
     description = db.Column(db.String(500), nullable=False)
     flow_type = db.Column(db.String(20), nullable=False)  # in or out
     category = db.Column(db.String(100))  # operating, investing, financing
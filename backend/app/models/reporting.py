@@ -0,0 +1,84 @@
+from datetime import datetime
+from app import db
+from sqlalchemy import Enum
+from app.models.financial import ExpenseCategory
+
+class DailyRollup(db.Model):
+    """Per-day sales and expense totals maintained alongside the raw tables"""
+    __tablename__ = 'daily_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rollup_date = db.Column(db.Date, unique=True, nullable=False, index=True)
+    
+    # Sales
+    gross_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    items_sold = db.Column(db.Integer, nullable=False, default=0)
+    cogs = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    # Expenses (per-category split lives in daily_expense_rollups)
+    total_expenses = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'date': self.rollup_date.isoformat() if self.rollup_date else None,
+            'gross_sales': float(self.gross_sales),
+            'order_count': self.order_count,
+            'items_sold': self.items_sold,
+            'cogs': float(self.cogs),
+            'total_expenses': float(self.total_expenses),
+            'expense_count': self.expense_count
+        }
+
+class DailyExpenseRollup(db.Model):
+    """Per-day expense totals split by ExpenseCategory"""
+    __tablename__ = 'daily_expense_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('rollup_date', 'category', name='uq_daily_expense_rollup'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rollup_date = db.Column(db.Date, nullable=False, index=True)
+    category = db.Column(Enum(ExpenseCategory), nullable=False)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'date': self.rollup_date.isoformat() if self.rollup_date else None,
+            'category': self.category.value if self.category else None,
+            'amount': float(self.amount),
+            'expense_count': self.expense_count
+        }
+
+class DataVersion(db.Model):
+    """Per-table write counter used to invalidate cached reports across workers"""
+    __tablename__ = 'data_versions'
+    
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PeriodClose(db.Model):
+    """Statement figures of a closed month, written once by close_period and never changed"""
+    __tablename__ = 'period_closes'
+    
+    period_start = db.Column(db.Date, primary_key=True)  # first day of the calendar month
+    income = db.Column(db.JSON, nullable=False)  # revenue, COGS, payroll and expense totals of the month
+    cash_flows = db.Column(db.JSON, nullable=False)  # [[category, flow_type, amount], ...] of the month
+    balances = db.Column(db.JSON, nullable=False)  # inventory, assets, liabilities and equity when closed
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    def to_dict(self):
+        return {
+            'period_start': self.period_start.isoformat(),
+            'year': self.period_start.year,
+            'month': self.period_start.month,
+            'income': self.income,
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None,
+            'closed_by': self.closed_by
+        }
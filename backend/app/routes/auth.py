@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_refresh_token, jwt_required, get_jwt_identity
 from app import db, bcrypt
 from app.models import User, UserRole
+from app.utils.auth import create_user_access_token
 from datetime import timedelta
 
 bp = Blueprint('auth', __name__)
@@ -74,8 +75,9 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is inactive'}), 403
         
-        # Create tokens (identity must be a string)
-        access_token = create_access_token(identity=str(user.id))
+        # Create tokens (identity must be a string); the access token carries
+        # the role and locked tabs so permission checks skip the user lookup
+        access_token = create_user_access_token(user)
         refresh_token = create_refresh_token(identity=str(user.id))
         
         return jsonify({
@@ -94,7 +96,13 @@ def refresh():
     """Refresh access token"""
     try:
         user_id = int(get_jwt_identity())
-        access_token = create_access_token(identity=user_id)
+        user = db.session.get(User, user_id)
+        
+        if not user or not user.is_active:
+            return jsonify({'error': 'Account is inactive'}), 401
+        
+        # Fresh claims, so role and tab lock changes apply from here on
+        access_token = create_user_access_token(user)
         
         return jsonify({
             'access_token': access_token
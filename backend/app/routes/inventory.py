@@ -1,17 +1,20 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
-from app.models import Product, InventoryLog, User, UserRole, InventoryStatus
-from sqlalchemy import func, extract, and_, or_
-from datetime import datetime, timedelta
+from app.models import Product, InventoryLog, UserRole, InventoryStatus
+from app.services.stock import decrement_stock, adjust_stock
+from app.services.inventory import (valuation_totals, valuation_by_category, valuation_rows, lookback_days,
+                                    slow_movers, last_movements)
+from app.utils.auth import permission_required
+from app.utils.cache import cached_report, bump_data_version
+from app.utils.loading import product_options, inventory_log_options
+from app.utils.pagination import wants_cursor, keyset_page, keyset_args, page_meta, InvalidCursor
+from app.utils.periods import in_period
+from sqlalchemy import func, and_, or_
+from datetime import datetime
 
 bp = Blueprint('inventory', __name__)
 
-def check_permission(user_id, required_roles):
-    """Check if user has required role"""
-    user = User.query.get(user_id)
-    return user and user.role in required_roles
-
 
 @bp.route('/logs', methods=['GET'])
 @jwt_required()
@@ -25,7 +28,7 @@ def get_inventory_logs():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        query = InventoryLog.query
+        query = InventoryLog.query.options(*inventory_log_options())
         
         if product_id:
             query = query.filter_by(product_id=product_id)
@@ -39,6 +42,14 @@ def get_inventory_logs():
         if end_date:
             query = query.filter(InventoryLog.created_at <= datetime.fromisoformat(end_date))
         
+        # Opt-in cursor mode: constant cost per page regardless of depth
+        if wants_cursor(request.args):
+            keyset = keyset_page(query, [InventoryLog.created_at, InventoryLog.id], **keyset_args(request.args))
+            return jsonify({
+                'logs': [log.to_dict() for log in keyset['items']],
+                **page_meta(keyset)
+            }), 200
+        
         query = query.order_by(InventoryLog.created_at.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -49,20 +60,17 @@ def get_inventory_logs():
             'current_page': page
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/stock-in', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='inventory')
 def stock_in():
     """Record stock in"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
         if not data.get('product_id') or not data.get('quantity'):
@@ -76,7 +84,7 @@ def stock_in():
         if quantity <= 0:
             return jsonify({'error': 'Quantity must be positive'}), 400
         
-        product.current_stock += quantity
+        balances = adjust_stock([(product.id, quantity)])
         
         log = InventoryLog(
             product_id=product.id,
@@ -84,10 +92,12 @@ def stock_in():
             quantity=quantity,
             stock_date=datetime.now(),
             status=InventoryStatus.COMPLETED,
+            balance_after=balances[product.id],
             notes=data.get('notes', '')
         )
         
         db.session.add(log)
+        bump_data_version('products', 'inventory_logs')
         db.session.commit()
         
         return jsonify({
@@ -102,15 +112,10 @@ def stock_in():
 
 
 @bp.route('/stock-out', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='inventory')
 def stock_out():
     """Record stock out"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
         if not data.get('product_id') or not data.get('quantity'):
@@ -124,10 +129,11 @@ def stock_out():
         if quantity <= 0:
             return jsonify({'error': 'Quantity must be positive'}), 400
         
-        if product.current_stock < quantity:
-            return jsonify({'error': 'Insufficient stock'}), 400
-        
-        product.current_stock -= quantity
+        # Conditional update: only succeeds if the stock is still there
+        balances, failed = decrement_stock([(product.id, quantity)])
+        if failed:
+            db.session.rollback()
+            return jsonify({'error': 'Insufficient stock', 'failed_lines': failed}), 400
         
         log = InventoryLog(
             product_id=product.id,
@@ -135,10 +141,12 @@ def stock_out():
             quantity=quantity,
             stock_date=datetime.now(),
             status=InventoryStatus.COMPLETED,
+            balance_after=balances[product.id],
             notes=data.get('notes', '')
         )
         
         db.session.add(log)
+        bump_data_version('products', 'inventory_logs')
         db.session.commit()
         
         return jsonify({
@@ -157,7 +165,7 @@ def stock_out():
 def get_low_stock():
     """Get products with low or no stock"""
     try:
-        low_stock = Product.query.filter(
+        low_stock = Product.query.options(*product_options()).filter(
             and_(
                 Product.current_stock > 0,
                 Product.current_stock <= Product.low_stock_threshold,
@@ -165,7 +173,7 @@ def get_low_stock():
             )
         ).all()
         
-        out_of_stock = Product.query.filter(
+        out_of_stock = Product.query.options(*product_options()).filter(
             and_(
                 Product.current_stock == 0,
                 Product.track_inventory == True
@@ -185,30 +193,23 @@ def get_low_stock():
 
 @bp.route('/analysis', methods=['GET'])
 @jwt_required()
+@cached_report('products', 'inventory_logs')
 def get_inventory_analysis():
     """Get inventory analysis and valuation"""
     try:
         year = request.args.get('year', datetime.now().year, type=int)
         month = request.args.get('month', datetime.now().month, type=int)
-        
-        # Total inventory value
-        products = Product.query.filter_by(track_inventory=True).all()
-        
-        total_value = sum(float(p.item_cost) * p.current_stock for p in products)
-        total_retail_value = sum(float(p.selling_price) * p.current_stock for p in products)
-        total_items = sum(p.current_stock for p in products)
+        slow_days = lookback_days(request.args.get('slow_days', type=int))
         
         # Inventory turnover
         stock_in_month = db.session.query(func.sum(InventoryLog.quantity)).filter(
             InventoryLog.type == 'in',
-            extract('year', InventoryLog.created_at) == year,
-            extract('month', InventoryLog.created_at) == month
+            in_period(InventoryLog.created_at, year, month)
         ).scalar() or 0
         
         stock_out_month = db.session.query(func.sum(InventoryLog.quantity)).filter(
             InventoryLog.type == 'out',
-            extract('year', InventoryLog.created_at) == year,
-            extract('month', InventoryLog.created_at) == month
+            in_period(InventoryLog.created_at, year, month)
         ).scalar() or 0
         
         # Stock movement by category
@@ -217,8 +218,7 @@ def get_inventory_analysis():
             func.sum(InventoryLog.quantity),
             func.count(InventoryLog.id)
         ).filter(
-            extract('year', InventoryLog.created_at) == year,
-            extract('month', InventoryLog.created_at) == month
+            in_period(InventoryLog.created_at, year, month)
         ).group_by(InventoryLog.type).all()
         
         movement_summary = {
@@ -236,34 +236,17 @@ def get_inventory_analysis():
             func.sum(InventoryLog.quantity).label('total_movement')
         ).join(InventoryLog).filter(
             InventoryLog.type == 'out',
-            extract('year', InventoryLog.created_at) == year,
-            extract('month', InventoryLog.created_at) == month
+            in_period(InventoryLog.created_at, year, month)
         ).group_by(Product.id, Product.name, Product.sku).order_by(
             func.sum(InventoryLog.quantity).desc()
         ).limit(10).all()
         
-        # Slow moving products (no movement in last 30 days)
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        active_product_ids = db.session.query(InventoryLog.product_id).filter(
-            InventoryLog.created_at >= thirty_days_ago
-        ).distinct().all()
-        active_ids = [p[0] for p in active_product_ids]
-        
-        slow_moving = Product.query.filter(
-            ~Product.id.in_(active_ids) if active_ids else True,
-            Product.track_inventory == True,
-            Product.current_stock > 0
-        ).limit(10).all()
+        # Slow moving products (no movement in the lookback window)
+        slow_moving = slow_movers(slow_days).options(*product_options()).order_by(Product.id).limit(10).all()
         
         return jsonify({
             'period': {'year': year, 'month': month},
-            'valuation': {
-                'total_cost_value': round(total_value, 2),
-                'total_retail_value': round(total_retail_value, 2),
-                'potential_profit': round(total_retail_value - total_value, 2),
-                'total_items': total_items,
-                'unique_products': len(products)
-            },
+            'valuation': valuation_totals(),
             'movements': {
                 'stock_in': int(stock_in_month),
                 'stock_out': int(stock_out_month),
@@ -285,12 +268,85 @@ def get_inventory_analysis():
         return jsonify({'error': str(e)}), 500
 
 
+@bp.route('/valuation', methods=['GET'])
+@jwt_required()
+@cached_report('products')
+def get_inventory_valuation():
+    """Tracked inventory value: totals, per category, and products by value page by page"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        category_id = request.args.get('category_id', type=int)
+        
+        query = valuation_rows(category_id).options(*product_options())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        return jsonify({
+            'totals': valuation_totals(),
+            'categories': valuation_by_category(),
+            'products': [
+                {
+                    **product.to_dict(),
+                    'cost_value': round(float(cost_value or 0), 2),
+                    'retail_value': round(float(retail_value or 0), 2)
+                } for product, cost_value, retail_value in pagination.items
+            ],
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'current_page': page
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/slow-movers', methods=['GET'])
+@jwt_required()
+@cached_report('products', 'inventory_logs')
+def get_slow_movers():
+    """Tracked products in stock with no inventory movement in the last days days"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        days = lookback_days(request.args.get('days', type=int))
+        
+        query = slow_movers(days).options(*product_options())
+        
+        # Opt-in cursor mode, as for the logs
+        if wants_cursor(request.args):
+            keyset = keyset_page(query, [Product.id], descending=False, **keyset_args(request.args))
+            products = keyset['items']
+            meta = page_meta(keyset)
+        else:
+            pagination = query.order_by(Product.id).paginate(page=page, per_page=per_page, error_out=False)
+            products = pagination.items
+            meta = {'total': pagination.total, 'pages': pagination.pages, 'current_page': page}
+        
+        moved_at = last_movements([product.id for product in products])
+        
+        return jsonify({
+            'days': days,
+            'products': [
+                {
+                    **product.to_dict(),
+                    'last_movement_at': moved_at[product.id].isoformat() if moved_at.get(product.id) else None
+                } for product in products
+            ],
+            **meta
+        }), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/products', methods=['GET'])
 @jwt_required()
 def get_inventory_products():
     """Get all products with inventory info"""
     try:
-        products = Product.query.filter_by(track_inventory=True).order_by(Product.name).all()
+        products = Product.query.options(*product_options()).filter_by(track_inventory=True).order_by(Product.name).all()
         
         return jsonify({
             'products': [p.to_dict() for p in products]
@@ -301,15 +357,10 @@ def get_inventory_products():
 
 
 @bp.route('/logs/<int:log_id>', methods=['DELETE'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='inventory')
 def delete_inventory_log(log_id):
     """Delete an inventory log"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         log = InventoryLog.query.get(log_id)
         if not log:
             return jsonify({'error': 'Inventory log not found'}), 404
@@ -318,11 +369,12 @@ def delete_inventory_log(log_id):
         product = Product.query.get(log.product_id)
         if product and product.track_inventory:
             if log.type == 'in' or log.type == 'stock_in':
-                product.current_stock -= log.quantity
+                adjust_stock([(product.id, -log.quantity)])
             elif log.type == 'out' or log.type == 'stock_out':
-                product.current_stock += log.quantity
+                adjust_stock([(product.id, log.quantity)])
         
         db.session.delete(log)
+        bump_data_version('products', 'inventory_logs')
         db.session.commit()
         
         return jsonify({
@@ -1,29 +1,28 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
 from app import db
-from app.models import User, UserRole, PayrollRecord
-from sqlalchemy import func, extract, and_
+from app.models import User, UserRole, PayrollRecord, PayrollDisbursement, PayrollDisbursementItem
+from app.utils.auth import permission_required
+from app.utils.cache import bump_data_version
+from app.utils.loading import payroll_record_options
+from app.utils.pagination import wants_cursor, keyset_page, keyset_args, page_meta, InvalidCursor
+from app.utils.periods import in_period
+from app.services.financial import assert_period_open, PeriodCloseError
+from app.services.payroll import (generate_payroll_run, payroll_summary, disburse_payroll, delete_unpaid_records,
+                                  PayrollError)
+from sqlalchemy import extract, and_
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 from decimal import Decimal
 
 bp = Blueprint('payroll', __name__)
 
-def check_permission(user_id, required_roles):
-    """Check if user has required role"""
-    user = User.query.get(user_id)
-    return user and user.role in required_roles
-
 
 @bp.route('/employees', methods=['GET'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def get_employees():
     """Get all employees"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         employees = User.query.filter_by(is_active=True).order_by(User.last_name).all()
         
         return jsonify({
@@ -35,32 +34,41 @@ def get_employees():
 
 
 @bp.route('/records', methods=['GET'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def get_payroll_records():
     """Get payroll records with filtering"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         employee_id = request.args.get('employee_id', type=int)
         year = request.args.get('year', type=int)
         month = request.args.get('month', type=int)
+        disbursement_id = request.args.get('disbursement_id', type=int)
         
-        query = PayrollRecord.query
+        query = PayrollRecord.query.options(*payroll_record_options())
         
         if employee_id:
             query = query.filter_by(employee_id=employee_id)
         
-        if year:
-            query = query.filter(extract('year', PayrollRecord.pay_period_start) == year)
+        if disbursement_id:
+            query = query.join(
+                PayrollDisbursementItem, PayrollDisbursementItem.payroll_record_id == PayrollRecord.id
+            ).filter(PayrollDisbursementItem.disbursement_id == disbursement_id)
         
-        if month:
+        if year:
+            query = query.filter(in_period(PayrollRecord.pay_period_start, year, month))
+        elif month:
+            # Same month across every year; no range form exists for this one
             query = query.filter(extract('month', PayrollRecord.pay_period_start) == month)
         
+        # Opt-in cursor mode: constant cost per page regardless of depth
+        if wants_cursor(request.args):
+            keyset = keyset_page(query, [PayrollRecord.pay_period_start, PayrollRecord.id], **keyset_args(request.args))
+            return jsonify({
+                'records': [r.to_dict() for r in keyset['items']],
+                **page_meta(keyset)
+            }), 200
+        
         query = query.order_by(PayrollRecord.pay_period_start.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -71,20 +79,17 @@ def get_payroll_records():
             'current_page': page
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/records', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def create_payroll_record():
     """Create a payroll record"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
         required_fields = ['employee_id', 'pay_period_start', 'pay_period_end']
@@ -140,8 +145,10 @@ def create_payroll_record():
             payment_method=data.get('payment_method', 'bank_transfer'),
             notes=data.get('notes', '')
         )
+        assert_period_open(record.pay_period_start)
         
         db.session.add(record)
+        bump_data_version('payroll_records')
         db.session.commit()
         
         return jsonify({
@@ -149,21 +156,46 @@ def create_payroll_record():
             'record': record.to_dict()
         }), 201
         
+    except PeriodCloseError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/runs', methods=['POST'])
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
+def create_payroll_run():
+    """Generate a pay period's records for every active employee in one transaction"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            run = generate_payroll_run(data)
+        except (PayrollError, PeriodCloseError) as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), e.status
+        
+        if run['created']:
+            bump_data_version('payroll_records')
+        db.session.commit()
+        
+        return jsonify({
+            'message': f"Payroll run created {run['created']} record(s)",
+            'run': run
+        }), 201
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/records/<int:record_id>', methods=['PUT'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def update_payroll_record(record_id):
     """Update a payroll record"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         record = PayrollRecord.query.get(record_id)
         
         if not record:
@@ -172,6 +204,8 @@ def update_payroll_record(record_id):
         if record.is_paid:
             return jsonify({'error': 'Cannot modify paid payroll record'}), 400
         
+        assert_period_open(record.pay_period_start)
+        
         data = request.get_json()
         
         # Update fields
@@ -202,6 +236,7 @@ def update_payroll_record(record_id):
         record.total_deductions = (record.tax_deductions or Decimal('0')) + (record.insurance_deductions or Decimal('0')) + (record.other_deductions or Decimal('0'))
         record.net_pay = record.gross_pay - record.total_deductions
         
+        bump_data_version('payroll_records')
         db.session.commit()
         
         return jsonify({
@@ -209,21 +244,19 @@ def update_payroll_record(record_id):
             'record': record.to_dict()
         }), 200
         
+    except PeriodCloseError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/records/<int:record_id>', methods=['DELETE'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, tab='payroll')
 def delete_payroll_record(record_id):
     """Delete a payroll record"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         record = PayrollRecord.query.get(record_id)
         
         if not record:
@@ -232,95 +265,67 @@ def delete_payroll_record(record_id):
         if record.is_paid:
             return jsonify({'error': 'Cannot delete paid payroll record'}), 400
         
+        assert_period_open(record.pay_period_start)
+        
         db.session.delete(record)
+        bump_data_version('payroll_records')
         db.session.commit()
         
         return jsonify({'message': 'Payroll record deleted successfully'}), 200
         
+    except PeriodCloseError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/records/bulk-delete', methods=['POST'])
+@permission_required(UserRole.ADMIN, tab='payroll')
+def bulk_delete_payroll_records():
+    """Delete the unpaid records selected by ids, pay period and/or department"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            result = delete_unpaid_records(data)
+        except (PayrollError, PeriodCloseError) as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), e.status
+        
+        bump_data_version('payroll_records')
+        db.session.commit()
+        
+        return jsonify({
+            'message': f"Deleted {result['record_count']} unpaid payroll record(s)",
+            **result
+        }), 200
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/summary', methods=['GET'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def get_payroll_summary():
     """Get payroll summary"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         year = request.args.get('year', datetime.now().year, type=int)
         month = request.args.get('month', datetime.now().month, type=int)
         
-        # Monthly totals
-        monthly_records = PayrollRecord.query.filter(
-            extract('year', PayrollRecord.pay_period_start) == year,
-            extract('month', PayrollRecord.pay_period_start) == month
-        ).all()
-        
-        total_gross = sum(float(r.gross_pay) for r in monthly_records)
-        total_deductions = sum(float(r.total_deductions) for r in monthly_records)
-        total_net = sum(float(r.net_pay) for r in monthly_records)
-        
-        pending_count = len([r for r in monthly_records if not r.is_paid])
-        paid_count = len([r for r in monthly_records if r.is_paid])
-        
-        # Yearly totals
-        yearly_records = PayrollRecord.query.filter(
-            extract('year', PayrollRecord.pay_period_start) == year
-        ).all()
-        yearly_net = sum(float(r.net_pay) for r in yearly_records)
-        
-        # Monthly breakdown
-        monthly_breakdown = db.session.query(
-            extract('month', PayrollRecord.pay_period_start).label('month'),
-            func.sum(PayrollRecord.gross_pay),
-            func.sum(PayrollRecord.net_pay),
-            func.count(PayrollRecord.id)
-        ).filter(
-            extract('year', PayrollRecord.pay_period_start) == year
-        ).group_by(extract('month', PayrollRecord.pay_period_start)).all()
-        
-        return jsonify({
-            'period': {'year': year, 'month': month},
-            'monthly': {
-                'total_employees': len(monthly_records),
-                'total_gross_pay': round(total_gross, 2),
-                'total_deductions': round(total_deductions, 2),
-                'total_net_pay': round(total_net, 2),
-                'pending': pending_count,
-                'paid': paid_count
-            },
-            'yearly': {
-                'total_net_pay': round(yearly_net, 2),
-                'monthly_breakdown': [
-                    {
-                        'month': int(item[0]),
-                        'gross_pay': round(float(item[1]), 2),
-                        'net_pay': round(float(item[2]), 2),
-                        'employees': int(item[3])
-                    } for item in monthly_breakdown
-                ]
-            }
-        }), 200
+        return jsonify(payroll_summary(year, month)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/pay/<int:record_id>', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
 def mark_as_paid(record_id):
     """Mark payroll record as paid"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.FINANCE_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         record = PayrollRecord.query.get(record_id)
         
         if not record:
@@ -329,6 +334,7 @@ def mark_as_paid(record_id):
         record.is_paid = True
         record.payment_date = date.today()
         
+        bump_data_version('payroll_records')
         db.session.commit()
         
         return jsonify({
@@ -339,3 +345,55 @@ def mark_as_paid(record_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/disbursements', methods=['GET'])
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
+def get_disbursements():
+    """List disbursement batches, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        
+        pagination = PayrollDisbursement.query.order_by(PayrollDisbursement.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        return jsonify({
+            'disbursements': [d.to_dict() for d in pagination.items],
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'current_page': page
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/disbursements', methods=['POST'])
+@permission_required(UserRole.ADMIN, UserRole.FINANCE_MANAGER, tab='payroll')
+def create_disbursement():
+    """Mark the unpaid records selected by ids, pay period and/or department paid as one batch"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            batch = disburse_payroll(data, user_id=int(get_jwt_identity()))
+        except PayrollError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), e.status
+        
+        bump_data_version('payroll_records')
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'Disbursement batch {batch.id} paid {batch.record_count} payroll record(s)',
+            'disbursement': batch.to_dict()
+        }), 201
+    
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Some of these records were paid by another batch at the same time; try again'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
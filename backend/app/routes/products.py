@@ -1,16 +1,16 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
-from app.models import Product, Category, User, UserRole
-from sqlalchemy import or_
+from app.models import Product, Category, UserRole
+from app.utils.auth import permission_required
+from app.utils.cache import bump_data_version
+from app.utils.loading import product_options
+from app.utils.pagination import wants_cursor, keyset_page, keyset_args, page_meta, InvalidCursor
+from app.services.search import search_products
+from app.utils.product_lookup import product_lookup
 
 bp = Blueprint('products', __name__)
 
-def check_permission(user_id, required_roles):
-    """Check if user has required role"""
-    user = User.query.get(user_id)
-    return user and user.role in required_roles
-
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def get_products():
@@ -22,22 +22,24 @@ def get_products():
         category_id = request.args.get('category_id', type=int)
         is_active = request.args.get('is_active', type=bool)
         
-        query = Product.query
+        query = Product.query.options(*product_options())
         
         if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.sku.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
+            query = search_products(query, search, ranked=not wants_cursor(request.args))
         
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            query = query.filter(Product.category_id == category_id)
         
         if is_active is not None:
-            query = query.filter_by(is_active=is_active)
+            query = query.filter(Product.is_active == is_active)
+        
+        # Opt-in cursor mode: constant cost per page regardless of depth
+        if wants_cursor(request.args):
+            keyset = keyset_page(query, [Product.id], descending=False, **keyset_args(request.args))
+            return jsonify({
+                'products': [product.to_dict() for product in keyset['items']],
+                **page_meta(keyset)
+            }), 200
         
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -48,6 +50,26 @@ def get_products():
             'current_page': page
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/lookup', methods=['GET'])
+@jwt_required()
+def lookup_product():
+    """Price, stock and tracking flags of the product with a scanned SKU, from the in-memory index"""
+    try:
+        sku = request.args.get('sku', '')
+        if not sku.strip():
+            return jsonify({'error': 'sku is required'}), 400
+        
+        record = product_lookup.get(sku)
+        if record is None or not record['is_active']:
+            return jsonify({'error': 'Product not found'}), 404
+        
+        return jsonify(record), 200
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -67,15 +89,10 @@ def get_product(product_id):
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='products')
 def create_product():
     """Create a new product"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
         # Validate required fields
@@ -104,6 +121,7 @@ def create_product():
         )
         
         db.session.add(product)
+        bump_data_version('products')
         db.session.commit()
         
         return jsonify({
@@ -116,15 +134,10 @@ def create_product():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<int:product_id>', methods=['PUT'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='products')
 def update_product(product_id):
     """Update a product"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         product = Product.query.get(product_id)
         
         if not product:
@@ -152,6 +165,7 @@ def update_product(product_id):
         if 'is_active' in data:
             product.is_active = data['is_active']
         
+        bump_data_version('products')
         db.session.commit()
         
         return jsonify({
@@ -164,21 +178,17 @@ def update_product(product_id):
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<int:product_id>', methods=['DELETE'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, tab='products')
 def delete_product(product_id):
     """Delete a product"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         product = Product.query.get(product_id)
         
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
         db.session.delete(product)
+        bump_data_version('products')
         db.session.commit()
         
         return jsonify({'message': 'Product deleted successfully'}), 200
@@ -199,15 +209,10 @@ def get_categories():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/categories', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='products')
 def create_category():
     """Create a new category"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
         if 'name' not in data:
@@ -1,18 +1,22 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Product, Sale, SaleItem, Customer, InventoryLog, User, UserRole
-from sqlalchemy import func, extract, and_, or_
+from app.models import Sale, SaleItem, Customer, InventoryLog, InventoryStatus, UserRole
+from app.services.rollups import record_sale, period_totals, daily_rows
+from app.services.invoices import next_invoice_number
+from app.services.financial import assert_period_open, PeriodCloseError
+from app.services.sales import SaleError, load_products, price_sale, customer_for, create_sales_batch, MAX_BATCH_SALES
+from app.services.stock import decrement_stock, adjust_stock
+from app.utils.periods import date_range, in_range
+from app.utils.auth import permission_required
+from app.utils.cache import cached_report, bump_data_version
+from app.utils.loading import sale_options
+from app.utils.pagination import wants_cursor, keyset_page, keyset_args, page_meta, InvalidCursor
+from sqlalchemy import func, and_, or_
 from datetime import datetime
-from decimal import Decimal
 
 bp = Blueprint('sales', __name__)
 
-def check_permission(user_id, required_roles):
-    """Check if user has required role"""
-    user = User.query.get(user_id)
-    return user and user.role in required_roles
-
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
@@ -26,7 +30,7 @@ def get_sales():
         end_date = request.args.get('end_date')
         status = request.args.get('status')
         
-        query = Sale.query
+        query = Sale.query.options(*sale_options())
         
         if customer_id:
             query = query.filter_by(customer_id=customer_id)
@@ -40,6 +44,14 @@ def get_sales():
         if end_date:
             query = query.filter(Sale.sale_date <= datetime.fromisoformat(end_date))
         
+        # Opt-in cursor mode: constant cost per page regardless of depth
+        if wants_cursor(request.args):
+            keyset = keyset_page(query, [Sale.sale_date, Sale.id], **keyset_args(request.args))
+            return jsonify({
+                'sales': [sale.to_dict() for sale in keyset['items']],
+                **page_meta(keyset)
+            }), 200
+        
         query = query.order_by(Sale.sale_date.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -50,6 +62,8 @@ def get_sales():
             'current_page': page
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,87 +73,40 @@ def get_sales():
 def get_sale(sale_id):
     """Get a specific sale with items"""
     try:
-        sale = Sale.query.get(sale_id)
+        sale = db.session.get(Sale, sale_id, options=sale_options())
         
         if not sale:
             return jsonify({'error': 'Sale not found'}), 404
         
-        sale_dict = sale.to_dict()
-        sale_dict['items'] = [item.to_dict() for item in sale.items]
-        
-        return jsonify(sale_dict), 200
+        return jsonify(sale.to_dict()), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='sales')
 def create_sale():
     """Create a new sale"""
     try:
         user_id = int(get_jwt_identity())
         
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         data = request.get_json()
         
-        if not data.get('items') or len(data['items']) == 0:
-            return jsonify({'error': 'At least one item is required'}), 400
+        # Calculate totals (products loaded in one query)
+        try:
+            priced = price_sale(data, load_products([data]))
+        except SaleError as e:
+            return jsonify({'error': str(e)}), e.status
         
-        # Create or get customer
-        customer_id = data.get('customer_id')
-        if not customer_id and data.get('customer_name'):
-            customer = Customer(
-                name=data['customer_name'],
-                email=data.get('customer_email'),
-                phone=data.get('customer_phone'),
-                address=data.get('customer_address')
-            )
-            db.session.add(customer)
-            db.session.flush()
-            customer_id = customer.id
-        
-        # Calculate totals
-        subtotal = Decimal('0')
-        items_data = []
-        
-        for item in data['items']:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                return jsonify({'error': f'Product {item["product_id"]} not found'}), 404
-            
-            quantity = int(item['quantity'])
-            
-            # Check stock if tracking inventory
-            if product.track_inventory and product.current_stock < quantity:
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-            
-            unit_price = Decimal(str(item.get('unit_price', product.selling_price)))
-            discount = Decimal(str(item.get('discount', 0)))
-            line_total = (unit_price * quantity) - discount
-            
-            items_data.append({
-                'product': product,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'discount': discount,
-                'line_total': line_total
-            })
-            
-            subtotal += line_total
+        items_data = priced['lines']
+        total_amount = priced['total_amount']
         
-        # Calculate tax and total
-        tax_rate = Decimal(str(data.get('tax_rate', 0)))
-        tax_amount = subtotal * (tax_rate / 100)
-        discount_total = Decimal(str(data.get('discount', 0)))
-        total_amount = subtotal + tax_amount - discount_total
+        # Create or get customer
+        customer_id = customer_for(data)
         
-        # Generate invoice number
-        today = datetime.now()
-        count = Sale.query.filter(func.date(Sale.sale_date) == today.date()).count()
-        invoice_number = f"INV-{today.strftime('%Y%m%d')}-{count + 1:04d}"
+        # Allocate the invoice number from the per-day counter
+        invoice_number = next_invoice_number()
         
         # Create sale
         sale = Sale(
@@ -147,12 +114,11 @@ def create_sale():
             customer_id=customer_id,
             salesperson_id=user_id,
             sale_date=datetime.now(),
-            subtotal=subtotal,
-            tax_rate=tax_rate,
-            tax_amount=tax_amount,
-            discount=discount_total,
+            subtotal=priced['subtotal'],
+            tax_rate=priced['tax_rate'],
+            tax_amount=priced['tax_amount'],
+            discount_amount=priced['discount_amount'],
             total_amount=total_amount,
-            payment_method=data.get('payment_method', 'cash'),
             payment_status=data.get('payment_status', 'paid'),
             notes=data.get('notes', '')
         )
@@ -160,37 +126,50 @@ def create_sale():
         db.session.add(sale)
         db.session.flush()
         
-        # Create sale items and update inventory
+        # Take stock for every tracked line with conditional updates; any line
+        # short of stock fails the whole sale
+        balances, failed = decrement_stock(
+            (item_data['product'].id, item_data['quantity'])
+            for item_data in items_data if item_data['product'].track_inventory
+        )
+        if failed:
+            db.session.rollback()
+            return jsonify({'error': 'Insufficient stock', 'failed_lines': failed}), 400
+        
+        # Create sale items and inventory logs
         for item_data in items_data:
             sale_item = SaleItem(
                 sale_id=sale.id,
                 product_id=item_data['product'].id,
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
-                discount=item_data['discount'],
                 line_total=item_data['line_total']
             )
             db.session.add(sale_item)
             
-            # Update inventory
             product = item_data['product']
             if product.track_inventory:
-                previous_stock = product.current_stock
-                product.current_stock -= item_data['quantity']
-                
                 log = InventoryLog(
                     product_id=product.id,
-                    log_type='out',
+                    type='out',
                     quantity=item_data['quantity'],
-                    previous_stock=previous_stock,
-                    new_stock=product.current_stock,
-                    unit_cost=float(product.item_cost),
-                    reference=invoice_number,
-                    notes=f'Sale {invoice_number}',
-                    performed_by=user_id
+                    stock_date=sale.sale_date,
+                    status=InventoryStatus.COMPLETED,
+                    reference_number=invoice_number,
+                    balance_after=balances[product.id],
+                    notes=f'Sale {invoice_number}'
                 )
                 db.session.add(log)
         
+        # Keep the daily rollup in step
+        record_sale(
+            sale.sale_date,
+            total_amount,
+            sum(item_data['quantity'] for item_data in items_data),
+            sum(item_data['product'].item_cost * item_data['quantity'] for item_data in items_data)
+        )
+        
+        bump_data_version('sales', 'products', 'inventory_logs')
         db.session.commit()
         
         return jsonify({
@@ -204,21 +183,53 @@ def create_sale():
         return jsonify({'error': str(e)}), 500
 
 
-@bp.route('/<int:sale_id>', methods=['PUT'])
-@jwt_required()
-def update_sale(sale_id):
-    """Update a sale (limited updates allowed)"""
+@bp.route('/batch', methods=['POST'])
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='sales')
+def create_sales_batch_route():
+    """Create many sales at once (offline POS sync); results are reported per sale"""
     try:
         user_id = int(get_jwt_identity())
         
-        if not check_permission(user_id, [UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
+        data = request.get_json()
+        entries = data.get('sales') if isinstance(data, dict) else None
+        
+        if not isinstance(entries, list) or len(entries) == 0:
+            return jsonify({'error': 'sales must be a non-empty list'}), 400
+        
+        if len(entries) > MAX_BATCH_SALES:
+            return jsonify({'error': f'At most {MAX_BATCH_SALES} sales per batch'}), 400
+        
+        results = create_sales_batch(entries, user_id)
+        created = sum(1 for result in results if result['status'] == 'created')
+        
+        if created:
+            bump_data_version('sales', 'products', 'inventory_logs')
+        db.session.commit()
         
+        return jsonify({
+            'message': f'{created} of {len(entries)} sales created',
+            'created': created,
+            'failed': len(entries) - created,
+            'results': results
+        }), 201 if created == len(entries) else 207
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/<int:sale_id>', methods=['PUT'])
+@permission_required(UserRole.ADMIN, UserRole.OPERATIONS_MANAGER, tab='sales')
+def update_sale(sale_id):
+    """Update a sale (limited updates allowed)"""
+    try:
         sale = Sale.query.get(sale_id)
         
         if not sale:
             return jsonify({'error': 'Sale not found'}), 404
         
+        assert_period_open(sale.sale_date)
+        
         data = request.get_json()
         
         # Only allow updating certain fields
@@ -229,6 +240,7 @@ def update_sale(sale_id):
         if 'notes' in data:
             sale.notes = data['notes']
         
+        bump_data_version('sales')
         db.session.commit()
         
         return jsonify({
@@ -236,45 +248,52 @@ def update_sale(sale_id):
             'sale': sale.to_dict()
         }), 200
         
+    except PeriodCloseError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @bp.route('/<int:sale_id>', methods=['DELETE'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, tab='sales')
 def delete_sale(sale_id):
     """Delete a sale (void)"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_permission(user_id, [UserRole.ADMIN]):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-        
         sale = Sale.query.get(sale_id)
         
         if not sale:
             return jsonify({'error': 'Sale not found'}), 404
         
+        assert_period_open(sale.sale_date)
+        
         # Restore inventory
-        for item in sale.items:
-            product = Product.query.get(item.product_id)
-            if product and product.track_inventory:
-                previous_stock = product.current_stock
-                product.current_stock += item.quantity
-                
-                log = InventoryLog(
-                    product_id=product.id,
-                    log_type='in',
-                    quantity=item.quantity,
-                    previous_stock=previous_stock,
-                    new_stock=product.current_stock,
-                    unit_cost=float(product.item_cost),
-                    reference=f'VOID-{sale.invoice_number}',
-                    notes=f'Voided sale {sale.invoice_number}',
-                    performed_by=user_id
-                )
-                db.session.add(log)
+        tracked = [item for item in sale.items if item.product and item.product.track_inventory]
+        balances = adjust_stock((item.product_id, item.quantity) for item in tracked)
+        
+        for item in tracked:
+            log = InventoryLog(
+                product_id=item.product_id,
+                type='in',
+                quantity=item.quantity,
+                stock_date=datetime.now(),
+                status=InventoryStatus.COMPLETED,
+                reference_number=f'VOID-{sale.invoice_number}',
+                balance_after=balances[item.product_id],
+                notes=f'Voided sale {sale.invoice_number}'
+            )
+            db.session.add(log)
+        
+        # Remove the sale from the daily rollup
+        record_sale(
+            sale.sale_date,
+            sale.total_amount,
+            sum(item.quantity for item in sale.items),
+            sum(item.product.item_cost * item.quantity for item in sale.items if item.product),
+            sign=-1
+        )
+        bump_data_version('sales', 'products', 'inventory_logs')
         
         # Delete sale items first
         SaleItem.query.filter_by(sale_id=sale_id).delete()
@@ -283,6 +302,9 @@ def delete_sale(sale_id):
         
         return jsonify({'message': 'Sale voided successfully'}), 200
         
+    except PeriodCloseError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -334,32 +356,24 @@ def create_customer():
 
 @bp.route('/analysis', methods=['GET'])
 @jwt_required()
+@cached_report('sales')
 def get_sales_analysis():
     """Get sales analysis"""
     try:
         year = request.args.get('year', datetime.now().year, type=int)
         month = request.args.get('month', datetime.now().month, type=int)
         
-        # Monthly totals
-        monthly_sales = db.session.query(func.sum(Sale.total_amount)).filter(
-            extract('year', Sale.sale_date) == year,
-            extract('month', Sale.sale_date) == month
-        ).scalar() or 0
-        
-        monthly_count = Sale.query.filter(
-            extract('year', Sale.sale_date) == year,
-            extract('month', Sale.sale_date) == month
-        ).count()
-        
-        # Daily breakdown
-        daily_sales = db.session.query(
-            func.date(Sale.sale_date),
-            func.sum(Sale.total_amount),
-            func.count(Sale.id)
-        ).filter(
-            extract('year', Sale.sale_date) == year,
-            extract('month', Sale.sale_date) == month
-        ).group_by(func.date(Sale.sale_date)).all()
+        # Monthly totals and daily breakdown from the rollup table
+        first_day, next_month = date_range(year, month)
+        
+        totals = period_totals(first_day, next_month)
+        monthly_sales = totals['gross_sales']
+        monthly_count = totals['order_count']
+        
+        daily_sales = [
+            (row.rollup_date, row.gross_sales, row.order_count)
+            for row in daily_rows(first_day, next_month) if row.order_count > 0
+        ]
         
         # Top customers
         top_customers = db.session.query(
@@ -367,8 +381,7 @@ def get_sales_analysis():
             func.sum(Sale.total_amount).label('total'),
             func.count(Sale.id).label('orders')
         ).join(Sale).filter(
-            extract('year', Sale.sale_date) == year,
-            extract('month', Sale.sale_date) == month
+            in_range(Sale.sale_date, first_day, next_month)
         ).group_by(Customer.id, Customer.name).order_by(
             func.sum(Sale.total_amount).desc()
         ).limit(5).all()
@@ -2,24 +2,15 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import User, UserRole, TabPermission
+from app.utils.auth import permission_required, has_role, revoke_permissions
 
 bp = Blueprint('settings', __name__)
 
-def check_admin(user_id):
-    """Check if user is admin"""
-    user = User.query.get(user_id)
-    return user and user.role == UserRole.ADMIN
-
 @bp.route('/users', methods=['GET'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, message='Admin access required')
 def get_users():
     """Get all users for management"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_admin(user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         users = User.query.filter(User.role != UserRole.ADMIN).all()
         
         return jsonify({
@@ -35,10 +26,9 @@ def get_tab_permissions():
     """Get all tab permissions"""
     try:
         user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
         
         # Admin can see all permissions
-        if user.role == UserRole.ADMIN:
+        if has_role(UserRole.ADMIN):
             permissions = TabPermission.query.all()
         else:
             # Non-admin can only see their own permissions
@@ -57,10 +47,9 @@ def get_user_tab_permissions(user_id):
     """Get tab permissions for a specific user"""
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
         
         # Admin can see any user's permissions, others only their own
-        if current_user.role != UserRole.ADMIN and current_user_id != user_id:
+        if not has_role(UserRole.ADMIN) and current_user_id != user_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         permissions = TabPermission.query.filter_by(user_id=user_id).all()
@@ -73,15 +62,10 @@ def get_user_tab_permissions(user_id):
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/tab-permissions', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, message='Admin access required')
 def create_or_update_tab_permission():
     """Create or update a tab permission (Admin only)"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_admin(user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         data = request.get_json()
         
         if not data.get('user_id') or not data.get('tab_name'):
@@ -96,6 +80,7 @@ def create_or_update_tab_permission():
         if existing:
             # Update existing permission
             existing.is_locked = data.get('is_locked', existing.is_locked)
+            revoke_permissions(existing.user_id)
             db.session.commit()
             return jsonify({
                 'message': 'Permission updated',
@@ -109,6 +94,7 @@ def create_or_update_tab_permission():
                 is_locked=data.get('is_locked', False)
             )
             db.session.add(permission)
+            revoke_permissions(permission.user_id)
             db.session.commit()
             
             return jsonify({
@@ -121,15 +107,10 @@ def create_or_update_tab_permission():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/tab-permissions/bulk', methods=['POST'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, message='Admin access required')
 def bulk_update_tab_permissions():
     """Bulk update tab permissions for a user (Admin only)"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_admin(user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         data = request.get_json()
         target_user_id = data.get('user_id')
         permissions = data.get('permissions', {})  # {tab_name: is_locked}
@@ -149,6 +130,8 @@ def bulk_update_tab_permissions():
             )
             db.session.add(permission)
         
+        # Tokens issued with the old locks must be refreshed
+        revoke_permissions(target_user_id)
         db.session.commit()
         
         # Return updated permissions
@@ -164,20 +147,16 @@ def bulk_update_tab_permissions():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/tab-permissions/<int:permission_id>', methods=['DELETE'])
-@jwt_required()
+@permission_required(UserRole.ADMIN, message='Admin access required')
 def delete_tab_permission(permission_id):
     """Delete a tab permission (Admin only)"""
     try:
-        user_id = int(get_jwt_identity())
-        
-        if not check_admin(user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         permission = TabPermission.query.get(permission_id)
         if not permission:
             return jsonify({'error': 'Permission not found'}), 404
         
         db.session.delete(permission)
+        revoke_permissions(permission.user_id)
         db.session.commit()
         
         return jsonify({'message': 'Permission deleted successfully'}), 200
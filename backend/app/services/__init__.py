@@ -0,0 +1,4 @@
+"""
+Service layer shared by the route blueprints
+Holds query engines and helpers that more than one endpoint builds on
+"""
@@ -0,0 +1,178 @@
+"""
+Dashboard aggregation engine
+Collapses the dashboard metrics into a small fixed number of queries using
+conditional aggregation instead of one round-trip per figure
+"""
+from app import db
+from app.models import Product, Sale, SaleItem, Expense, BudgetTarget
+from app.utils.periods import in_period, day_range, in_range
+from sqlalchemy import func, and_, or_, case
+
+
+def _sales_totals(year, month, today):
+    """All-time, today, monthly and annual sales in one pass over sales"""
+    in_today = in_range(Sale.sale_date, *day_range(today))
+    in_month = in_period(Sale.sale_date, year, month)
+    in_year = in_period(Sale.sale_date, year)
+    
+    return db.session.query(
+        func.sum(Sale.total_amount),
+        func.sum(case((in_today, Sale.total_amount))),
+        func.sum(case((in_month, Sale.total_amount))),
+        func.sum(case((in_year, Sale.total_amount)))
+    ).one()
+
+
+def _items_sold(year, month, today):
+    """Items sold today and this month in one pass over sale_items"""
+    in_today = in_range(Sale.sale_date, *day_range(today))
+    in_month = in_period(Sale.sale_date, year, month)
+    
+    return db.session.query(
+        func.sum(case((in_today, SaleItem.quantity))),
+        func.sum(case((in_month, SaleItem.quantity)))
+    ).join(Sale, Sale.id == SaleItem.sale_id).filter(or_(in_today, in_month)).one()
+
+
+def _expense_totals(year, month, today):
+    """Expense totals per category, split into all-time, today and month"""
+    in_month = in_period(Expense.expense_date, year, month)
+    
+    return db.session.query(
+        Expense.category,
+        func.sum(Expense.amount),
+        func.sum(case((Expense.expense_date == today, Expense.amount))),
+        func.sum(case((in_month, Expense.amount)))
+    ).group_by(Expense.category).all()
+
+
+def _inventory_status():
+    """In stock, low stock and out of stock counts in one pass over products"""
+    is_low = and_(Product.current_stock > 0, Product.current_stock <= Product.low_stock_threshold)
+    
+    return db.session.query(
+        func.count(case((Product.current_stock > Product.low_stock_threshold, 1))),
+        func.count(case((is_low, 1))),
+        func.count(case((Product.current_stock == 0, 1)))
+    ).one()
+
+
+def _bestsellers(year, month):
+    """Top five products by revenue for the month"""
+    return db.session.query(
+        Product.name,
+        func.sum(SaleItem.quantity).label('total_sold'),
+        func.sum(SaleItem.line_total).label('total_revenue')
+    ).join(SaleItem).join(Sale).filter(
+        in_period(Sale.sale_date, year, month)
+    ).group_by(Product.id, Product.name).order_by(func.sum(SaleItem.line_total).desc()).limit(5).all()
+
+
+def _targets(year, month):
+    """Monthly sales/items targets and the annual sales target in one query"""
+    is_month = BudgetTarget.month == month
+    
+    return db.session.query(
+        func.max(case((is_month, BudgetTarget.sales_target))),
+        func.max(case((is_month, BudgetTarget.items_sold_target))),
+        func.sum(BudgetTarget.sales_target)
+    ).filter(BudgetTarget.year == year).one()
+
+
+def build_dashboard_metrics(year, month, today):
+    """Compute the full /dashboard/metrics payload"""
+    all_time_sales, sales_today, monthly_sales, annual_current = _sales_totals(year, month, today)
+    all_time_sales = all_time_sales or 0
+    sales_today = sales_today or 0
+    monthly_sales = monthly_sales or 0
+    annual_current = annual_current or 0
+    
+    items_sold_today, monthly_items_sold = _items_sold(year, month, today)
+    items_sold_today = items_sold_today or 0
+    monthly_items_sold = monthly_items_sold or 0
+    
+    expense_rows = _expense_totals(year, month, today)
+    all_time_expenses = sum(row[1] for row in expense_rows if row[1] is not None) or 0
+    expense_today = sum(row[2] for row in expense_rows if row[2] is not None) or 0
+    monthly_expenses = sum(row[3] for row in expense_rows if row[3] is not None) or 0
+    
+    # All-time metrics
+    all_time_gross_profit = float(all_time_sales) - float(all_time_expenses)
+    gross_profit_margin = (all_time_gross_profit / float(all_time_sales) * 100) if all_time_sales > 0 else 0
+    
+    monthly_profit = float(monthly_sales) - float(monthly_expenses)
+    
+    # Targets
+    month_sales_target, month_items_target, annual_target = _targets(year, month)
+    sales_target = float(month_sales_target) if month_sales_target else 500000
+    items_target = month_items_target if month_items_target else 750
+    annual_target = annual_target or 6000000
+    
+    # Calculate progress
+    sales_progress = (float(monthly_sales) / sales_target * 100) if sales_target > 0 else 0
+    items_progress = (monthly_items_sold / items_target * 100) if items_target > 0 else 0
+    annual_progress = (float(annual_current) / float(annual_target) * 100) if annual_target > 0 else 0
+    
+    in_stock, low_stock, out_of_stock = _inventory_status()
+    
+    bestsellers_data = [
+        {
+            'name': item[0],
+            'quantity_sold': int(item[1]),
+            'revenue': float(item[2])
+        } for item in _bestsellers(year, month)
+    ]
+    
+    # Top sales channels (mock data - can be extended with actual channel tracking)
+    top_channels = [
+        {'channel': 'Physical Store', 'sales': float(monthly_sales) * 0.4},
+        {'channel': '2nd Branch', 'sales': float(monthly_sales) * 0.3},
+        {'channel': 'Online Store', 'sales': float(monthly_sales) * 0.2},
+        {'channel': 'Tiktok', 'sales': float(monthly_sales) * 0.07},
+        {'channel': 'Shopify', 'sales': float(monthly_sales) * 0.03}
+    ]
+    
+    # Expense distribution (only categories with spending in the month)
+    expense_distribution = [
+        {
+            'category': item[0].value if hasattr(item[0], 'value') else str(item[0]),
+            'amount': float(item[3])
+        } for item in expense_rows if item[3] is not None
+    ]
+    
+    return {
+        'all_time': {
+            'gross_profit': round(all_time_gross_profit, 2),
+            'sales': round(float(all_time_sales), 2),
+            'expenses': round(float(all_time_expenses), 2),
+            'gross_profit_margin': round(gross_profit_margin, 0)
+        },
+        'today': {
+            'sales': round(float(sales_today), 2),
+            'items_sold': int(items_sold_today),
+            'expenses': round(float(expense_today), 2)
+        },
+        'monthly': {
+            'items_sold': int(monthly_items_sold),
+            'items_target': items_target,
+            'items_progress': round(items_progress, 0),
+            'sales': round(float(monthly_sales), 2),
+            'sales_target': sales_target,
+            'sales_progress': round(sales_progress, 0),
+            'expenses': round(float(monthly_expenses), 2),
+            'profit': round(monthly_profit, 2)
+        },
+        'inventory': {
+            'in_stock': in_stock,
+            'low_stock': low_stock,
+            'out_of_stock': out_of_stock
+        },
+        'bestsellers': bestsellers_data,
+        'top_channels': top_channels,
+        'expense_distribution': expense_distribution,
+        'annual': {
+            'current': round(float(annual_current), 2),
+            'target': float(annual_target),
+            'progress': round(annual_progress, 0)
+        }
+    }
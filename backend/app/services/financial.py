@@ -0,0 +1,506 @@
+"""
+Financial period snapshots
+One FinancialPeriodSnapshot holds every figure the financial statements,
+ratios, balance sheet, cash flow statement and Excel export need for a period
+of whole months. Figures are summed in SQL (assets and liabilities grouped by
+type, cash flows by category and direction) and each group is computed on
+first use, so an endpoint only pays for the figures it reads.
+
+Months that have been closed (close_period) are read from their PeriodClose
+row instead: a year's figures are the sum of its closed months plus only the
+open months computed live, and the balances of a period whose last month is
+closed are the ones recorded at closing. Closed months are immutable: write
+paths call assert_period_open, which rejects anything dated in one with a
+409, so the recorded figures never drift from the rows. Years are fiscal
+years starting in BusinessSettings.fiscal_year_start and named by the
+calendar year they start in. get_period_snapshot memoizes snapshots per
+worker, keyed by period, day and the data versions of the tables they read,
+so the statements and ratios of one period share a single computation until
+one of those tables is bumped. Expenses, assets, liabilities, equity and cash
+flows are written outside the API without a bump, so entries also expire
+after FINANCIAL_SNAPSHOT_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import cached_property
+from flask import current_app
+from sqlalchemy import func, case
+from app import db
+from app.models import (Sale, SaleItem, Product, PayrollRecord, Expense, Asset, Liability, Equity, CashFlow,
+                        BusinessSettings, PeriodClose)
+from app.utils.cache import get_data_versions, bump_data_version
+from app.utils.periods import in_range, date_range, add_months, fiscal_year_range, fiscal_year_of
+
+SNAPSHOT_TABLES = (
+    'sales', 'products', 'payroll_records', 'expenses', 'assets', 'liabilities', 'equity', 'cash_flows',
+    'period_closes'
+)
+INCOME_FIGURES = ('sales_revenue', 'cogs', 'payroll_paid', 'payroll_total', 'other_expenses')
+MAX_SNAPSHOTS = 64
+
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+
+class PeriodCloseError(ValueError):
+    """A month that cannot be closed; status is the HTTP status to report"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _safe_div(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator > 0 else 0
+
+
+# ==================== LIVE FIGURES ====================
+
+def _live_income(start, end):
+    """Revenue, COGS, payroll and other expenses of [start, end) from the raw tables"""
+    sales_revenue = db.session.query(func.sum(Sale.total_amount)).filter(
+        in_range(Sale.created_at, start, end)
+    ).scalar() or 0
+    
+    cogs = db.session.query(
+        func.sum(Product.item_cost * SaleItem.quantity)
+    ).join(SaleItem, Product.id == SaleItem.product_id).join(
+        Sale, Sale.id == SaleItem.sale_id
+    ).filter(in_range(Sale.created_at, start, end)).scalar() or 0
+    
+    payroll_total, payroll_paid = db.session.query(
+        func.sum(PayrollRecord.gross_pay),
+        func.sum(case((PayrollRecord.is_paid.is_(True), PayrollRecord.gross_pay)))
+    ).filter(in_range(PayrollRecord.pay_period_start, start, end)).one()
+    
+    other_expenses = db.session.query(func.sum(Expense.amount)).filter(
+        in_range(Expense.expense_date, start, end)
+    ).scalar() or 0
+    
+    return {
+        'sales_revenue': float(sales_revenue),
+        'cogs': float(cogs),
+        'payroll_paid': float(payroll_paid or 0),
+        'payroll_total': float(payroll_total or 0),
+        'other_expenses': float(other_expenses)
+    }
+
+
+def _live_cash_flows(start, end):
+    """Recorded cash flows of [start, end) as [category, flow_type, amount] rows"""
+    rows = db.session.query(
+        CashFlow.category,
+        CashFlow.flow_type,
+        func.sum(CashFlow.amount)
+    ).filter(
+        in_range(CashFlow.transaction_date, start, end)
+    ).group_by(CashFlow.category, CashFlow.flow_type).all()
+    
+    return [[category, flow_type, float(total or 0)] for category, flow_type, total in rows]
+
+
+def _live_balances():
+    """Current inventory value, assets and liabilities by type, equity and accrued payroll"""
+    inventory_value = db.session.query(
+        func.sum(Product.item_cost * Product.current_stock)
+    ).filter(Product.track_inventory.is_(True)).scalar() or 0
+    
+    assets = db.session.query(
+        Asset.asset_type,
+        func.sum(Asset.current_value - func.coalesce(Asset.accumulated_depreciation, 0))
+    ).group_by(Asset.asset_type).all()
+    
+    liabilities = db.session.query(
+        Liability.liability_type,
+        func.sum(Liability.current_balance)
+    ).group_by(Liability.liability_type).all()
+    
+    equity = db.session.query(func.sum(Equity.amount)).scalar() or 0
+    
+    accrued_payroll = db.session.query(func.sum(PayrollRecord.net_pay)).filter(
+        PayrollRecord.is_paid.is_(False)
+    ).scalar() or 0
+    
+    return {
+        'inventory_value': float(inventory_value),
+        'assets': {asset_type: float(total or 0) for asset_type, total in assets},
+        'liabilities': {liability_type: float(total or 0) for liability_type, total in liabilities},
+        'equity': float(equity),
+        'accrued_payroll': float(accrued_payroll)
+    }
+
+
+# ==================== SNAPSHOT ====================
+
+class FinancialPeriodSnapshot:
+    """Figures for the whole months in [start, end), from closed months where possible"""
+    
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+    
+    @cached_property
+    def closes(self):
+        """PeriodClose rows of the months in the period, oldest first"""
+        return db.session.query(PeriodClose).filter(
+            in_range(PeriodClose.period_start, self.start, self.end)
+        ).order_by(PeriodClose.period_start).all()
+    
+    def open_ranges(self):
+        """Runs of consecutive months in the period that are not closed, as [start, end) ranges"""
+        closed = {close.period_start for close in self.closes}
+        ranges = []
+        
+        month = self.start
+        while month < self.end:
+            if month in closed:
+                month = add_months(month, 1)
+                continue
+            run_start = month
+            while month < self.end and month not in closed:
+                month = add_months(month, 1)
+            ranges.append((run_start, month))
+        
+        return ranges
+    
+    @cached_property
+    def income(self):
+        """Revenue, COGS, payroll and other expenses of the period"""
+        totals = dict.fromkeys(INCOME_FIGURES, 0.0)
+        
+        for close in self.closes:
+            for key in INCOME_FIGURES:
+                totals[key] += close.income.get(key, 0)
+        for start, end in self.open_ranges():
+            for key, value in _live_income(start, end).items():
+                totals[key] += value
+        
+        return totals
+    
+    @cached_property
+    def balances(self):
+        """Balances recorded when the period's last month was closed, else current ones"""
+        if self.closes and self.closes[-1].period_start == add_months(self.end, -1):
+            return self.closes[-1].balances
+        return _live_balances()
+    
+    @cached_property
+    def cash_flows(self):
+        """Recorded cash flows of the period by (category, flow_type)"""
+        rows = [row for close in self.closes for row in close.cash_flows]
+        for start, end in self.open_ranges():
+            rows.extend(_live_cash_flows(start, end))
+        
+        totals = {}
+        for category, flow_type, amount in rows:
+            totals[(category, flow_type)] = totals.get((category, flow_type), 0) + amount
+        return totals
+    
+    # ==================== REPORTS ====================
+    
+    def statements(self):
+        """Consolidated income statement, balance sheet and cash flow (/financial/statements)"""
+        income = self.income
+        balances = self.balances
+        
+        total_revenue = income['sales_revenue']
+        cost_of_goods_sold = income['cogs']
+        payroll_expenses = income['payroll_paid']
+        other_expenses = income['other_expenses']
+        
+        gross_profit = total_revenue - cost_of_goods_sold
+        operating_expenses = payroll_expenses + other_expenses
+        operating_income = gross_profit - operating_expenses
+        net_income = operating_income
+        
+        # Balance Sheet
+        inventory_value = balances['inventory_value']
+        current_assets_db = balances['assets'].get('current', 0)
+        non_current_assets = sum(total for asset_type, total in balances['assets'].items() if asset_type != 'current')
+        current_liabilities = balances['liabilities'].get('current', 0)
+        long_term_liabilities = balances['liabilities'].get('long_term', 0)
+        accrued_payroll = balances['accrued_payroll']
+        
+        # Cash estimate (revenue - paid expenses)
+        cash = total_revenue - cost_of_goods_sold - payroll_expenses - other_expenses
+        
+        current_assets = inventory_value + max(0, cash) + current_assets_db
+        total_assets = current_assets + non_current_assets
+        total_liabilities = current_liabilities + long_term_liabilities + accrued_payroll
+        
+        # Cash Flow
+        cash_from_sales = total_revenue
+        inventory_purchases = cost_of_goods_sold  # Simplified
+        operating_cash_flow = cash_from_sales - payroll_expenses - other_expenses
+        investing_cash_flow = -inventory_purchases
+        net_cash_change = operating_cash_flow + investing_cash_flow
+        
+        return {
+            'period': {
+                'start': self.start.isoformat(),
+                'end': (self.end - timedelta(days=1)).isoformat(),
+                'closed_months': len(self.closes)
+            },
+            'income_statement': {
+                'total_revenue': round(total_revenue, 2),
+                'sales_revenue': round(income['sales_revenue'], 2),
+                'service_revenue': 0,
+                'cost_of_goods_sold': round(cost_of_goods_sold, 2),
+                'gross_profit': round(gross_profit, 2),
+                'operating_expenses': round(operating_expenses, 2),
+                'payroll_expenses': round(payroll_expenses, 2),
+                'other_expenses': round(other_expenses, 2),
+                'operating_income': round(operating_income, 2),
+                'other_income': 0,
+                'net_income': round(net_income, 2)
+            },
+            'balance_sheet': {
+                'current_assets': round(current_assets, 2),
+                'cash': round(max(0, cash), 2),
+                'accounts_receivable': 0,
+                'inventory_value': round(inventory_value, 2),
+                'non_current_assets': round(non_current_assets, 2),
+                'total_assets': round(total_assets, 2),
+                'current_liabilities': round(current_liabilities + accrued_payroll, 2),
+                'accounts_payable': 0,
+                'accrued_payroll': round(accrued_payroll, 2),
+                'long_term_liabilities': round(long_term_liabilities, 2),
+                'total_liabilities': round(total_liabilities, 2),
+                'shareholders_equity': round(balances['equity'] + net_income, 2)
+            },
+            'cash_flow': {
+                'net_income': round(net_income, 2),
+                'cash_from_sales': round(cash_from_sales, 2),
+                'payroll_payments': round(payroll_expenses, 2),
+                'operating_cash_flow': round(operating_cash_flow, 2),
+                'inventory_purchases': round(inventory_purchases, 2),
+                'investing_cash_flow': round(investing_cash_flow, 2),
+                'net_cash_change': round(net_cash_change, 2)
+            }
+        }
+    
+    def ratios(self):
+        """Liquidity, profitability, leverage and efficiency ratios (/financial/ratios)"""
+        income = self.income
+        balances = self.balances
+        
+        revenue = income['sales_revenue']
+        cogs = income['cogs']
+        inventory_value = balances['inventory_value']
+        gross_profit = revenue - cogs
+        # Ratios count all payroll of the period, paid or not
+        operating_expenses = income['payroll_total'] + income['other_expenses']
+        net_income = gross_profit - operating_expenses
+        
+        # Balance sheet values
+        current_assets_db = balances['assets'].get('current', 0)
+        total_assets = sum(balances['assets'].values()) + inventory_value
+        current_liabilities = balances['liabilities'].get('current', 0)
+        total_liabilities = sum(balances['liabilities'].values())
+        
+        equity = balances['equity']
+        total_equity = equity + net_income if equity > 0 else net_income
+        
+        cash = max(0, revenue - cogs - operating_expenses)
+        current_assets = inventory_value + current_assets_db + cash
+        
+        return {
+            'liquidity': {
+                'current_ratio': _safe_div(current_assets, current_liabilities) if current_liabilities > 0 else 2.0,
+                'quick_ratio': _safe_div(current_assets - inventory_value, current_liabilities) if current_liabilities > 0 else 1.5,
+                'cash_ratio': _safe_div(cash, current_liabilities) if current_liabilities > 0 else 1.0,
+                'working_capital': round(current_assets - current_liabilities, 2)
+            },
+            'profitability': {
+                'gross_margin': _safe_div(gross_profit, revenue),
+                'operating_margin': _safe_div(gross_profit - operating_expenses, revenue),
+                'net_margin': _safe_div(net_income, revenue),
+                'roe': _safe_div(net_income, total_equity) if total_equity > 0 else 0,
+                'roa': _safe_div(net_income, total_assets) if total_assets > 0 else 0
+            },
+            'leverage': {
+                'debt_to_equity': _safe_div(total_liabilities, total_equity) if total_equity > 0 else 0,
+                'debt_ratio': _safe_div(total_liabilities, total_assets) if total_assets > 0 else 0,
+                'equity_ratio': _safe_div(total_equity, total_assets) if total_assets > 0 else 1
+            },
+            'efficiency': {
+                'asset_turnover': _safe_div(revenue, total_assets) if total_assets > 0 else 0,
+                'inventory_turnover': _safe_div(cogs, inventory_value) if inventory_value > 0 else 0,
+                'days_sales_outstanding': round(_safe_div(0, revenue) * 365, 1) if revenue > 0 else 0
+            }
+        }
+    
+    def balance_sheet(self):
+        """Recorded assets, liabilities and equity (/financial/balance-sheet)"""
+        assets = self.balances['assets']
+        liabilities = self.balances['liabilities']
+        
+        current_assets = assets.get('current', 0)
+        fixed_assets = assets.get('fixed', 0)
+        intangible_assets = assets.get('intangible', 0)
+        total_assets = current_assets + fixed_assets + intangible_assets
+        
+        current_liabilities = liabilities.get('current', 0)
+        long_term_liabilities = liabilities.get('long_term', 0)
+        total_liabilities = current_liabilities + long_term_liabilities
+        
+        total_equity = self.balances['equity']
+        total_liabilities_equity = total_liabilities + total_equity
+        
+        return {
+            'assets': {
+                'current_assets': round(current_assets, 2),
+                'fixed_assets': round(fixed_assets, 2),
+                'intangible_assets': round(intangible_assets, 2),
+                'total': round(total_assets, 2)
+            },
+            'liabilities': {
+                'current_liabilities': round(current_liabilities, 2),
+                'long_term_liabilities': round(long_term_liabilities, 2),
+                'total': round(total_liabilities, 2)
+            },
+            'equity': {
+                'total': round(total_equity, 2)
+            },
+            'total_liabilities_equity': round(total_liabilities_equity, 2),
+            'is_balanced': abs(total_assets - total_liabilities_equity) < 0.01
+        }
+    
+    def cash_flow_statement(self):
+        """Recorded cash flows by activity (/financial/cash-flow-statement)"""
+        activities = {}
+        net_cash_flow = 0
+        
+        for category in ('operating', 'investing', 'financing'):
+            inflows = self.cash_flows.get((category, 'in'), 0)
+            outflows = self.cash_flows.get((category, 'out'), 0)
+            net_cash_flow += inflows - outflows
+            activities[f'{category}_activities'] = {
+                'inflows': round(inflows, 2),
+                'outflows': round(outflows, 2),
+                'net': round(inflows - outflows, 2)
+            }
+        
+        return {
+            **activities,
+            'net_cash_flow': round(net_cash_flow, 2)
+        }
+
+
+# ==================== PERIODS ====================
+
+def fiscal_year_start_month():
+    """First month of the fiscal year from the business settings (January by default)"""
+    start_month = db.session.query(BusinessSettings.fiscal_year_start).order_by(BusinessSettings.id).limit(1).scalar()
+    return start_month if start_month in range(1, 13) else 1
+
+
+def period_range(year=None, month=None):
+    """[start, end) of a calendar month, or of a fiscal year (the current one when year is None)"""
+    if month:
+        return date_range(year or date.today().year, month)
+    
+    start_month = fiscal_year_start_month()
+    if year is None:
+        year = fiscal_year_of(date.today(), start_month)
+    return fiscal_year_range(year, start_month)
+
+
+def get_period_snapshot(year=None, month=None):
+    """
+    Memoized snapshot of a fiscal year or calendar month, recomputed once any
+    table it reads is bumped or after FINANCIAL_SNAPSHOT_TTL seconds (0 disables the memo)
+    """
+    start, end = period_range(year, month)
+    ttl = current_app.config.get('FINANCIAL_SNAPSHOT_TTL', 300)
+    if ttl <= 0:
+        return FinancialPeriodSnapshot(start, end)
+    
+    key = (start, end, date.today(), tuple(get_data_versions(SNAPSHOT_TABLES).items()))
+    now = time.monotonic()
+    
+    with _snapshots_lock:
+        entry = _snapshots.get(key)
+        if entry is not None and now - entry[1] < ttl:
+            _snapshots.move_to_end(key)
+            return entry[0]
+        
+        snapshot = FinancialPeriodSnapshot(start, end)
+        _snapshots[key] = (snapshot, now)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+        return snapshot
+
+
+# ==================== PERIOD CLOSE ====================
+
+def close_period(year, month, user_id=None):
+    """
+    Record the month's figures as a PeriodClose; the caller commits
+    Only months that have ended can be closed, and each only once. Balances are
+    point-in-time, so they are the ones current when the month is closed.
+    """
+    start, end = date_range(year, month)
+    if end > date.today():
+        raise PeriodCloseError(f'{year}-{month:02d} has not ended yet')
+    if db.session.get(PeriodClose, start) is not None:
+        raise PeriodCloseError(f'{year}-{month:02d} is already closed', status=409)
+    
+    close = PeriodClose(
+        period_start=start,
+        income=_live_income(start, end),
+        cash_flows=_live_cash_flows(start, end),
+        balances=_live_balances(),
+        closed_by=user_id
+    )
+    db.session.add(close)
+    bump_data_version('period_closes')
+    return close
+
+
+def closed_months(days):
+    """First days of the closed months among the months of the given dates or datetimes"""
+    months = {add_months(day, 0) for day in days if day is not None}
+    if not months:
+        return set()
+    rows = db.session.query(PeriodClose.period_start).filter(PeriodClose.period_start.in_(months))
+    return {row.period_start for row in rows}
+
+
+def assert_period_open(*days):
+    """Raise a 409 PeriodCloseError if any of the dates falls in a closed month"""
+    closed = closed_months(days)
+    if closed:
+        raise PeriodCloseError(f'{min(closed):%Y-%m} is closed', status=409)
+
+
+def period_status(fiscal_year=None):
+    """Each month of a fiscal year with its close, if any"""
+    start, end = period_range(fiscal_year)
+    closes = {
+        close.period_start: close
+        for close in PeriodClose.query.filter(in_range(PeriodClose.period_start, start, end))
+    }
+    
+    months = []
+    month = start
+    while month < end:
+        close = closes.get(month)
+        months.append({
+            'year': month.year,
+            'month': month.month,
+            'closed': close is not None,
+            'closed_at': close.closed_at.isoformat() if close and close.closed_at else None,
+            'can_close': close is None and add_months(month, 1) <= date.today()
+        })
+        month = add_months(month, 1)
+    
+    return {
+        'fiscal_year': start.year,
+        'start': start.isoformat(),
+        'end': (end - timedelta(days=1)).isoformat(),
+        'months': months
+    }
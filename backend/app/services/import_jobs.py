@@ -0,0 +1,229 @@
+"""
+Background Excel imports
+An upload is saved under EXCEL_UPLOAD_FOLDER and tracked by its FileUpload row
+plus an ImportJob row holding progress. A small thread pool in each worker
+process reads the sheet and feeds it to the bulk importers in batches, each
+committed together with its progress so a status poll answered by any worker
+sees it. Rows of one invoice (sales) or one employee (payroll) stay in the
+same batch, so the importers' in-sheet checks still see them together. If a
+batch fails the job stops as failed; batches already committed stay imported.
+Daily sales rollups are refreshed once when the job ends, for the days its
+batches touched, rather than once per batch.
+"""
+import os
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import FileUpload, ImportJob
+from app.services.imports import import_products_frame, import_sales_frame, import_payroll_frame
+from app.services.rollups import refresh_rollup_days
+from app.utils.cache import bump_data_version
+from app.utils.xlsx import write_xlsx
+
+COUNT_KEYS = ('imported', 'updated', 'merged', 'skipped')
+ERROR_PREVIEW_SIZE = 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ==================== IMPORTERS ====================
+
+def _import_products(df, options):
+    result = import_products_frame(df)
+    bump_data_version('products')
+    return result
+
+
+def _import_sales(df, options):
+    # Rollups are refreshed once for the whole job, see _process
+    result = import_sales_frame(df, existing=options.get('existing', 'skip'))
+    bump_data_version('sales')
+    return result
+
+
+def _import_payroll(df, options):
+    result = import_payroll_frame(df)
+    bump_data_version('payroll_records')
+    return result
+
+
+# import type -> (column whose rows must share a batch, importer)
+IMPORTERS = {
+    'products': ('SKU', _import_products),
+    'sales': ('Invoice Number', _import_sales),
+    'payroll': ('Employee Email', _import_payroll)
+}
+
+
+def _batches(df, key_column, size):
+    """Row batches of about size rows, never splitting rows that share a key"""
+    if key_column in df:
+        keys = df[key_column].astype(str).str.strip()
+    else:
+        keys = pd.Series(df.index, index=df.index)
+    
+    group = pd.Series(pd.factorize(keys)[0], index=df.index)
+    group_sizes = group.value_counts(sort=False).sort_index()
+    # Groups in order of first appearance, cut where the running total crosses size
+    batch_of_group = ((group_sizes.cumsum() - group_sizes) // size).to_dict()
+    batch = group.map(batch_of_group)
+    
+    for number in sorted(batch.unique()):
+        yield df[batch == number]
+
+
+# ==================== JOBS ====================
+
+def _pool(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config['IMPORT_WORKERS'],
+                thread_name_prefix='excel-import'
+            )
+        return _executor
+
+
+def start_import(import_type, file, user_id=None, options=None):
+    """
+    Save the uploaded file, record it and queue its import
+    Commits the FileUpload and ImportJob rows before the import starts, so the
+    job can be polled at once. Returns the ImportJob.
+    """
+    if import_type not in IMPORTERS:
+        raise ValueError(f'Unknown import type: {import_type}')
+    
+    app = current_app._get_current_object()
+    folder = app.config['EXCEL_UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    
+    filename = f"{import_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+    file_path = os.path.join(folder, filename)
+    file.save(file_path)
+    
+    upload = FileUpload(
+        filename=filename,
+        original_filename=file.filename,
+        file_path=file_path,
+        file_type='excel',
+        file_size=os.path.getsize(file_path),
+        category=import_type,
+        uploaded_by=user_id,
+        status='uploaded'
+    )
+    job = ImportJob(upload=upload, import_type=import_type, options=options or {}, rows_processed=0, error_count=0)
+    db.session.add_all([upload, job])
+    db.session.commit()
+    
+    if app.config['IMPORT_WORKERS'] > 0:
+        _pool(app).submit(_run, app, upload.id)
+    else:
+        _run(app, upload.id)
+        db.session.expire_all()
+    
+    return job
+
+
+def _run(app, upload_id):
+    # Own app context, so the job gets its own session
+    with app.app_context():
+        try:
+            _process(upload_id)
+        except Exception as e:
+            db.session.rollback()
+            upload = db.session.get(FileUpload, upload_id)
+            if upload is not None:
+                upload.status = 'failed'
+                upload.processed_at = datetime.utcnow()
+                upload.import_job.message = str(e)
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def _process(upload_id):
+    upload = db.session.get(FileUpload, upload_id)
+    job = upload.import_job
+    key_column, importer = IMPORTERS[job.import_type]
+    
+    upload.status = 'processing'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    
+    df = pd.read_excel(upload.file_path)
+    job.rows_total = len(df)
+    db.session.commit()
+    
+    counts = defaultdict(int)
+    errors = []
+    sale_dates = set()
+    status = 'processed'
+    
+    try:
+        for batch in _batches(df, key_column, current_app.config['IMPORT_BATCH_ROWS']):
+            result = importer(batch, job.options or {})
+            
+            for key in COUNT_KEYS:
+                counts[key] += result.get(key, 0)
+            errors.extend(result['errors'])
+            sale_dates.update(result.get('sale_dates', ()))
+            
+            job.rows_processed = (job.rows_processed or 0) + len(batch)
+            job.counts = dict(counts)
+            job.error_count = len(errors)
+            job.error_preview = [_error_text(row, message) for row, message in errors[:ERROR_PREVIEW_SIZE]]
+            upload.records_imported = counts['imported']
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        status = 'failed'
+        job.message = str(e)
+    
+    # Days of the committed batches; a failed batch's days only cost a redundant refresh
+    if sale_dates:
+        refresh_rollup_days(sale_dates)
+        bump_data_version('sales')
+    
+    if errors:
+        job.error_report_path = _write_error_report(upload, errors)
+    
+    upload.status = status
+    upload.processed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _error_text(row, message):
+    """Preview line of an importer error; row is None for errors about the sheet as a whole"""
+    return message if row is None else f'Row {row}: {message}'
+
+
+def _write_error_report(upload, errors):
+    """Row / Error workbook next to the upload, sheet-level errors first; returns its path"""
+    path = os.path.splitext(upload.file_path)[0] + '_errors.xlsx'
+    rows = sorted(errors, key=lambda error: (error[0] is not None, error[0] or 0))
+    write_xlsx(path, 'Errors', ['Row', 'Error'], [('' if row is None else row, message) for row, message in rows])
+    return path
+
+
+def get_import_job(upload_id):
+    """The job for an upload, or None; a job whose worker went quiet is marked failed"""
+    job = db.session.get(ImportJob, upload_id)
+    if job is None:
+        return None
+    
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['IMPORT_STALE_SECONDS'])
+    if job.upload.status in ('uploaded', 'processing') and job.updated_at and job.updated_at < stale_before:
+        job.upload.status = 'failed'
+        job.upload.processed_at = datetime.utcnow()
+        job.message = 'Import stopped before finishing (worker restarted); batches already committed were kept'
+        db.session.commit()
+    
+    return job
@@ -0,0 +1,481 @@
+"""
+Bulk Excel imports
+Each importer validates and coerces whole columns with pandas, preloads the
+rows it needs to match against in a handful of IN queries, and writes with
+chunked bulk INSERT / UPDATE statements. Row-level problems are reported as
+(row, message) pairs using spreadsheet row numbers (header is row 1).
+"""
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import select, insert, update
+from app import db
+from app.models import Product, Category, Customer, Sale, SaleItem, User, PayrollRecord
+from app.services.financial import closed_months
+from app.services.invoices import claim_invoice_numbers
+from app.utils.periods import add_months
+
+CHUNK_SIZE = 1000
+TRUE_VALUES = ['yes', 'true', '1']
+
+
+# ==================== COLUMN HELPERS ====================
+
+def _chunks(values, size=CHUNK_SIZE):
+    # tolist() gives native Python values; drivers mis-bind numpy scalars
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _row_number(index):
+    return index + 2
+
+
+def _row_label(index):
+    return f"Row {_row_number(index)}"
+
+
+def _text(df, column):
+    """Stripped strings for a column; None for blank cells or a missing column"""
+    if column not in df:
+        return pd.Series(None, index=df.index, dtype=object)
+    
+    def clean(value):
+        if pd.isna(value):
+            return None
+        return str(value).strip() or None
+    
+    # Built as an object Series: Series.map infers a string dtype under pandas 3,
+    # which turns the None of blank cells back into NaN
+    return pd.Series([clean(value) for value in df[column].tolist()], index=df.index, dtype=object)
+
+
+def _number(df, column, errors):
+    """Numeric column (NaN where blank); non-numeric cells are recorded as row errors"""
+    if column not in df:
+        return pd.Series(float('nan'), index=df.index)
+    
+    values = pd.to_numeric(df[column], errors='coerce')
+    invalid = df[column].notna() & values.isna()
+    for index in df.index[invalid]:
+        errors.setdefault(index, f'{column} must be a number')
+    return values
+
+
+def _flag(df, column, default):
+    """Yes/True/1 flags; blank cells and a missing column take the default"""
+    if column not in df:
+        return pd.Series(default, index=df.index)
+    
+    flags = df[column].astype(str).str.strip().str.lower().isin(TRUE_VALUES)
+    return flags.where(df[column].notna(), default)
+
+
+def _present(value):
+    return value is not None and not pd.isna(value)
+
+
+def _row_errors(errors):
+    return [(_row_number(index), message) for index, message in sorted(errors.items())]
+
+
+# ==================== PRODUCTS ====================
+
+def _existing_products(skus):
+    """SKU -> current column values for products already in the catalog"""
+    existing = {}
+    for chunk in _chunks(skus):
+        rows = db.session.execute(
+            select(
+                Product.id, Product.sku, Product.name, Product.description, Product.category_id,
+                Product.item_cost, Product.selling_price, Product.current_stock, Product.low_stock_threshold
+            ).where(Product.sku.in_(chunk))
+        ).mappings()
+        for row in rows:
+            existing[row['sku']] = dict(row)
+    return existing
+
+
+def _category_ids(names):
+    """Category name -> id, creating missing categories with one bulk insert"""
+    categories = {name: category_id for category_id, name in db.session.execute(select(Category.id, Category.name))}
+    
+    missing = sorted(set(names) - set(categories))
+    if missing:
+        db.session.execute(insert(Category), [{'name': name} for name in missing])
+        for chunk in _chunks(missing):
+            for category_id, name in db.session.execute(
+                select(Category.id, Category.name).where(Category.name.in_(chunk))
+            ):
+                categories[name] = category_id
+    
+    return categories
+
+
+def import_products_frame(df):
+    """
+    Insert or update products from an Excel sheet keyed by SKU
+    Returns {'imported', 'updated', 'errors'}; rows with errors are skipped.
+    Repeated SKUs apply in sheet order, so the last row wins.
+    """
+    errors = {}
+    
+    columns = pd.DataFrame({
+        'sku': _text(df, 'SKU'),
+        'name': _text(df, 'Name'),
+        'description': _text(df, 'Description'),
+        'category': _text(df, 'Category'),
+        'item_cost': _number(df, 'Item Cost', errors),
+        'selling_price': _number(df, 'Selling Price', errors),
+        'current_stock': _number(df, 'Current Stock', errors),
+        'low_stock_threshold': _number(df, 'Low Stock Threshold', errors),
+        'is_service': _flag(df, 'Is Service', False),
+        'track_inventory': _flag(df, 'Track Inventory', True)
+    }, index=df.index)
+    
+    for index in columns.index[columns['sku'].isna()]:
+        errors[index] = 'SKU is required'
+    
+    valid = columns.drop(index=list(errors))
+    
+    existing = _existing_products(valid['sku'].unique())
+    category_ids = _category_ids(valid['category'].dropna().unique())
+    
+    # Final state per SKU; a repeated SKU builds on the earlier row like an update
+    pending = {}
+    imported_count = 0
+    updated_count = 0
+    
+    for row in valid.itertuples():
+        try:
+            base = pending.get(row.sku) or existing.get(row.sku) or {}
+            if not _present(row.name) and not base.get('name'):
+                errors[row.Index] = 'Name is required for a new product'
+                continue
+            
+            state = {
+                'sku': row.sku,
+                'name': row.name if _present(row.name) else base['name'],
+                'description': row.description if _present(row.description) else base.get('description') or '',
+                'category_id': category_ids[row.category] if _present(row.category) else base.get('category_id'),
+                'item_cost': float(row.item_cost) if _present(row.item_cost) else float(base.get('item_cost') or 0),
+                'selling_price': float(row.selling_price) if _present(row.selling_price) else float(base.get('selling_price') or 0),
+                'is_service': bool(row.is_service),
+                'track_inventory': bool(row.track_inventory),
+                'current_stock': int(row.current_stock) if _present(row.current_stock) else int(base.get('current_stock') or 0),
+                'low_stock_threshold': int(row.low_stock_threshold) if _present(row.low_stock_threshold) else int(base.get('low_stock_threshold') or 10)
+            }
+        except (ValueError, TypeError, OverflowError) as e:
+            errors[row.Index] = str(e)
+            continue
+        except Exception as e:
+            # Anything unforeseen fails the row, not the whole import
+            errors[row.Index] = f'Could not read row: {e!r}'
+            continue
+        
+        if base:
+            updated_count += 1
+        else:
+            imported_count += 1
+        pending[row.sku] = state
+    
+    inserts = [state for sku, state in pending.items() if sku not in existing]
+    updates = [dict(state, id=existing[sku]['id']) for sku, state in pending.items() if sku in existing]
+    
+    for chunk in _chunks(inserts):
+        db.session.execute(insert(Product), chunk)
+    for chunk in _chunks(updates):
+        db.session.execute(update(Product), chunk)
+    
+    return {
+        'imported': imported_count,
+        'updated': updated_count,
+        'errors': _row_errors(errors)
+    }
+
+
+# ==================== SALES ====================
+
+EXISTING_INVOICE_MODES = ('skip', 'merge')
+
+
+def _date(df, column, errors):
+    """Dates at midnight (NaT where blank); unparseable cells are recorded as row errors"""
+    if column not in df:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    
+    values = pd.to_datetime(df[column], errors='coerce')
+    invalid = df[column].notna() & values.isna()
+    for index in df.index[invalid]:
+        errors.setdefault(index, f'{column} is not a valid date')
+    return values.dt.normalize()
+
+
+def _lookup(column, key_column, values, order_by=None):
+    """key -> id for rows whose key_column is in values, in chunked IN queries (first id wins)"""
+    found = {}
+    for chunk in _chunks(values):
+        statement = select(key_column, column).where(key_column.in_(chunk))
+        if order_by is not None:
+            statement = statement.order_by(order_by)
+        for key, value in db.session.execute(statement):
+            found.setdefault(key, value)
+    return found
+
+
+def import_sales_frame(df, existing='skip'):
+    """
+    Import sales from an Excel sheet with one row per sale line
+    Rows are grouped by Invoice Number wherever they appear; the first row of
+    each invoice supplies the sale header. Invoices already in the database are
+    skipped, or with existing='merge' get the file's header and lines in place
+    of their own (so re-importing a file is idempotent). Invoices dated in a
+    closed month, or merging into a sale dated in one, are rejected.
+    Returns {'imported', 'merged', 'skipped', 'errors', 'sale_dates'}.
+    """
+    errors = {}
+    
+    invoice = _text(df, 'Invoice Number')
+    df = df[invoice.notna()]
+    
+    frame = pd.DataFrame({
+        'invoice': invoice[df.index],
+        'sale_date': _date(df, 'Sale Date', errors),
+        'customer': _text(df, 'Customer'),
+        'payment_status': _text(df, 'Payment Status'),
+        'subtotal': _number(df, 'Sale Subtotal', errors),
+        'tax_amount': _number(df, 'Sale Tax', errors),
+        'total_amount': _number(df, 'Sale Total', errors),
+        'sku': _text(df, 'SKU'),
+        'quantity': _number(df, 'Quantity', errors),
+        'unit_price': _number(df, 'Unit Price', errors),
+        'discount_percentage': _number(df, 'Discount %', errors),
+        'line_total': _number(df, 'Line Total', errors)
+    }, index=df.index)
+    
+    # The first row of each invoice carries the header; a bad header skips the invoice
+    headers = frame.drop_duplicates('invoice', keep='first')
+    bad_headers = headers.index.isin(list(errors))
+    headers = headers[~bad_headers]
+    
+    existing_sales = {}
+    for chunk in _chunks(headers['invoice']):
+        for sale_id, invoice_number, sale_date in db.session.execute(
+            select(Sale.id, Sale.invoice_number, Sale.sale_date).where(Sale.invoice_number.in_(chunk))
+        ):
+            existing_sales[invoice_number] = (sale_id, sale_date)
+    
+    is_existing = headers['invoice'].isin(list(existing_sales))
+    skipped = int(is_existing.sum()) if existing == 'skip' else 0
+    if existing == 'skip':
+        headers = headers[~is_existing]
+        is_existing = is_existing[~is_existing]
+    
+    # Header values, vectorized
+    today = pd.Timestamp(datetime.now().date())
+    walk_in = headers['customer'].isna() | (headers['customer'].str.lower() == 'walk-in')
+    customer_names = headers['customer'][~walk_in].unique()
+    customer_ids = _lookup(Customer.id, Customer.name, customer_names, order_by=Customer.id)
+    
+    header_rows = pd.DataFrame({
+        'invoice_number': headers['invoice'],
+        'sale_date': headers['sale_date'].fillna(today),
+        'customer_id': headers['customer'].map(customer_ids).where(~walk_in),
+        'payment_status': headers['payment_status'].fillna('paid'),
+        'subtotal': headers['subtotal'].fillna(0),
+        'tax_amount': headers['tax_amount'].fillna(0),
+        'total_amount': headers['total_amount'].fillna(0)
+    })
+    header_rows['amount_paid'] = header_rows['total_amount']
+    
+    # Closed months are immutable: reject invoices dated in one, or merging into a sale dated in one
+    old_dates = [existing_sales[number][1] if number in existing_sales else None for number in headers['invoice']]
+    closed = closed_months(header_rows['sale_date'].tolist() + old_dates)
+    if closed:
+        in_closed = []
+        for index, sale_date, old_date in zip(header_rows.index, header_rows['sale_date'], old_dates):
+            months = {add_months(day, 0) for day in (sale_date, old_date) if day is not None} & closed
+            if months:
+                errors[index] = f'{min(months):%Y-%m} is closed'
+                in_closed.append(index)
+        is_existing = is_existing.drop(index=in_closed)
+        header_rows = header_rows.drop(index=in_closed)
+    
+    def records(rows):
+        return [
+            dict(
+                record,
+                sale_date=record['sale_date'].to_pydatetime(),
+                customer_id=None if pd.isna(record['customer_id']) else int(record['customer_id'])
+            ) for record in rows.to_dict('records')
+        ]
+    
+    new_sales = records(header_rows[~is_existing])
+    merged_sales = [
+        dict(record, id=existing_sales[record['invoice_number']][0])
+        for record in records(header_rows[is_existing])
+    ]
+    
+    for chunk in _chunks(new_sales):
+        db.session.execute(insert(Sale), chunk)
+    # Imported numbers bypass the allocator; move the day counters past them
+    claim_invoice_numbers(sale['invoice_number'] for sale in new_sales)
+    for chunk in _chunks(merged_sales):
+        db.session.execute(update(Sale), chunk)
+    
+    sale_ids = _lookup(Sale.id, Sale.invoice_number, [sale['invoice_number'] for sale in new_sales])
+    sale_ids.update({sale['invoice_number']: sale['id'] for sale in merged_sales})
+    
+    # Merged invoices take the file's lines in place of their own
+    for chunk in _chunks(sale['id'] for sale in merged_sales):
+        SaleItem.query.filter(SaleItem.sale_id.in_(chunk)).delete(synchronize_session=False)
+    
+    # Lines: rows of accepted invoices that name a SKU and parsed cleanly
+    lines = frame[frame['invoice'].isin(list(sale_ids)) & frame['sku'].notna()]
+    lines = lines[~lines.index.isin(list(errors))]
+    
+    product_ids = _lookup(Product.id, Product.sku, lines['sku'].unique())
+    product_id = lines['sku'].map(product_ids)
+    for index in lines.index[product_id.isna()]:
+        errors[index] = f"Product with SKU '{lines.at[index, 'sku']}' not found"
+    
+    found = product_id.notna()
+    item_rows = pd.DataFrame({
+        'sale_id': lines['invoice'][found].map(sale_ids).astype(int),
+        'product_id': product_id[found].astype(int),
+        'quantity': lines['quantity'][found].fillna(1).astype(int),
+        'unit_price': lines['unit_price'][found].fillna(0),
+        'discount_percentage': lines['discount_percentage'][found].fillna(0),
+        'line_total': lines['line_total'][found].fillna(0)
+    }).to_dict('records')
+    
+    for chunk in _chunks(item_rows):
+        db.session.execute(insert(SaleItem), chunk)
+    
+    # Rollups must cover both the imported dates and the old dates of merged sales
+    sale_dates = [sale['sale_date'] for sale in new_sales + merged_sales]
+    sale_dates += [existing_sales[sale['invoice_number']][1] for sale in merged_sales]
+    
+    return {
+        'imported': len(new_sales),
+        'merged': len(merged_sales),
+        'skipped': skipped,
+        'errors': _row_errors(errors),
+        'sale_dates': sale_dates
+    }
+
+
+# ==================== PAYROLL ====================
+
+PAYROLL_AMOUNT_COLUMNS = {
+    'regular_hours': 'Regular Hours',
+    'overtime_hours': 'Overtime Hours',
+    'hourly_rate': 'Hourly Rate',
+    'regular_pay': 'Regular Pay',
+    'overtime_pay': 'Overtime Pay',
+    'bonuses': 'Bonuses',
+    'gross_pay': 'Gross Pay',
+    'tax_deductions': 'Tax Deductions',
+    'insurance_deductions': 'Insurance Deductions',
+    'total_deductions': 'Total Deductions',
+    'net_pay': 'Net Pay'
+}
+
+
+def import_payroll_frame(df):
+    """
+    Insert new payroll records from an Excel sheet
+    Rows are rejected for unknown employees, bad dates or amounts, a period that
+    already exists or starts in a closed month, or a period that duplicates or
+    overlaps another row for the same employee in the sheet. Returns
+    {'imported', 'errors'}.
+    """
+    errors = {}
+    
+    frame = pd.DataFrame({
+        'email': _text(df, 'Employee Email'),
+        'start': _date(df, 'Period Start', errors),
+        'end': _date(df, 'Period End', errors),
+        'is_paid': _flag(df, 'Is Paid', False),
+        'payment_date': _date(df, 'Payment Date', errors)
+    }, index=df.index)
+    for field, column in PAYROLL_AMOUNT_COLUMNS.items():
+        frame[field] = _number(df, column, errors).fillna(0)
+    
+    for index in frame.index[frame['email'].isna()]:
+        errors[index] = 'Employee email is required'
+    
+    employee_ids = _lookup(User.id, User.email, frame['email'].dropna().unique())
+    frame['employee_id'] = frame['email'].map(employee_ids)
+    for index in frame.index[frame['email'].notna() & frame['employee_id'].isna()]:
+        errors.setdefault(index, f"Employee with email '{frame.at[index, 'email']}' not found")
+    
+    for index in frame.index[frame['start'].isna()]:
+        errors.setdefault(index, 'Period Start is required')
+    for index in frame.index[frame['end'].isna()]:
+        errors.setdefault(index, 'Period End is required')
+    for index in frame.index[frame['end'] < frame['start']]:
+        errors.setdefault(index, 'Period End is before Period Start')
+    
+    valid = frame.drop(index=list(errors))
+    
+    # Periods already stored, in one query over the sheet's employees and date span
+    existing_keys = set()
+    if len(valid):
+        for chunk in _chunks(valid['employee_id'].astype(int).unique()):
+            existing_keys.update(db.session.execute(
+                select(PayrollRecord.employee_id, PayrollRecord.pay_period_start).where(
+                    PayrollRecord.employee_id.in_(chunk),
+                    PayrollRecord.pay_period_start >= valid['start'].min().date(),
+                    PayrollRecord.pay_period_start <= valid['start'].max().date()
+                )
+            ).all())
+    
+    keys = pd.Series(list(zip(valid['employee_id'].astype(int), valid['start'].dt.date)), index=valid.index, dtype=object)
+    for index in valid.index[keys.map(lambda key: key in existing_keys).astype(bool)]:
+        errors[index] = 'Payroll record already exists for this period'
+    
+    # Duplicates within the sheet: the first row for an (employee, start) pair wins
+    first_row = valid.index.to_series().groupby([valid['employee_id'], valid['start']]).transform('first')
+    for index in valid.index[valid.index != first_row]:
+        errors.setdefault(index, f'Duplicate pay period (first given on {_row_label(first_row[index])})')
+    
+    # Overlaps within the sheet: sweep each employee's periods in start order,
+    # rejecting any that begins on or before the end of the last accepted one
+    remaining = valid.drop(index=[index for index in valid.index if index in errors])
+    ordered = remaining.sort_values(['employee_id', 'start'], kind='stable')
+    last_employee = None
+    accepted_end = accepted_row = None
+    for index, employee_id, start, end in zip(ordered.index, ordered['employee_id'], ordered['start'], ordered['end']):
+        if employee_id == last_employee and start <= accepted_end:
+            errors[index] = f'Pay period overlaps the one on {_row_label(accepted_row)} for this employee'
+            continue
+        last_employee, accepted_end, accepted_row = employee_id, end, index
+    
+    closed = closed_months(remaining['start'].tolist())
+    for index, start in zip(remaining.index, remaining['start']):
+        if add_months(start, 0) in closed:
+            errors.setdefault(index, f'{start:%Y-%m} is closed')
+    
+    records = remaining.drop(index=[index for index in remaining.index if index in errors])
+    
+    rows = pd.DataFrame({
+        'employee_id': records['employee_id'].astype(int),
+        'pay_period_start': records['start'].dt.date,
+        'pay_period_end': records['end'].dt.date,
+        'is_paid': records['is_paid'].astype(bool),
+        # Python None, not NaT/NaN, for unpaid rows and blank dates
+        'payment_date': [
+            payment_date.date() if paid and not pd.isna(payment_date) else None
+            for paid, payment_date in zip(records['is_paid'].astype(bool), records['payment_date'])
+        ],
+        **{field: records[field] for field in PAYROLL_AMOUNT_COLUMNS}
+    }).to_dict('records')
+    
+    for chunk in _chunks(rows):
+        db.session.execute(insert(PayrollRecord), chunk)
+    
+    return {
+        'imported': len(rows),
+        'errors': _row_errors(errors)
+    }
@@ -0,0 +1,116 @@
+"""
+Inventory valuation and slow movers
+Valuation is summed in SQL over the tracked products instead of loading them,
+and slow movers are found with NOT EXISTS against inventory_logs, which the
+(product_id, created_at) index answers with one probe per product rather than
+a list of every active product id sent back as NOT IN (...). Both return
+queries so the endpoints can paginate them.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, exists
+from app import db
+from app.models import Product, Category, InventoryLog
+
+MAX_LOOKBACK_DAYS = 3650
+
+
+def _cost_value():
+    return Product.item_cost * Product.current_stock
+
+
+def _retail_value():
+    return Product.selling_price * Product.current_stock
+
+
+def valuation_totals():
+    """Cost value, retail value, units and product count of tracked inventory in one query"""
+    cost_value, retail_value, total_items, unique_products = db.session.query(
+        func.sum(_cost_value()),
+        func.sum(_retail_value()),
+        func.sum(Product.current_stock),
+        func.count(Product.id)
+    ).filter(Product.track_inventory.is_(True)).one()
+    
+    cost_value = float(cost_value or 0)
+    retail_value = float(retail_value or 0)
+    
+    return {
+        'total_cost_value': round(cost_value, 2),
+        'total_retail_value': round(retail_value, 2),
+        'potential_profit': round(retail_value - cost_value, 2),
+        'total_items': int(total_items or 0),
+        'unique_products': unique_products
+    }
+
+
+def valuation_by_category():
+    """Tracked inventory value per category, largest first"""
+    rows = db.session.query(
+        Category.id,
+        Category.name,
+        func.sum(_cost_value()),
+        func.sum(_retail_value()),
+        func.sum(Product.current_stock),
+        func.count(Product.id)
+    ).select_from(Product).outerjoin(Category, Category.id == Product.category_id).filter(
+        Product.track_inventory.is_(True)
+    ).group_by(Category.id, Category.name).order_by(func.sum(_cost_value()).desc()).all()
+    
+    return [
+        {
+            'category_id': category_id,
+            'category': name,
+            'cost_value': round(float(cost_value or 0), 2),
+            'retail_value': round(float(retail_value or 0), 2),
+            'total_items': int(total_items or 0),
+            'products': products
+        } for category_id, name, cost_value, retail_value, total_items, products in rows
+    ]
+
+
+def valuation_rows(category_id=None):
+    """Query of (Product, cost value, retail value) for tracked products, most valuable first"""
+    cost_value = _cost_value().label('cost_value')
+    retail_value = _retail_value().label('retail_value')
+    
+    query = db.session.query(Product, cost_value, retail_value).filter(Product.track_inventory.is_(True))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    
+    return query.order_by(cost_value.desc(), Product.id)
+
+
+def lookback_days(value=None):
+    """Slow-mover window in days: the given value, else INVENTORY_SLOW_MOVER_DAYS, within 1..MAX_LOOKBACK_DAYS"""
+    days = value or current_app.config.get('INVENTORY_SLOW_MOVER_DAYS', 30)
+    return max(1, min(int(days), MAX_LOOKBACK_DAYS))
+
+
+def slow_movers(days, now=None):
+    """Query of tracked products in stock with no inventory log in the last days days"""
+    since = (now or datetime.now()) - timedelta(days=days)
+    
+    recent_movement = exists().where(
+        InventoryLog.product_id == Product.id,
+        InventoryLog.created_at >= since
+    )
+    
+    return Product.query.filter(
+        Product.track_inventory.is_(True),
+        Product.current_stock > 0,
+        ~recent_movement
+    )
+
+
+def last_movements(product_ids):
+    """Latest inventory log time per product, for a page of products"""
+    if not product_ids:
+        return {}
+    
+    rows = db.session.execute(
+        select(InventoryLog.product_id, func.max(InventoryLog.created_at)).where(
+            InventoryLog.product_id.in_(product_ids)
+        ).group_by(InventoryLog.product_id)
+    ).all()
+    return dict(rows)
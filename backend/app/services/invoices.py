@@ -0,0 +1,128 @@
+"""
+Invoice number allocation
+Numbers come from a per-day counter row bumped with a single UPDATE, so issuing
+one is O(1) and unique across gunicorn workers. Like a database sequence,
+numbers are never handed out twice; a rolled-back sale may leave a gap.
+Bulk paths that write invoice numbers themselves (Excel imports) must call
+claim_invoice_numbers so the counters move past them.
+"""
+import re
+from datetime import datetime
+from sqlalchemy import update, select, insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Sale, InvoiceCounter
+
+INVOICE_PATTERN = re.compile(r'^INV-(\d{8})-(\d+)$')
+
+
+def format_invoice_number(day, number):
+    return f"INV-{day.strftime('%Y%m%d')}-{number:04d}"
+
+
+def _existing_last_number(connection, day):
+    """Highest number already used for the day (invoices issued before the counter existed)"""
+    prefix = format_invoice_number(day, 0)[:-4]
+    # Range on the unique invoice_number index instead of LIKE
+    rows = connection.execute(
+        select(Sale.invoice_number).where(
+            Sale.invoice_number >= prefix,
+            Sale.invoice_number < prefix[:-1] + '.'
+        )
+    ).scalars()
+    
+    numbers = [int(number[len(prefix):]) for number in rows if number[len(prefix):].isdigit()]
+    return max(numbers, default=0)
+
+
+def _allocate(connection, day, count):
+    """Advance the day's counter by count and return the new last number"""
+    table = InvoiceCounter.__table__
+    advance = update(table).where(table.c.counter_date == day).values(
+        last_number=table.c.last_number + count
+    )
+    
+    if not connection.execute(advance).rowcount:
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(
+                    counter_date=day,
+                    last_number=_existing_last_number(connection, day) + count
+                ))
+        except IntegrityError:
+            # Another worker created the day's row first
+            connection.execute(advance)
+    
+    return connection.execute(
+        select(table.c.last_number).where(table.c.counter_date == day)
+    ).scalar_one()
+
+
+def _raise_counter(connection, day, number):
+    """Make the day's counter at least number, creating it if missing"""
+    table = InvoiceCounter.__table__
+    raise_to = update(table).where(
+        table.c.counter_date == day,
+        table.c.last_number < number
+    ).values(last_number=number)
+    
+    if connection.execute(raise_to).rowcount:
+        return
+    if connection.execute(select(table.c.counter_date).where(table.c.counter_date == day)).first():
+        return
+    
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(table).values(
+                counter_date=day,
+                last_number=max(number, _existing_last_number(connection, day))
+            ))
+    except IntegrityError:
+        # Another worker created the day's row first
+        connection.execute(raise_to)
+
+
+def _run_on_counters(allocate):
+    """Run allocate(connection) where counter changes belong for this database"""
+    if db.engine.dialect.name == 'sqlite':
+        # Single writer anyway; a second connection would wait on the caller's lock
+        return allocate(db.session.connection())
+    # Own short transaction so the counter row lock is not held until the
+    # caller's (possibly long) sale transaction commits
+    with db.engine.begin() as connection:
+        return allocate(connection)
+
+
+def claim_invoice_numbers(invoice_numbers):
+    """Advance each day's counter past INV-YYYYMMDD-NNNN numbers written without reserving them"""
+    highest = {}
+    for invoice_number in invoice_numbers:
+        match = INVOICE_PATTERN.match(invoice_number or '')
+        if not match:
+            continue
+        try:
+            day = datetime.strptime(match[1], '%Y%m%d').date()
+        except ValueError:
+            continue
+        highest[day] = max(highest.get(day, 0), int(match[2]))
+    
+    def raise_counters(connection):
+        for day, number in sorted(highest.items()):
+            _raise_counter(connection, day, number)
+    
+    if highest:
+        _run_on_counters(raise_counters)
+
+
+def reserve_invoice_numbers(count=1, day=None):
+    """Reserve count consecutive invoice numbers for day (default today), in order"""
+    day = day or datetime.now().date()
+    if isinstance(day, datetime):
+        day = day.date()
+    
+    last = _run_on_counters(lambda connection: _allocate(connection, day, count))
+    return [format_invoice_number(day, number) for number in range(last - count + 1, last + 1)]
+
+
+def next_invoice_number(day=None):
+    return reserve_invoice_numbers(1, day)[0]
@@ -0,0 +1,468 @@
+"""
+Payroll runs
+Generates one pay period's records for every active employee in a single
+transaction. Rates come from the users table, hours and per-employee
+adjustments from an optional timesheet, and pay, overtime, deductions and net
+pay are computed column-wise with pandas across all employees before one
+chunked bulk INSERT. Employees who already have a record overlapping the
+period, or who have nothing to be paid, are skipped and listed in the summary.
+
+The payroll summary is one grouped query over the year by (month, department)
+with conditional sums for paid and pending records, so its cost depends on the
+number of months and departments rather than on the number of records.
+
+Disbursement batches and bulk deletes select unpaid records by id list, pay
+period and/or department and act on them with set-based statements: a batch
+claims its records with one INSERT ... SELECT into payroll_disbursement_items,
+whose primary key keeps a record from landing in two batches, then marks them
+paid with one UPDATE. Runs and deletes touching a closed month are rejected
+(assert_period_open); paying records of one is still allowed.
+"""
+import calendar
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, func, extract, case, literal, and_
+from app import db
+from app.models import User, PayrollRecord, PayrollDisbursement, PayrollDisbursementItem
+from app.services.financial import assert_period_open
+from app.utils.periods import in_period
+
+OVERTIME_MULTIPLIER = 1.5
+INSERT_CHUNK_SIZE = 1000
+
+# Per-employee timesheet values; blank ones fall back to the run's defaults
+TIMESHEET_FIELDS = (
+    'regular_hours', 'overtime_hours', 'bonuses', 'tax_deductions', 'insurance_deductions', 'other_deductions'
+)
+SUMMARY_FIELDS = ('records', 'gross_pay', 'total_deductions', 'net_pay', 'paid', 'pending')
+UNASSIGNED_DEPARTMENT = 'Unassigned'
+MONEY_FIELDS = (
+    'base_salary', 'regular_pay', 'overtime_pay', 'bonuses', 'gross_pay', 'tax_deductions',
+    'insurance_deductions', 'other_deductions', 'total_deductions', 'net_pay'
+)
+
+
+class PayrollError(ValueError):
+    """A payroll run or batch that cannot be carried out; status is the HTTP status to report"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except (TypeError, ValueError):
+        raise PayrollError(f'Invalid {field}: {value}')
+
+
+def _number(value, field, minimum=0):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise PayrollError(f'{field} must be a number')
+    if not np.isfinite(number) or number < minimum:
+        raise PayrollError(f'{field} must be at least {minimum}')
+    return number
+
+
+def salary_fraction(start, end):
+    """Share of a monthly salary earned in [start, end]: 1 for a calendar month, 0.5 for its halves, else by days"""
+    days_in_month = calendar.monthrange(start.year, start.month)[1]
+    month_end = start.replace(day=days_in_month)
+    
+    if start.day == 1 and end == month_end:
+        return 1.0
+    if (start.day == 1 and end == start.replace(day=15)) or (start.day == 16 and end == month_end):
+        return 0.5
+    return round(((end - start).days + 1) / days_in_month, 4)
+
+
+def _timesheet_frame(timesheets):
+    """Validated timesheet entries as a frame indexed by employee_id"""
+    if not isinstance(timesheets, list):
+        raise PayrollError('timesheets must be a list')
+    
+    rows = []
+    for position, entry in enumerate(timesheets, start=1):
+        if not isinstance(entry, dict) or entry.get('employee_id') is None:
+            raise PayrollError(f'Timesheet entry {position} needs an employee_id')
+        try:
+            employee_id = int(entry['employee_id'])
+        except (TypeError, ValueError):
+            raise PayrollError(f'Timesheet entry {position}: invalid employee_id')
+        
+        row = {'employee_id': employee_id}
+        for field in TIMESHEET_FIELDS:
+            if entry.get(field) is not None:
+                row[field] = _number(entry[field], f'Timesheet entry {position} {field}')
+        rows.append(row)
+    
+    frame = pd.DataFrame(rows, columns=['employee_id', *TIMESHEET_FIELDS])
+    duplicated = frame['employee_id'][frame['employee_id'].duplicated()].unique().tolist()
+    if duplicated:
+        raise PayrollError(f'Employees listed more than once in the timesheet: {duplicated}')
+    return frame.set_index('employee_id').astype(float)
+
+
+def _employees(employee_ids=None, department=None):
+    statement = select(
+        User.id, User.first_name, User.last_name, User.username, User.department, User.hourly_rate, User.monthly_salary
+    ).where(User.is_active.is_(True))
+    if employee_ids is not None:
+        if not isinstance(employee_ids, list):
+            raise PayrollError('employee_ids must be a list of integers')
+        try:
+            employee_ids = sorted({int(employee_id) for employee_id in employee_ids})
+        except (TypeError, ValueError):
+            raise PayrollError('employee_ids must be a list of integers')
+    if employee_ids:
+        statement = statement.where(User.id.in_(employee_ids))
+    if department:
+        statement = statement.where(User.department == department)
+    
+    frame = pd.DataFrame(
+        db.session.execute(statement.order_by(User.id)).all(),
+        columns=['employee_id', 'first_name', 'last_name', 'username', 'department', 'hourly_rate', 'monthly_salary']
+    )
+    frame['name'] = (frame['first_name'].fillna('') + ' ' + frame['last_name'].fillna('')).str.strip()
+    frame['name'] = frame['name'].where(frame['name'] != '', frame['username'])
+    frame['hourly_rate'] = pd.to_numeric(frame['hourly_rate'], errors='coerce').astype(float).fillna(0.0)
+    frame['monthly_salary'] = pd.to_numeric(frame['monthly_salary'], errors='coerce').astype(float).fillna(0.0)
+    return frame.set_index('employee_id')
+
+
+def _overlapping(employee_ids, start, end):
+    """Employees among employee_ids with a record overlapping [start, end], in one query"""
+    found = set()
+    for position in range(0, len(employee_ids), INSERT_CHUNK_SIZE):
+        found.update(db.session.execute(
+            select(PayrollRecord.employee_id).where(
+                PayrollRecord.employee_id.in_(employee_ids[position:position + INSERT_CHUNK_SIZE]),
+                PayrollRecord.pay_period_start <= end,
+                PayrollRecord.pay_period_end >= start
+            ).distinct()
+        ).scalars())
+    return found
+
+
+def calculate_pay(frame, fraction, default_regular_hours=0, tax_rate=0, insurance_deduction=0):
+    """
+    Add pay columns to a frame of employees with hourly_rate, monthly_salary
+    and optional TIMESHEET_FIELDS columns (NaN where not submitted)
+    """
+    hourly = frame['hourly_rate']
+    regular_hours = frame['regular_hours'].fillna(default_regular_hours).where(hourly > 0, frame['regular_hours'].fillna(0))
+    
+    pay = pd.DataFrame(index=frame.index)
+    pay['hourly_rate'] = hourly
+    pay['regular_hours'] = regular_hours
+    pay['overtime_hours'] = frame['overtime_hours'].fillna(0)
+    pay['overtime_rate'] = (hourly * OVERTIME_MULTIPLIER).round(2)
+    pay['base_salary'] = (frame['monthly_salary'] * fraction).round(2)
+    pay['regular_pay'] = (pay['base_salary'] + hourly * regular_hours).round(2)
+    pay['overtime_pay'] = (pay['overtime_rate'] * pay['overtime_hours']).round(2)
+    pay['bonuses'] = frame['bonuses'].fillna(0).round(2)
+    pay['gross_pay'] = pay['regular_pay'] + pay['overtime_pay'] + pay['bonuses']
+    
+    # Submitted deductions win; otherwise the run's tax rate and flat insurance
+    pay['tax_deductions'] = frame['tax_deductions'].fillna(pay['gross_pay'] * tax_rate / 100).round(2)
+    pay['insurance_deductions'] = frame['insurance_deductions'].fillna(
+        pd.Series(np.where(pay['gross_pay'] > 0, insurance_deduction, 0.0), index=frame.index)
+    ).round(2)
+    pay['other_deductions'] = frame['other_deductions'].fillna(0).round(2)
+    pay['total_deductions'] = pay['tax_deductions'] + pay['insurance_deductions'] + pay['other_deductions']
+    pay['net_pay'] = pay['gross_pay'] - pay['total_deductions']
+    
+    for field in MONEY_FIELDS:
+        pay[field] = pay[field].round(2)
+    return pay
+
+
+def generate_payroll_run(data):
+    """
+    Create the payroll records of a pay period from a run request; the caller commits
+    data: pay_period_start, pay_period_end and optionally employee_ids, department,
+    timesheets, default_regular_hours, tax_rate (% of gross), insurance_deduction,
+    salary_fraction, payment_method and notes. Returns the run summary.
+    """
+    for field in ('pay_period_start', 'pay_period_end'):
+        if not data.get(field):
+            raise PayrollError(f'{field} is required')
+    start = _parse_date(data['pay_period_start'], 'pay_period_start')
+    end = _parse_date(data['pay_period_end'], 'pay_period_end')
+    if end < start:
+        raise PayrollError('pay_period_end is before pay_period_start')
+    if end - start > timedelta(days=31):
+        raise PayrollError('A pay period can span at most one month')
+    assert_period_open(start)
+    
+    fraction = data.get('salary_fraction')
+    fraction = salary_fraction(start, end) if fraction is None else _number(fraction, 'salary_fraction')
+    default_regular_hours = _number(data.get('default_regular_hours') or 0, 'default_regular_hours')
+    tax_rate = _number(data.get('tax_rate') or 0, 'tax_rate')
+    insurance_deduction = _number(data.get('insurance_deduction') or 0, 'insurance_deduction')
+    
+    employees = _employees(data.get('employee_ids'), data.get('department'))
+    timesheet = _timesheet_frame(data.get('timesheets') or [])
+    
+    unknown = sorted(set(timesheet.index) - set(employees.index))
+    if unknown:
+        raise PayrollError(f'Timesheet employees not found, inactive or outside the run: {unknown}', status=404)
+    
+    frame = employees.join(timesheet, how='left')
+    for field in TIMESHEET_FIELDS:
+        frame[field] = frame[field].astype(float)
+    pay = calculate_pay(frame, fraction, default_regular_hours, tax_rate, insurance_deduction)
+    
+    # Why each employee is left out, first reason wins
+    existing = _overlapping(frame.index.tolist(), start, end)
+    reasons = pd.Series(None, index=frame.index, dtype=object)
+    reasons[pay['gross_pay'] <= 0] = 'Nothing to pay (no salary, hours or bonus)'
+    reasons[pay['net_pay'] < 0] = 'Deductions exceed gross pay'
+    reasons[frame.index.isin(existing)] = 'Already has a payroll record for this period'
+    
+    included = reasons.isna()
+    records = pay[included]
+    
+    rows = pd.DataFrame({
+        'employee_id': records.index.astype(int),
+        'pay_period_start': start,
+        'pay_period_end': end,
+        **{field: records[field].to_numpy() for field in (
+            'hourly_rate', 'regular_hours', 'overtime_hours', 'overtime_rate', *MONEY_FIELDS
+        )},
+        'is_paid': False,
+        'payment_method': data.get('payment_method', 'bank_transfer'),
+        'notes': data.get('notes', '')
+    }).to_dict('records')  # boxes native Python numbers, which every driver binds
+    
+    for position in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(insert(PayrollRecord), rows[position:position + INSERT_CHUNK_SIZE])
+    
+    skipped = frame.loc[~included, ['name']].assign(reason=reasons[~included])
+    
+    return {
+        'pay_period_start': start.isoformat(),
+        'pay_period_end': end.isoformat(),
+        'salary_fraction': fraction,
+        'employees': len(frame),
+        'created': len(rows),
+        'skipped': [
+            {'employee_id': int(employee_id), 'name': name, 'reason': reason}
+            for employee_id, name, reason in skipped.itertuples()
+        ],
+        'totals': {
+            field: round(float(records[field].sum()), 2)
+            for field in ('regular_pay', 'overtime_pay', 'bonuses', 'gross_pay', 'total_deductions', 'net_pay')
+        }
+    }
+
+
+def _rounded(totals):
+    return {
+        field: round(value, 2) if field in ('gross_pay', 'total_deductions', 'net_pay') else value
+        for field, value in totals.items()
+    }
+
+
+def _summary_totals(rows):
+    totals = dict.fromkeys(SUMMARY_FIELDS, 0)
+    for row in rows:
+        for field in SUMMARY_FIELDS:
+            totals[field] += row[field]
+    return totals
+
+
+def _summary_by_department(rows):
+    departments = {}
+    for row in rows:
+        departments.setdefault(row['department'], []).append(row)
+    return [
+        {'department': department, **_rounded(_summary_totals(group))}
+        for department, group in sorted(departments.items())
+    ]
+
+
+def payroll_summary(year, month):
+    """Monthly and yearly payroll totals, paid/pending counts and department breakdowns from one grouped query"""
+    period_month = extract('month', PayrollRecord.pay_period_start)
+    grouped = db.session.execute(
+        select(
+            period_month,
+            User.department,
+            func.count(PayrollRecord.id),
+            func.sum(PayrollRecord.gross_pay),
+            func.sum(PayrollRecord.total_deductions),
+            func.sum(PayrollRecord.net_pay),
+            func.sum(case((PayrollRecord.is_paid.is_(True), 1), else_=0)),
+            func.sum(case((PayrollRecord.is_paid.is_(True), 0), else_=1))
+        ).select_from(PayrollRecord).outerjoin(User, User.id == PayrollRecord.employee_id).where(
+            in_period(PayrollRecord.pay_period_start, year)
+        ).group_by(period_month, User.department)
+    ).all()
+    
+    rows = [
+        {
+            'month': int(row_month),
+            'department': department or UNASSIGNED_DEPARTMENT,
+            'records': int(records),
+            'gross_pay': float(gross or 0),
+            'total_deductions': float(deductions or 0),
+            'net_pay': float(net or 0),
+            'paid': int(paid or 0),
+            'pending': int(pending or 0)
+        } for row_month, department, records, gross, deductions, net, paid, pending in grouped
+    ]
+    month_rows = [row for row in rows if row['month'] == month]
+    monthly = _rounded(_summary_totals(month_rows))
+    yearly = _rounded(_summary_totals(rows))
+    
+    months = {}
+    for row in rows:
+        months.setdefault(row['month'], []).append(row)
+    
+    return {
+        'period': {'year': year, 'month': month},
+        'monthly': {
+            'total_employees': monthly['records'],
+            'total_gross_pay': monthly['gross_pay'],
+            'total_deductions': monthly['total_deductions'],
+            'total_net_pay': monthly['net_pay'],
+            'pending': monthly['pending'],
+            'paid': monthly['paid'],
+            'by_department': _summary_by_department(month_rows)
+        },
+        'yearly': {
+            'total_records': yearly['records'],
+            'total_gross_pay': yearly['gross_pay'],
+            'total_deductions': yearly['total_deductions'],
+            'total_net_pay': yearly['net_pay'],
+            'pending': yearly['pending'],
+            'paid': yearly['paid'],
+            'monthly_breakdown': [
+                {
+                    'month': row_month,
+                    'gross_pay': totals['gross_pay'],
+                    'net_pay': totals['net_pay'],
+                    'employees': totals['records']
+                } for row_month, totals in sorted(
+                    (row_month, _rounded(_summary_totals(group))) for row_month, group in months.items()
+                )
+            ],
+            'by_department': _summary_by_department(rows)
+        }
+    }
+
+
+def _selection(data):
+    """Condition selecting unpaid records by record_ids, pay_period_start, year/month and department, and the filters applied"""
+    conditions = [PayrollRecord.is_paid.isnot(True)]
+    applied = {}
+    
+    if data.get('record_ids') is not None:
+        if not isinstance(data['record_ids'], list):
+            raise PayrollError('record_ids must be a list')
+        try:
+            applied['record_ids'] = sorted({int(record_id) for record_id in data['record_ids']})
+        except (TypeError, ValueError):
+            raise PayrollError('record_ids must be integers')
+        conditions.append(PayrollRecord.id.in_(applied['record_ids']))
+    
+    if data.get('pay_period_start'):
+        period_start = _parse_date(data['pay_period_start'], 'pay_period_start')
+        applied['pay_period_start'] = period_start.isoformat()
+        conditions.append(PayrollRecord.pay_period_start == period_start)
+    
+    if data.get('year'):
+        try:
+            year, month = int(data['year']), int(data['month']) if data.get('month') else None
+        except (TypeError, ValueError):
+            raise PayrollError('year and month must be integers')
+        applied.update({'year': year, 'month': month})
+        conditions.append(in_period(PayrollRecord.pay_period_start, year, month))
+    
+    if data.get('department'):
+        applied['department'] = data['department']
+        conditions.append(PayrollRecord.employee_id.in_(
+            select(User.id).where(User.department == data['department'])
+        ))
+    
+    if not applied:
+        raise PayrollError('Select records by record_ids, pay_period_start, year/month or department')
+    return and_(*conditions), applied
+
+
+def _totals(statement):
+    """Record count and pay totals of a select over PayrollRecord rows"""
+    records, gross, deductions, net = db.session.execute(statement.with_only_columns(
+        func.count(PayrollRecord.id),
+        func.sum(PayrollRecord.gross_pay),
+        func.sum(PayrollRecord.total_deductions),
+        func.sum(PayrollRecord.net_pay)
+    )).one()
+    return {
+        'record_count': records,
+        'gross_pay': round(float(gross or 0), 2),
+        'total_deductions': round(float(deductions or 0), 2),
+        'net_pay': round(float(net or 0), 2)
+    }
+
+
+def disburse_payroll(data, user_id=None):
+    """Mark the selected unpaid records paid as one disbursement batch; the caller commits"""
+    condition, applied = _selection(data)
+    payment_date = _parse_date(data['payment_date'], 'payment_date') if data.get('payment_date') else date.today()
+    
+    batch = PayrollDisbursement(
+        payment_date=payment_date,
+        payment_method=data.get('payment_method'),
+        filters=applied,
+        notes=data.get('notes'),
+        created_by=user_id
+    )
+    db.session.add(batch)
+    db.session.flush()
+    
+    claimed = db.session.execute(
+        insert(PayrollDisbursementItem).from_select(
+            ['payroll_record_id', 'disbursement_id'],
+            select(PayrollRecord.id, literal(batch.id)).where(condition)
+        )
+    ).rowcount
+    if not claimed:
+        raise PayrollError('No unpaid payroll records match', status=404)
+    
+    in_batch = PayrollRecord.id.in_(
+        select(PayrollDisbursementItem.payroll_record_id).where(PayrollDisbursementItem.disbursement_id == batch.id)
+    )
+    values = {'is_paid': True, 'payment_date': payment_date}
+    if batch.payment_method:
+        values['payment_method'] = batch.payment_method
+    db.session.execute(
+        update(PayrollRecord).where(in_batch).values(**values).execution_options(synchronize_session=False)
+    )
+    
+    totals = _totals(select(PayrollRecord).where(in_batch))
+    for field, value in totals.items():
+        setattr(batch, field, value)
+    return batch
+
+
+def delete_unpaid_records(data):
+    """Delete the selected unpaid records with one DELETE; the caller commits"""
+    condition, applied = _selection(data)
+    
+    totals = _totals(select(PayrollRecord).where(condition))
+    if not totals['record_count']:
+        raise PayrollError('No unpaid payroll records match', status=404)
+    assert_period_open(*db.session.execute(
+        select(PayrollRecord.pay_period_start).where(condition).distinct()
+    ).scalars())
+    
+    deleted = db.session.execute(
+        delete(PayrollRecord).where(condition).execution_options(synchronize_session=False)
+    ).rowcount
+    return {**totals, 'record_count': deleted, 'filters': applied}
@@ -0,0 +1,225 @@
+"""
+Daily rollup maintenance and queries
+Keeps daily_rollups / daily_expense_rollups in step with sales and expenses so
+reporting endpoints read one row per day instead of scanning transactions
+"""
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from app import db
+from app.models import Product, Sale, SaleItem, Expense, DailyRollup, DailyExpenseRollup
+from app.utils.counters import increment_counter
+from app.utils.periods import in_range, in_period
+from sqlalchemy import func, extract, insert
+
+
+def _as_date(value):
+    """Normalise datetimes and SQLite date strings to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+# ==================== INCREMENTAL UPDATES ====================
+
+def record_sale(sale_date, total_amount, items_sold, cogs, sign=1, orders=1):
+    """Apply a sale (sign=1) or its void (sign=-1) to the day's rollup; orders > 1 for combined totals"""
+    increment_counter(DailyRollup, {'rollup_date': _as_date(sale_date)}, {
+        'gross_sales': Decimal(str(total_amount)) * sign,
+        'order_count': orders * sign,
+        'items_sold': int(items_sold) * sign,
+        'cogs': Decimal(str(cogs)) * sign
+    })
+
+
+def record_expense(expense_date, category, amount, sign=1):
+    """Apply an expense (sign=1) or its removal (sign=-1) to the day's rollups"""
+    rollup_date = _as_date(expense_date)
+    amount = Decimal(str(amount)) * sign
+    
+    increment_counter(DailyRollup, {'rollup_date': rollup_date}, {
+        'total_expenses': amount,
+        'expense_count': sign
+    })
+    increment_counter(DailyExpenseRollup, {'rollup_date': rollup_date, 'category': category}, {
+        'amount': amount,
+        'expense_count': sign
+    })
+
+
+# ==================== REBUILD ====================
+
+def refresh_rollups(start=None, end=None):
+    """Recompute rollups from the raw tables for days in [start, end], or all days"""
+    sale_filters = []
+    expense_filters = []
+    rollup_filters = []
+    expense_rollup_filters = []
+    
+    if start:
+        sale_filters.append(Sale.sale_date >= datetime.combine(start, time.min))
+        expense_filters.append(Expense.expense_date >= start)
+        rollup_filters.append(DailyRollup.rollup_date >= start)
+        expense_rollup_filters.append(DailyExpenseRollup.rollup_date >= start)
+    
+    if end:
+        # end is inclusive here so the rebuild script can take calendar dates
+        end = end + timedelta(days=1)
+        sale_filters.append(Sale.sale_date < datetime.combine(end, time.min))
+        expense_filters.append(Expense.expense_date < end)
+        rollup_filters.append(DailyRollup.rollup_date < end)
+        expense_rollup_filters.append(DailyExpenseRollup.rollup_date < end)
+    
+    sale_day = func.date(Sale.sale_date)
+    
+    sales = db.session.query(
+        sale_day,
+        func.sum(Sale.total_amount),
+        func.count(Sale.id)
+    ).filter(*sale_filters).group_by(sale_day).all()
+    
+    items = db.session.query(
+        sale_day,
+        func.sum(SaleItem.quantity),
+        func.sum(Product.item_cost * SaleItem.quantity)
+    ).join(Sale, Sale.id == SaleItem.sale_id).join(
+        Product, Product.id == SaleItem.product_id
+    ).filter(*sale_filters).group_by(sale_day).all()
+    
+    expenses = db.session.query(
+        Expense.expense_date,
+        Expense.category,
+        func.sum(Expense.amount),
+        func.count(Expense.id)
+    ).filter(*expense_filters).group_by(Expense.expense_date, Expense.category).all()
+    
+    days = {}
+    
+    def day_row(value):
+        rollup_date = _as_date(value)
+        if rollup_date not in days:
+            days[rollup_date] = {
+                'rollup_date': rollup_date,
+                'gross_sales': Decimal('0'),
+                'order_count': 0,
+                'items_sold': 0,
+                'cogs': Decimal('0'),
+                'total_expenses': Decimal('0'),
+                'expense_count': 0
+            }
+        return days[rollup_date]
+    
+    for day, total, count in sales:
+        row = day_row(day)
+        row['gross_sales'] = total or 0
+        row['order_count'] = count
+    
+    for day, quantity, cogs in items:
+        row = day_row(day)
+        row['items_sold'] = quantity or 0
+        row['cogs'] = cogs or 0
+    
+    category_rows = []
+    for day, category, amount, count in expenses:
+        row = day_row(day)
+        row['total_expenses'] += amount or 0
+        row['expense_count'] += count
+        category_rows.append({
+            'rollup_date': _as_date(day),
+            'category': category,
+            'amount': amount or 0,
+            'expense_count': count
+        })
+    
+    DailyExpenseRollup.query.filter(*expense_rollup_filters).delete(synchronize_session=False)
+    DailyRollup.query.filter(*rollup_filters).delete(synchronize_session=False)
+    
+    if days:
+        db.session.execute(insert(DailyRollup), list(days.values()))
+    if category_rows:
+        db.session.execute(insert(DailyExpenseRollup), category_rows)
+    
+    return len(days)
+
+
+def refresh_rollup_days(days):
+    """Recompute rollups for the given dates/datetimes, one span per run of consecutive days"""
+    start = previous = None
+    for day in sorted({_as_date(day) for day in days if day}):
+        if start is not None and day - previous > timedelta(days=1):
+            refresh_rollups(start, previous)
+            start = None
+        if start is None:
+            start = day
+        previous = day
+    
+    if start is not None:
+        refresh_rollups(start, previous)
+
+
+def ensure_rollups():
+    """Build the rollups once for a database that predates them"""
+    if DailyRollup.query.first() is not None:
+        return
+    
+    if Sale.query.first() is None and Expense.query.first() is None:
+        return
+    
+    refresh_rollups()
+    db.session.commit()
+
+
+# ==================== QUERIES ====================
+
+def period_totals(start, end):
+    """Sales, order, item and expense totals for days in [start, end)"""
+    row = db.session.query(
+        func.sum(DailyRollup.gross_sales),
+        func.sum(DailyRollup.order_count),
+        func.sum(DailyRollup.items_sold),
+        func.sum(DailyRollup.cogs),
+        func.sum(DailyRollup.total_expenses)
+    ).filter(in_range(DailyRollup.rollup_date, start, end)).one()
+    
+    return {
+        'gross_sales': row[0] or 0,
+        'order_count': row[1] or 0,
+        'items_sold': row[2] or 0,
+        'cogs': row[3] or 0,
+        'total_expenses': row[4] or 0
+    }
+
+
+def daily_rows(start, end):
+    """Rollup rows for days in [start, end), oldest first"""
+    return DailyRollup.query.filter(
+        in_range(DailyRollup.rollup_date, start, end)
+    ).order_by(DailyRollup.rollup_date).all()
+
+
+def monthly_rows(year):
+    """Per-month sales and expense totals for the year"""
+    month = extract('month', DailyRollup.rollup_date)
+    
+    return db.session.query(
+        month.label('month'),
+        func.sum(DailyRollup.gross_sales),
+        func.sum(DailyRollup.order_count),
+        func.sum(DailyRollup.total_expenses),
+        func.sum(DailyRollup.expense_count)
+    ).filter(
+        in_period(DailyRollup.rollup_date, year)
+    ).group_by(month).all()
+
+
+def expense_breakdown(start, end):
+    """Expense totals per category for days in [start, end)"""
+    return db.session.query(
+        DailyExpenseRollup.category,
+        func.sum(DailyExpenseRollup.amount)
+    ).filter(
+        in_range(DailyExpenseRollup.rollup_date, start, end)
+    ).group_by(DailyExpenseRollup.category).having(
+        func.sum(DailyExpenseRollup.expense_count) > 0
+    ).all()
@@ -0,0 +1,252 @@
+"""
+Sale pricing and creation shared by the single and batch sale endpoints
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import insert
+from app import db
+from app.models import Product, Sale, SaleItem, Customer, InventoryLog, InventoryStatus
+from app.services.financial import closed_months
+from app.services.invoices import reserve_invoice_numbers
+from app.services.rollups import record_sale
+from app.services.stock import decrement_stock
+from app.utils.periods import add_months
+
+MAX_BATCH_SALES = 1000
+
+
+class SaleError(ValueError):
+    """A sale that cannot be created; status is the HTTP status to report"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _product_id(value):
+    """Integer product id of a payload value ("2" as well as 2), or None"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_products(sale_entries):
+    """Every product referenced by the entries' items, in one IN query"""
+    product_ids = {
+        _product_id(item['product_id'])
+        for entry in sale_entries if isinstance(entry, dict)
+        for item in entry.get('items') or [] if isinstance(item, dict) and item.get('product_id')
+    }
+    product_ids.discard(None)
+    if not product_ids:
+        return {}
+    return {product.id: product for product in Product.query.filter(Product.id.in_(product_ids)).all()}
+
+
+def price_sale(data, products):
+    """Line and sale totals for a sale payload; raises SaleError for bad input"""
+    if not data.get('items') or len(data['items']) == 0:
+        raise SaleError('At least one item is required')
+    
+    subtotal = Decimal('0')
+    lines = []
+    
+    for item in data['items']:
+        product_id = _product_id(item.get('product_id'))
+        if product_id is None:
+            raise SaleError(f'Invalid product_id: {item.get("product_id")}')
+        product = products.get(product_id)
+        if not product:
+            raise SaleError(f'Product {item.get("product_id")} not found', status=404)
+        
+        quantity = int(item['quantity'])
+        if quantity <= 0:
+            raise SaleError(f'Quantity for product {product.id} must be positive')
+        
+        unit_price = Decimal(str(item.get('unit_price', product.selling_price)))
+        discount = Decimal(str(item.get('discount', 0)))
+        line_total = (unit_price * quantity) - discount
+        
+        lines.append({
+            'product': product,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'discount': discount,
+            'line_total': line_total
+        })
+        
+        subtotal += line_total
+    
+    # Calculate tax and total
+    tax_rate = Decimal(str(data.get('tax_rate', 0)))
+    tax_amount = subtotal * (tax_rate / 100)
+    discount_total = Decimal(str(data.get('discount', 0)))
+    
+    return {
+        'lines': lines,
+        'subtotal': subtotal,
+        'tax_rate': tax_rate,
+        'tax_amount': tax_amount,
+        'discount_amount': discount_total,
+        'total_amount': subtotal + tax_amount - discount_total
+    }
+
+
+def customer_for(data):
+    """customer_id from the payload, creating the customer when only a name is given"""
+    customer_id = data.get('customer_id')
+    if not customer_id and data.get('customer_name'):
+        customer = Customer(
+            name=data['customer_name'],
+            email=data.get('customer_email'),
+            phone=data.get('customer_phone'),
+            address=data.get('customer_address')
+        )
+        db.session.add(customer)
+        db.session.flush()
+        customer_id = customer.id
+    return customer_id
+
+
+def _parse_sale_date(value):
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise SaleError(f'Invalid sale_date: {value}')
+
+
+def create_sales_batch(entries, salesperson_id):
+    """
+    Create many sales in the current transaction, one savepoint per sale
+    Products are loaded once, invoice numbers reserved per day in blocks, and
+    items and inventory logs written with bulk inserts. Returns one result per
+    entry: {'index', 'status': 'created', 'sale_id', 'invoice_number'} or
+    {'index', 'status': 'failed', 'error'[, 'failed_lines']}.
+    """
+    products = load_products(entries)
+    results = [None] * len(entries)
+    priced = []
+    
+    for index, data in enumerate(entries):
+        try:
+            if not isinstance(data, dict):
+                raise SaleError('Sale must be an object')
+            sale = price_sale(data, products)
+            sale['sale_date'] = _parse_sale_date(data.get('sale_date'))
+            sale['data'] = data
+            priced.append((index, sale))
+        except (SaleError, KeyError, TypeError, AttributeError, ValueError, ArithmeticError) as e:
+            results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+    
+    # Closed months are immutable; back-dated sales into one fail
+    closed = closed_months(sale['sale_date'] for index, sale in priced)
+    if closed:
+        open_sales = []
+        for index, sale in priced:
+            month = add_months(sale['sale_date'], 0)
+            if month in closed:
+                results[index] = {'index': index, 'status': 'failed', 'error': f'{month:%Y-%m} is closed'}
+            else:
+                open_sales.append((index, sale))
+        priced = open_sales
+    
+    # One counter update per day covers every sale dated that day
+    by_day = defaultdict(list)
+    for index, sale in priced:
+        by_day[sale['sale_date'].date()].append(sale)
+    for day, day_sales in by_day.items():
+        for sale, invoice_number in zip(day_sales, reserve_invoice_numbers(len(day_sales), day)):
+            sale['invoice_number'] = invoice_number
+    
+    item_rows = []
+    log_rows = []
+    day_totals = defaultdict(lambda: {'total': Decimal('0'), 'items': 0, 'cogs': Decimal('0'), 'orders': 0})
+    
+    for index, priced_sale in priced:
+        data = priced_sale['data']
+        invoice_number = priced_sale['invoice_number']
+        lines = priced_sale['lines']
+        
+        savepoint = db.session.begin_nested()
+        
+        sale = Sale(
+            invoice_number=invoice_number,
+            customer_id=customer_for(data),
+            salesperson_id=salesperson_id,
+            sale_date=priced_sale['sale_date'],
+            subtotal=priced_sale['subtotal'],
+            tax_rate=priced_sale['tax_rate'],
+            tax_amount=priced_sale['tax_amount'],
+            discount_amount=priced_sale['discount_amount'],
+            total_amount=priced_sale['total_amount'],
+            payment_status=data.get('payment_status', 'paid'),
+            notes=data.get('notes', '')
+        )
+        db.session.add(sale)
+        db.session.flush()
+        
+        balances, failed = decrement_stock(
+            (line['product'].id, line['quantity']) for line in lines if line['product'].track_inventory
+        )
+        if failed:
+            savepoint.rollback()
+            for line in lines:
+                db.session.expire(line['product'], ['current_stock'])
+            results[index] = {
+                'index': index,
+                'status': 'failed',
+                'error': 'Insufficient stock',
+                'failed_lines': failed
+            }
+            continue
+        
+        savepoint.commit()
+        
+        for line in lines:
+            product = line['product']
+            item_rows.append({
+                'sale_id': sale.id,
+                'product_id': product.id,
+                'quantity': line['quantity'],
+                'unit_price': line['unit_price'],
+                'line_total': line['line_total']
+            })
+            if product.track_inventory:
+                log_rows.append({
+                    'product_id': product.id,
+                    'type': 'out',
+                    'quantity': line['quantity'],
+                    'stock_date': sale.sale_date,
+                    'status': InventoryStatus.COMPLETED,
+                    'reference_number': invoice_number,
+                    'balance_after': balances[product.id],
+                    'notes': f'Sale {invoice_number}'
+                })
+        
+        totals = day_totals[sale.sale_date.date()]
+        totals['total'] += priced_sale['total_amount']
+        totals['items'] += sum(line['quantity'] for line in lines)
+        totals['cogs'] += sum(line['product'].item_cost * line['quantity'] for line in lines)
+        totals['orders'] += 1
+        
+        results[index] = {
+            'index': index,
+            'status': 'created',
+            'sale_id': sale.id,
+            'invoice_number': invoice_number
+        }
+    
+    if item_rows:
+        db.session.execute(insert(SaleItem), item_rows)
+    if log_rows:
+        db.session.execute(insert(InventoryLog), log_rows)
+    
+    # Keep the daily rollups in step, one update per day
+    for day, totals in day_totals.items():
+        record_sale(day, totals['total'], totals['items'], totals['cogs'], orders=totals['orders'])
+    
+    return results
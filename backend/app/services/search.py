@@ -0,0 +1,140 @@
+"""
+Full-text product search
+Catalog search used to be ilike('%term%') over name, sku and description,
+which no index can serve. On SQLite the products are mirrored into an FTS5
+external-content table kept in step by triggers; on PostgreSQL a GIN index
+covers the same weighted tsvector expression the query uses. Either way every
+part of the term is matched as a prefix and results come back best match
+first. Because the index is maintained by the database itself, product
+create/update/delete, Excel imports and bulk generators all stay in sync
+without touching the index. Other databases, or SQLite builds without FTS5,
+fall back to ilike.
+"""
+import re
+from flask import current_app
+from sqlalchemy import text, func, select, table, column, literal_column, or_
+from app import db
+from app.models import Product
+
+FTS_TABLE = 'products_fts'
+SEARCH_INDEX = 'ix_products_search'
+
+# Relative weight of a match in name, sku and description when ranking
+NAME_WEIGHT, SKU_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 5.0, 1.0
+
+SQLITE_DDL = (
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, sku, description, content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, sku, description ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END"""
+)
+
+
+def _search_phrases(term):
+    """Words of each whitespace-separated part of the term; punctuation inside a part (W-0999) only splits words"""
+    phrases = [re.findall(r'\w+', part) for part in (term or '').split()]
+    return [words for words in phrases if words]
+
+
+def _document(name, sku, description):
+    """Weighted tsvector of a product; the GIN index is built on exactly this expression"""
+    config = literal_column("'simple'::regconfig")
+    parts = [
+        func.setweight(func.to_tsvector(config, func.coalesce(value, literal_column("''"))), literal_column(f"'{weight}'"))
+        for value, weight in ((name, 'A'), (sku, 'B'), (description, 'C'))
+    ]
+    return parts[0].op('||')(parts[1]).op('||')(parts[2])
+
+
+def _ensure_sqlite():
+    connection = db.session.connection()
+    objects = set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE name LIKE :prefix"), {'prefix': f'{FTS_TABLE}%'}
+    ).scalars())
+    if {FTS_TABLE, f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'} <= objects:
+        return
+    
+    # New index, or products was recreated and took its triggers with it
+    if FTS_TABLE not in objects:
+        connection.execute(text(SQLITE_DDL[0]))
+    for statement in SQLITE_DDL[1:]:
+        connection.execute(text(statement))
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _ensure_postgresql():
+    document = _document(literal_column('name'), literal_column('sku'), literal_column('description'))
+    expression = document.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON products USING GIN (({expression}))'))
+
+
+def ensure_search_index():
+    """Create the full-text index for this database if missing; returns the search backend in use"""
+    dialect = db.engine.dialect.name
+    
+    if dialect == 'sqlite':
+        options = db.session.execute(text('PRAGMA compile_options')).scalars().all()
+        if 'ENABLE_FTS5' not in options:
+            return None
+        _ensure_sqlite()
+        backend = 'fts5'
+    elif dialect == 'postgresql':
+        _ensure_postgresql()
+        backend = 'tsvector'
+    else:
+        return None
+    
+    db.session.commit()
+    return backend
+
+
+def search_products(query, term, ranked=True):
+    """
+    Narrow a Product query to products matching every part of term, best matches first when ranked
+    Each part matches as a phrase whose last word is a prefix, so "sta" finds stapler and "W-09" finds W-0999
+    """
+    phrases = _search_phrases(term)
+    # Terms with no words (punctuation only) still go through ilike
+    backend = current_app.extensions.get('product_search') if phrases else None
+    
+    if backend == 'fts5':
+        expression = ' AND '.join('"{}"*'.format(' '.join(words)) for words in phrases)
+        fts = table(FTS_TABLE, column('rowid'))
+        matches = select(
+            fts.c.rowid.label('product_id'),
+            literal_column(f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {SKU_WEIGHT}, {DESCRIPTION_WEIGHT})').label('rank')
+        ).where(literal_column(FTS_TABLE).match(expression)).subquery()
+        
+        query = query.join(matches, matches.c.product_id == Product.id)
+        return query.order_by(matches.c.rank, Product.id) if ranked else query
+    
+    if backend == 'tsvector':
+        document = _document(Product.name, Product.sku, Product.description)
+        expression = ' & '.join('({}:*)'.format(' <-> '.join(words)) for words in phrases)
+        search = func.to_tsquery(literal_column("'simple'::regconfig"), expression)
+        
+        query = query.filter(document.op('@@')(search))
+        if ranked:
+            # ts_rank takes weights for labels {D, C, B, A}
+            weights = literal_column(f"'{{0, {DESCRIPTION_WEIGHT / NAME_WEIGHT}, {SKU_WEIGHT / NAME_WEIGHT}, 1}}'::float4[]")
+            query = query.order_by(func.ts_rank(weights, document, search).desc(), Product.id)
+        return query
+    
+    return query.filter(
+        or_(
+            Product.name.ilike(f'%{term}%'),
+            Product.sku.ilike(f'%{term}%'),
+            Product.description.ilike(f'%{term}%')
+        )
+    )
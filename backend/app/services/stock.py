@@ -0,0 +1,82 @@
+"""
+Set-based stock movements
+Stock is changed with conditional UPDATE statements instead of read-check-write
+in Python, so concurrent checkouts cannot oversell and never wait on more than
+the product rows they touch
+"""
+from collections import defaultdict
+from sqlalchemy import update, select
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models import Product
+
+
+def _merge(lines):
+    """Sum quantities per product; rows are updated in id order to avoid deadlocks"""
+    totals = defaultdict(int)
+    for product_id, quantity in lines:
+        totals[int(product_id)] += int(quantity)
+    return sorted(totals.items())
+
+
+def _stock_levels(product_ids):
+    """Current stock for the products, synced into any loaded Product instances"""
+    if not product_ids:
+        return {}
+    
+    rows = db.session.execute(
+        select(Product.id, Product.current_stock).where(Product.id.in_(product_ids))
+    ).all()
+    levels = {product_id: stock for product_id, stock in rows}
+    
+    # The UPDATEs bypass the ORM, so refresh copies already in the session
+    for product_id, stock in levels.items():
+        product = db.session.identity_map.get(db.session.identity_key(Product, product_id))
+        if product is not None:
+            set_committed_value(product, 'current_stock', stock)
+    
+    return levels
+
+
+def decrement_stock(lines):
+    """
+    Take stock for (product_id, quantity) lines, only where enough is on hand
+    Returns (balances, failed): new stock per product and, for lines that could
+    not be filled, {'product_id', 'requested', 'available'}. Callers roll back
+    when failed is non-empty so a partial movement is never committed.
+    """
+    applied = []
+    failed = []
+    
+    for product_id, quantity in _merge(lines):
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.current_stock >= quantity)
+            .values(current_stock=Product.current_stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            applied.append(product_id)
+        else:
+            failed.append({'product_id': product_id, 'requested': quantity})
+    
+    levels = _stock_levels(applied + [line['product_id'] for line in failed])
+    for line in failed:
+        line['available'] = levels.get(line['product_id'], 0)
+    
+    return {product_id: levels[product_id] for product_id in applied}, failed
+
+
+def adjust_stock(lines):
+    """Apply signed (product_id, delta) changes unconditionally; returns new stock per product"""
+    merged = _merge(lines)
+    
+    for product_id, delta in merged:
+        db.session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(current_stock=Product.current_stock + delta)
+            .execution_options(synchronize_session=False)
+        )
+    
+    return _stock_levels([product_id for product_id, _ in merged])
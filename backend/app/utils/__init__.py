@@ -0,0 +1,3 @@
+"""
+Cross-cutting helpers shared by routes and services
+"""
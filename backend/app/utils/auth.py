@@ -0,0 +1,145 @@
+"""
+Claims-based authorization
+Access tokens carry the user's role, locked tabs and permission version as
+claims, so permission checks read the token instead of loading the user.
+Changing a user's role or tab locks must call revoke_permissions, which bumps
+their permission version in the caller's transaction; access tokens carrying
+an older version are then rejected with 401 and the client refreshes to get
+current claims. Each worker caches the version table and reloads it at most
+every AUTH_PERMISSIONS_REFRESH seconds, which bounds how long a revoked token
+keeps working; the worker that made the change drops its copy on commit.
+"""
+import threading
+import time
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt
+from sqlalchemy import select, event
+from app import db, jwt
+from app.models import TabPermission, PermissionVersion
+from app.utils.counters import increment_counter
+
+
+# ==================== TOKENS ====================
+
+def permission_claims(user):
+    """Role, locked tabs and permission version of a user, as access token claims"""
+    locked_tabs = db.session.execute(
+        select(TabPermission.tab_name).where(
+            TabPermission.user_id == user.id,
+            TabPermission.is_locked.is_(True)
+        )
+    ).scalars()
+    version = db.session.execute(
+        select(PermissionVersion.version).where(PermissionVersion.user_id == user.id)
+    ).scalar()
+    
+    return {
+        'role': user.role.value,
+        'locked_tabs': sorted(set(locked_tabs)),
+        'pv': version or 0
+    }
+
+
+def create_user_access_token(user):
+    return create_access_token(identity=str(user.id), additional_claims=permission_claims(user))
+
+
+def revoke_permissions(*user_ids):
+    """Invalidate the users' access tokens; call inside the transaction that changes their role or tab locks"""
+    for user_id in sorted({int(user_id) for user_id in user_ids}):
+        increment_counter(PermissionVersion, {'user_id': user_id}, {'version': 1})
+    # Expiring now would let a lookup before the commit cache the old versions
+    db.session.info['permissions_revoked'] = True
+
+
+# ==================== REVOCATION ====================
+
+_session_hooks_installed = False
+
+
+def _after_commit(session):
+    if session.info.pop('permissions_revoked', False):
+        permission_versions.expire()
+
+
+def _after_rollback(session):
+    session.info.pop('permissions_revoked', None)
+
+
+def _install_session_hooks():
+    global _session_hooks_installed
+    if not _session_hooks_installed:
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        _session_hooks_installed = True
+
+
+class PermissionVersions:
+    """Per-worker copy of the permission version table, reloaded every few seconds"""
+    
+    def __init__(self):
+        self.refresh_seconds = 30
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.refresh_seconds = app.config.get('AUTH_PERMISSIONS_REFRESH', 30)
+        self.expire()
+        _install_session_hooks()
+        jwt.token_in_blocklist_loader(self.is_revoked)
+        app.extensions['permission_versions'] = self
+    
+    def current(self, user_id):
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at >= self.refresh_seconds:
+                self._versions = dict(db.session.execute(
+                    select(PermissionVersion.user_id, PermissionVersion.version)
+                ).all())
+                self._loaded_at = now
+            return self._versions.get(user_id, 0)
+    
+    def expire(self):
+        with self._lock:
+            self._loaded_at = None
+    
+    def is_revoked(self, jwt_header, jwt_payload):
+        # Refresh tokens stay valid; /auth/refresh re-reads the user
+        if jwt_payload.get('type') != 'access':
+            return False
+        # Access tokens issued before permission claims existed
+        if 'role' not in jwt_payload:
+            return True
+        return jwt_payload.get('pv', 0) < self.current(int(jwt_payload['sub']))
+
+
+permission_versions = PermissionVersions()
+
+
+# ==================== DECORATORS ====================
+
+def has_role(*roles):
+    """Whether the current access token's role is one of roles"""
+    return get_jwt().get('role') in {role.value for role in roles}
+
+
+def permission_required(*roles, tab=None, message='Insufficient permissions'):
+    """
+    jwt_required() that also checks the token's claims: the role must be one of
+    roles and, when tab is given, that tab must not be locked for the user
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            
+            if not has_role(*roles):
+                return jsonify({'error': message}), 403
+            if tab and tab in get_jwt().get('locked_tabs', ()):
+                return jsonify({'error': f'The {tab} tab is locked for your account'}), 403
+            
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+"""
+Write-invalidated response cache for read-only reporting endpoints
+
+Entries are keyed by endpoint, query args, the current date and the version
+counters of the tables the report reads. Write routes call bump_data_version
+in their transaction; the counters are incremented in a short transaction of
+their own right after it commits, so concurrent writes never queue on the
+version rows, and the next read after the commit misses and recomputes. Stale
+entries simply age out of the backend.
+
+Only tables the API writes are bumped: sales, products, inventory_logs,
+payroll_records and period_closes. Expenses, assets, liabilities, equity,
+cash_flows, business_settings and budget_targets have no write routes; they
+change through scripts or SQL, so their versions stay put and
+REPORT_CACHE_TTL alone bounds how stale a report over them can be. Scripts
+that write them should call bump_data_version before committing, as
+generate_data.py does, to invalidate at once.
+
+Backends (REPORT_CACHE_BACKEND):
+    memory      per-worker LRU bounded by entry count and payload bytes
+    filesystem  directory shared by every gunicorn worker on the host
+    null        caching disabled
+    module:Cls  any class taking the app config with get/set/clear
+"""
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from flask import request, make_response, current_app
+from sqlalchemy import event
+from app import db
+from app.models import DataVersion
+from app.utils.counters import increment_counter
+
+
+# ==================== DATA VERSIONS ====================
+
+def bump_data_version(*tables):
+    """Record a write to the given tables; call inside the write's transaction, their versions move once it commits"""
+    db.session.info.setdefault('bumped_tables', set()).update(tables)
+
+
+_session_hooks_installed = False
+
+
+def _after_commit(session):
+    tables = session.info.pop('bumped_tables', None)
+    if not tables:
+        return
+    
+    try:
+        with db.engine.begin() as connection:
+            for table in sorted(tables):
+                increment_counter(DataVersion, {'table_name': table}, {'version': 1}, connection=connection)
+    except Exception as e:
+        # The write is committed either way; reports over these tables then age out by TTL
+        current_app.logger.warning(f'Data version bump failed for {sorted(tables)}: {e}')
+
+
+def _after_rollback(session):
+    session.info.pop('bumped_tables', None)
+
+
+def _install_session_hooks():
+    global _session_hooks_installed
+    if not _session_hooks_installed:
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        _session_hooks_installed = True
+
+
+def get_data_versions(tables):
+    """Current version of each table (0 for tables never written through the API)"""
+    rows = DataVersion.query.filter(DataVersion.table_name.in_(tables)).all()
+    versions = {row.table_name: row.version for row in rows}
+    return {table: versions.get(table, 0) for table in tables}
+
+
+# ==================== BACKENDS ====================
+
+class NullCacheBackend:
+    """Backend that never stores anything"""
+    
+    def __init__(self, config=None):
+        pass
+    
+    def get(self, key):
+        return None
+    
+    def set(self, key, entry):
+        pass
+    
+    def clear(self):
+        pass
+
+
+class LRUCacheBackend:
+    """In-process LRU bounded by entry count and total payload size"""
+    
+    def __init__(self, config):
+        self.max_entries = config.get('REPORT_CACHE_MAX_ENTRIES', 512)
+        self.max_bytes = config.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key, entry):
+        size = len(entry['body'])
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous['body'])
+            
+            self._entries[key] = entry
+            self._size += size
+            
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted['body'])
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class FileSystemCacheBackend:
+    """Cache directory shared by all workers; oldest files pruned past the limit"""
+    
+    def __init__(self, config):
+        self.directory = config['REPORT_CACHE_DIR']
+        self.max_entries = config.get('REPORT_CACHE_MAX_ENTRIES', 512)
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        
+        entry['body'] = entry['body'].encode('utf-8')
+        return entry
+    
+    def set(self, key, entry):
+        payload = dict(entry, body=entry['body'].decode('utf-8'))
+        
+        # Write then rename so other workers never read a partial file
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as temp_file:
+            json.dump(payload, temp_file)
+        os.replace(temp_path, self._path(key))
+        
+        self._prune()
+    
+    def _prune(self):
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(files) <= self.max_entries:
+            return
+        
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+BACKENDS = {
+    'null': NullCacheBackend,
+    'memory': LRUCacheBackend,
+    'filesystem': FileSystemCacheBackend
+}
+
+
+# ==================== REPORT CACHE ====================
+
+class ReportCache:
+    """Flask extension serving cached report responses"""
+    
+    def __init__(self, app=None):
+        self.backend = NullCacheBackend()
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        name = app.config.get('REPORT_CACHE_BACKEND', 'memory')
+        
+        if ':' in name:
+            module_name, class_name = name.split(':', 1)
+            backend_class = getattr(importlib.import_module(module_name), class_name)
+        else:
+            backend_class = BACKENDS[name]
+        
+        self.backend = backend_class(app.config)
+        self.ttl = app.config.get('REPORT_CACHE_TTL', 0)
+        _install_session_hooks()
+        app.extensions['report_cache'] = self
+    
+    def _key(self, tables):
+        parts = {
+            'endpoint': request.endpoint,
+            'args': sorted(request.args.items(multi=True)),
+            'date': date.today().isoformat(),
+            'versions': get_data_versions(tables)
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def serve(self, view, tables, args, kwargs):
+        """Return the cached response for this request or compute and store it"""
+        try:
+            key = self._key(tables)
+        except Exception as e:
+            # Versions unavailable (e.g. table not created yet); serve uncached
+            db.session.rollback()
+            current_app.logger.warning(f'Report cache bypassed: {e}')
+            return view(*args, **kwargs)
+        
+        entry = self.backend.get(key)
+        if entry is not None and (not self.ttl or time.time() - entry['stored_at'] < self.ttl):
+            response = current_app.response_class(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            self.backend.set(key, {
+                'body': response.get_data(),
+                'status': response.status_code,
+                'mimetype': response.mimetype,
+                'stored_at': time.time()
+            })
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+
+report_cache = ReportCache()
+
+
+def cached_report(*tables):
+    """
+    Cache a read-only report view until one of the given tables is bumped, or
+    for at most REPORT_CACHE_TTL seconds (the only bound for unversioned tables)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return report_cache.serve(view, tables, args, kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,26 @@
+"""
+Race-safe counter rows
+Adds deltas to a keyed row with a single UPDATE and creates the row on first
+use, so concurrent gunicorn workers never lose increments
+"""
+from app import db
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+
+
+def increment_counter(model, keys, deltas, connection=None):
+    """Add deltas to the row of model matching keys, creating it if missing; runs on connection if given, else the session"""
+    executor = db.session if connection is None else connection
+    filters = [getattr(model, name) == value for name, value in keys.items()]
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items()}
+    statement = update(model).where(*filters).values(**values).execution_options(synchronize_session=False)
+    
+    if executor.execute(statement).rowcount:
+        return
+    
+    try:
+        with executor.begin_nested():
+            executor.execute(insert(model).values(**keys, **deltas))
+    except IntegrityError:
+        # Another worker inserted the row between our update and insert
+        executor.execute(statement)
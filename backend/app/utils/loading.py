@@ -0,0 +1,31 @@
+"""
+Eager-loading strategies for serialized models
+Each helper returns the loader options covering everything the model's
+to_dict() touches, so a page of rows loads with a fixed number of queries
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Product, InventoryLog, Sale, SaleItem, PayrollRecord
+
+
+def product_options():
+    """Product.to_dict(): category"""
+    return [joinedload(Product.category)]
+
+
+def inventory_log_options():
+    """InventoryLog.to_dict(): product and its category"""
+    return [joinedload(InventoryLog.product).joinedload(Product.category)]
+
+
+def sale_options():
+    """Sale.to_dict(): customer, salesperson, items, products and categories"""
+    return [
+        joinedload(Sale.customer),
+        joinedload(Sale.salesperson),
+        selectinload(Sale.items).joinedload(SaleItem.product).joinedload(Product.category)
+    ]
+
+
+def payroll_record_options():
+    """PayrollRecord.to_dict(): employee"""
+    return [joinedload(PayrollRecord.employee)]
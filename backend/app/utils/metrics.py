@@ -0,0 +1,424 @@
+"""
+Request metrics in the Prometheus text format
+
+Every request records its latency, status, response size and the number and
+total time of the SQL statements it ran (SQLAlchemy cursor events), labelled
+by blueprint and endpoint. GET /metrics renders the totals to callers sending
+METRICS_TOKEN, or without a token only to scrapes from this host; with
+METRICS_SERVER_TIMING on, each response also carries a Server-Timing header.
+
+Backends (METRICS_BACKEND):
+    memory      totals for this worker process only
+    filesystem  each worker writes its totals to METRICS_DIR every few
+                seconds and on exit, and /metrics adds up all the files, so
+                any gunicorn worker answers for the whole host
+    null        metrics disabled
+"""
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from flask import Response, g, request, has_app_context, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are kept rather than folded
+    fcntl = None
+
+# name -> (help, upper bucket bounds)
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Request latency in seconds',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    ),
+    'http_request_sql_queries': (
+        'SQL statements executed per request',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+    ),
+    'http_response_size_bytes': (
+        'Response body size in bytes (streamed responses excluded)',
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    )
+}
+
+# name -> help
+COUNTERS = {
+    'http_requests_total': 'Requests by status code',
+    'http_request_sql_seconds_total': 'Time spent in SQL statements, in seconds'
+}
+
+# Peers that may scrape /metrics when no METRICS_TOKEN is configured
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+
+# ==================== REGISTRY ====================
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (name, labels), mergeable across processes"""
+    
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.counters[(name, labels)] += amount
+    
+    def observe(self, name, labels, value):
+        bounds = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self.histograms.get((name, labels))
+            if series is None:
+                # one count per bound, then +Inf, then the sum
+                series = self.histograms[(name, labels)] = [0] * (len(bounds) + 2)
+            for position, bound in enumerate(bounds):
+                if value <= bound:
+                    series[position] += 1
+                    break
+            else:
+                series[len(bounds)] += 1
+            series[-1] += value
+    
+    def dump(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()]
+            }
+    
+    def merge(self, data):
+        with self._lock:
+            for name, labels, value in data.get('counters', []):
+                self.counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, series in data.get('histograms', []):
+                key = (name, tuple(map(tuple, labels)))
+                current = self.histograms.setdefault(key, [0] * len(series))
+                for position, value in enumerate(series):
+                    current[position] += value
+    
+    def render(self):
+        """Prometheus text exposition of the registry"""
+        lines = []
+        
+        with self._lock:
+            for name, help_text in COUNTERS.items():
+                series = sorted((labels, value) for (metric, labels), value in self.counters.items() if metric == name)
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in series:
+                    lines.append(f'{name}{_label_text(labels)} {_number(value)}')
+            
+            for name, (help_text, bounds) in HISTOGRAMS.items():
+                series = sorted((labels, values) for (metric, labels), values in self.histograms.items() if metric == name)
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, values in series:
+                    cumulative = 0
+                    for bound, count in zip([_number(bound) for bound in bounds] + ['+Inf'], values[:-1]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_label_text(labels + (("le", bound),))} {cumulative}')
+                    lines.append(f'{name}_sum{_label_text(labels)} {_number(values[-1])}')
+                    lines.append(f'{name}_count{_label_text(labels)} {cumulative}')
+        
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = ((key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+# ==================== BACKENDS ====================
+
+class NullMetricsBackend:
+    """Backend that records nothing"""
+    
+    enabled = False
+    
+    def __init__(self, config=None):
+        self.registry = MetricsRegistry()
+    
+    def recorded(self):
+        pass
+    
+    def collect(self):
+        return MetricsRegistry()
+
+
+class MemoryMetricsBackend:
+    """Totals of this worker process"""
+    
+    enabled = True
+    
+    def __init__(self, config=None):
+        self.registry = MetricsRegistry()
+    
+    def recorded(self):
+        pass
+    
+    def collect(self):
+        return self.registry
+
+
+class FileSystemMetricsBackend(MemoryMetricsBackend):
+    """
+    Per-worker totals flushed to a shared directory and summed on collection
+    Each worker process writes worker-<uuid>.json, so a reused PID never
+    replaces a dead worker's file. On collection the files of exited workers
+    are folded into exited.json under a directory lock, so host totals neither
+    go backwards nor grow a file per restart. Workers flush on exit as well.
+    """
+    
+    EXITED_FILE = 'exited.json'
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self.directory = config['METRICS_DIR']
+        self.flush_seconds = config.get('METRICS_FLUSH_SECONDS', 5)
+        self._flushed_at = 0
+        self._pid = None
+        self._worker_id = None
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self._flush_at_exit)
+    
+    def _path(self):
+        # Looked up on each flush: gunicorn forks workers after the app is built
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid, self._worker_id = pid, uuid.uuid4().hex
+        return os.path.join(self.directory, f'worker-{self._worker_id}.json')
+    
+    def recorded(self):
+        now = time.monotonic()
+        if now - self._flushed_at >= self.flush_seconds:
+            self._flushed_at = now
+            self.flush()
+    
+    def _write(self, path, data):
+        # Write then rename so a collecting worker never reads a partial file
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as temp_file:
+            json.dump(data, temp_file)
+        os.replace(temp_path, path)
+    
+    def flush(self):
+        path = self._path()
+        self._write(path, dict(self.registry.dump(), pid=self._pid))
+    
+    def _flush_at_exit(self):
+        # Only processes that recorded something (not the gunicorn master) leave a file
+        if self.registry.counters or self.registry.histograms:
+            try:
+                self.flush()
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+    
+    def _fold_exited(self, own):
+        """Move the totals of workers that are no longer running into the exited file"""
+        exited_path = os.path.join(self.directory, self.EXITED_FILE)
+        exited = self._read(exited_path) or {}
+        totals = MetricsRegistry()
+        totals.merge(exited)
+        # Files still listed are already in the totals, their removal was interrupted
+        folded = set(exited.get('folded', []))
+        
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith('worker-') or not entry.name.endswith('.json'):
+                continue
+            if entry.name == own or entry.name in folded:
+                continue
+            data = self._read(entry.path)
+            if data is not None and not _process_running(data.get('pid')):
+                totals.merge(data)
+                folded.add(entry.name)
+        
+        if not folded:
+            return
+        
+        # Listed until removed, so a crash in between cannot count them twice
+        self._write(exited_path, dict(totals.dump(), folded=sorted(folded)))
+        for name in folded:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        self._write(exited_path, dict(totals.dump(), folded=[]))
+    
+    def collect(self):
+        total = MetricsRegistry()
+        total.merge(self.registry.dump())
+        own = os.path.basename(self._path())
+        
+        # The lock is released when the file is closed
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._fold_exited(own)
+            
+            exited = self._read(os.path.join(self.directory, self.EXITED_FILE)) or {}
+            skip = set(exited.get('folded', [])) | {own}
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json') or entry.name in skip:
+                    continue
+                data = self._read(entry.path)
+                if data is not None:
+                    total.merge(data)
+        
+        return total
+
+
+def _process_running(pid):
+    """Whether a process with this pid exists on the host; unknown pids count as exited"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists but belongs to another user
+    return True
+
+
+BACKENDS = {
+    'null': NullMetricsBackend,
+    'memory': MemoryMetricsBackend,
+    'filesystem': FileSystemMetricsBackend
+}
+
+
+# ==================== SQL HOOKS ====================
+
+_sql_hooks_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append((cursor, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()[1]
+    
+    # Only statements run while a request is being timed are counted
+    if has_app_context() and 'metrics_start' in g:
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+        g.metrics_sql_seconds = g.get('metrics_sql_seconds', 0.0) + elapsed
+
+
+def _handle_error(context):
+    # A statement that raised gets no after_cursor_execute; drop its start time
+    # (errors raised while fetching come after it and find nothing of theirs)
+    if context.connection is None or context.execution_context is None:
+        return
+    started = context.connection.info.get('metrics_query_start')
+    if started and started[-1][0] is context.execution_context.cursor:
+        started.pop()
+
+
+def _install_sql_hooks():
+    global _sql_hooks_installed
+    if not _sql_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _sql_hooks_installed = True
+
+
+# ==================== EXTENSION ====================
+
+class RequestMetrics:
+    """Flask extension timing every request and serving /metrics"""
+    
+    def __init__(self, app=None):
+        self.backend = NullMetricsBackend()
+        self.server_timing = False
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.backend = BACKENDS[app.config.get('METRICS_BACKEND', 'memory')](app.config)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        self.token = app.config.get('METRICS_TOKEN')
+        app.extensions['request_metrics'] = self
+        
+        if not self.backend.enabled and not self.server_timing:
+            return
+        
+        _install_sql_hooks()
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view, methods=['GET'])
+    
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_seconds = 0.0
+    
+    def _finish(self, response):
+        if 'metrics_start' not in g:
+            return response
+        
+        duration = time.perf_counter() - g.metrics_start
+        queries = g.get('metrics_queries', 0)
+        sql_seconds = g.get('metrics_sql_seconds', 0.0)
+        
+        if self.backend.enabled:
+            labels = (
+                ('blueprint', request.blueprint or ''),
+                ('endpoint', request.endpoint or 'unmatched'),
+                ('method', request.method)
+            )
+            registry = self.backend.registry
+            registry.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+            registry.inc('http_request_sql_seconds_total', labels, sql_seconds)
+            registry.observe('http_request_duration_seconds', labels, duration)
+            registry.observe('http_request_sql_queries', labels, queries)
+            # Unknown for streamed bodies such as the Excel exports
+            if not response.is_streamed and response.content_length is not None:
+                registry.observe('http_response_size_bytes', labels, response.content_length)
+            self.backend.recorded()
+        
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'app;dur={duration * 1000:.1f}, db;dur={sql_seconds * 1000:.1f};desc="{queries} queries"'
+            )
+        
+        return response
+    
+    def metrics_view(self):
+        """Prometheus scrape endpoint; needs 'Bearer <METRICS_TOKEN>', or without a token a loopback peer"""
+        if self.token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.token}'):
+                abort(401)
+        elif request.remote_addr not in LOOPBACK_ADDRESSES:
+            abort(404)
+        return Response(self.backend.collect().render(), mimetype='text/plain; version=0.0.4')
+
+
+request_metrics = RequestMetrics()
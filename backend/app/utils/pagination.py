@@ -0,0 +1,117 @@
+"""
+Keyset (cursor) pagination for list endpoints
+Pages are ordered by a sort column plus the primary key and continue from the
+last row seen, so page 10,000 costs the same index range scan as page 1.
+Cursors are opaque URL-safe tokens; clients only pass back next_cursor.
+"""
+import base64
+import json
+from datetime import datetime, date
+from sqlalchemy import and_, or_, DateTime, Date
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not issued by keyset_page"""
+
+
+def wants_cursor(args):
+    """Cursor mode is opt-in: any request carrying cursor or limit"""
+    return 'cursor' in args or 'limit' in args
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong number of values')
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+
+
+def _after(columns, values, descending):
+    """Rows strictly after values in (columns...) order, expanded for index use"""
+    conditions = []
+    for position, column in enumerate(columns):
+        step = column < values[position] if descending else column > values[position]
+        ties = [columns[i] == values[i] for i in range(position)]
+        conditions.append(and_(*ties, step))
+    return or_(*conditions)
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_LIMIT, descending=True, with_total=False):
+    """
+    Fetch one page of query ordered by columns (sort keys ending in the primary key)
+    Returns {'items', 'next_cursor', 'has_more', 'limit'} plus 'total' when requested
+    """
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    
+    total = query.enable_eagerloads(False).order_by(None).count() if with_total else None
+    
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns), descending))
+    
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    
+    page = {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'limit': limit
+    }
+    if with_total:
+        page['total'] = total
+    return page
+
+
+def wants_total(args):
+    """Totals cost a COUNT(*) over the filtered set, so they are opt-in too"""
+    return args.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+
+def keyset_args(args):
+    """cursor/limit/with_total keyword arguments for keyset_page from request args"""
+    return {
+        'cursor': args.get('cursor'),
+        'limit': args.get('limit', DEFAULT_LIMIT, type=int),
+        'with_total': wants_total(args)
+    }
+
+
+def page_meta(page):
+    """Response fields describing a keyset page, alongside the serialized items"""
+    return {key: value for key, value in page.items() if key != 'items'}
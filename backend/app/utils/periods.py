@@ -0,0 +1,73 @@
+"""
+Reporting period helpers
+Turn (year, month, day) into half-open [start, end) ranges so report filters
+compare the raw column and can use its index, instead of wrapping the column
+in extract()/date() and scanning the whole table
+"""
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import DateTime, and_
+
+
+def date_range(year, month=None, day=None):
+    """Half-open [start, end) date range for a year, a month or a single day"""
+    if day:
+        start = date(year, month, day)
+        return start, start + timedelta(days=1)
+    
+    if month:
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return start, end
+    
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def datetime_range(year, month=None, day=None):
+    """Half-open [start, end) datetime range for a year, a month or a single day"""
+    start, end = date_range(year, month, day)
+    return datetime.combine(start, time.min), datetime.combine(end, time.min)
+
+
+def day_range(value):
+    """Half-open [start, end) date range for the day of a date or datetime"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return date_range(value.year, value.month, value.day)
+
+
+def in_range(column, start, end):
+    """Sargable start <= column < end filter, matching date vs datetime columns"""
+    if isinstance(column.type, DateTime):
+        if not isinstance(start, datetime):
+            start = datetime.combine(start, time.min)
+        if not isinstance(end, datetime):
+            end = datetime.combine(end, time.min)
+    else:
+        if isinstance(start, datetime):
+            start = start.date()
+        if isinstance(end, datetime):
+            end = end.date()
+    
+    return and_(column >= start, column < end)
+
+
+def in_period(column, year, month=None, day=None):
+    """Sargable filter selecting rows of column in the given year/month/day"""
+    return in_range(column, *date_range(year, month, day))
+
+
+def add_months(day, months):
+    """First day of the month months after (or before) the month of day"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def fiscal_year_range(fiscal_year, start_month=1):
+    """Half-open [start, end) date range of a fiscal year, named by the calendar year it starts in"""
+    start = date(fiscal_year, start_month, 1)
+    return start, add_months(start, 12)
+
+
+def fiscal_year_of(day, start_month=1):
+    """Fiscal year containing a date"""
+    return day.year if day.month >= start_month else day.year - 1
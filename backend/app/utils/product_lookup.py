@@ -0,0 +1,204 @@
+"""
+Per-worker SKU lookup for point-of-sale scanning
+Each worker keeps a dict from normalised SKU to a compact product record
+(price, stock and tracking flags), so a scan is a hash lookup instead of a
+product query plus a lazy category load. The index is warmed when the app
+starts. At most every PRODUCT_LOOKUP_REFRESH seconds a lookup reads the
+products data version. When it has moved, only rows whose updated_at is past
+the index's watermark (less PRODUCT_LOOKUP_SLACK) are reloaded. A product count
+or id total that no longer matches the index means a delete: products no longer
+in the table are dropped, and if the index still disagrees it falls back to a
+full reload. A write that commits longer than the slack after its updated_at
+stamp can slip past the watermark, so once the version has moved since the last
+full reload the index is rebuilt every PRODUCT_LOOKUP_FULL_RELOAD seconds. Full
+reloads after the first are built on a background thread and swapped in, so
+scans keep being answered from the current index meanwhile.
+"""
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select, func
+from app import db
+from app.models import Product
+from app.utils.cache import get_data_versions
+
+BUILD_BATCH_SIZE = 2000
+
+COLUMNS = (
+    Product.id, Product.sku, Product.name, Product.category_id, Product.selling_price, Product.tax_amount,
+    Product.current_stock, Product.low_stock_threshold, Product.track_inventory, Product.is_service,
+    Product.is_active, Product.updated_at
+)
+
+
+def normalize_sku(sku):
+    return (sku or '').strip().upper()
+
+
+def _record(row):
+    """Compact, ready-to-serialise record of a product row"""
+    return {
+        'id': row.id,
+        'sku': row.sku,
+        'name': row.name,
+        'category_id': row.category_id,
+        'selling_price': float(row.selling_price or 0),
+        'tax_amount': float(row.tax_amount or 0),
+        'current_stock': row.current_stock or 0,
+        'low_stock_threshold': row.low_stock_threshold,
+        'track_inventory': bool(row.track_inventory),
+        'is_service': bool(row.is_service),
+        'is_active': bool(row.is_active)
+    }
+
+
+class ProductLookup:
+    """SKU -> product record index of this worker, kept current from the products data version"""
+    
+    def __init__(self):
+        self.refresh_seconds = 1
+        self.slack = timedelta(seconds=30)
+        self.full_reload_seconds = 300
+        self._generation = 0
+        self._reset()
+        self._lock = threading.Lock()
+    
+    def _reset(self):
+        self._records = {}
+        self._skus = {}  # product id -> normalised SKU it is filed under
+        self._version = None
+        self._watermark = None
+        self._checked_at = None
+        self._loaded_version = None  # products data version at the last full reload
+        self._loaded_at = None
+        self._reloading = None  # generation a background reload was started from
+        # Bumped on every swap and reset, so a background reload started before one is dropped
+        self._generation += 1
+    
+    def init_app(self, app):
+        self.refresh_seconds = app.config.get('PRODUCT_LOOKUP_REFRESH', 1)
+        self.slack = timedelta(seconds=app.config.get('PRODUCT_LOOKUP_SLACK', 30))
+        self.full_reload_seconds = app.config.get('PRODUCT_LOOKUP_FULL_RELOAD', 300)
+        self._reset()
+        app.extensions['product_lookup'] = self
+    
+    @staticmethod
+    def _store(rows, records, skus, watermark):
+        """File rows into records/skus; returns the watermark advanced past their updated_at"""
+        for row in rows:
+            previous = skus.get(row.id)
+            if previous is not None and records.get(previous, {}).get('id') == row.id:
+                del records[previous]
+            sku = normalize_sku(row.sku)
+            records[sku] = _record(row)
+            skus[row.id] = sku
+            if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+        return watermark
+    
+    def _build(self):
+        """A complete index (records, skus, watermark), built aside from the one being served"""
+        records, skus = {}, {}
+        # Streamed: fetching the whole catalog in one call holds the GIL long
+        # enough to stall scans on other threads
+        rows = db.session.execute(select(*COLUMNS).execution_options(yield_per=BUILD_BATCH_SIZE))
+        watermark = self._store(rows, records, skus, None)
+        return records, skus, watermark
+    
+    def _swap(self, built, version, now):
+        self._records, self._skus, self._watermark = built
+        self._version = self._loaded_version = version
+        self._loaded_at = now
+        self._generation += 1
+    
+    def _reload(self, version):
+        """Start a full reload on a background thread; called holding the lock"""
+        self._reloading = self._generation
+        threading.Thread(
+            target=self._reload_in_background,
+            args=(current_app._get_current_object(), version, self._generation),
+            name='product-lookup-reload',
+            daemon=True
+        ).start()
+    
+    def _reload_in_background(self, app, version, generation):
+        # Own app context, so the reload gets its own session
+        with app.app_context():
+            try:
+                built = self._build()
+                with self._lock:
+                    if generation == self._generation:
+                        self._swap(built, version, time.monotonic())
+            except Exception as e:
+                app.logger.warning(f'Product lookup reload failed: {e}')
+            finally:
+                with self._lock:
+                    if self._reloading == generation:
+                        self._reloading = None
+                db.session.remove()
+    
+    def _load_changed(self):
+        """Apply rows changed since the watermark; False when only a full reload can catch up"""
+        if self._watermark is None:
+            return False
+        
+        self._watermark = self._store(db.session.execute(
+            select(*COLUMNS).where(Product.updated_at >= self._watermark - self.slack)
+        ).all(), self._records, self._skus, self._watermark)
+        
+        # Deleted products leave no updated_at behind; the id total also catches
+        # a delete and a create that leave the count unchanged
+        count, id_total = db.session.execute(
+            select(func.count(Product.id), func.coalesce(func.sum(Product.id), 0))
+        ).one()
+        if count == len(self._skus) and id_total == sum(self._skus):
+            return True
+        
+        # Dropping the deleted ids is far cheaper than rebuilding every record
+        ids = set(db.session.execute(select(Product.id)).scalars())
+        for product_id in set(self._skus) - ids:
+            sku = self._skus.pop(product_id)
+            if self._records.get(sku, {}).get('id') == product_id:
+                del self._records[sku]
+        return len(self._skus) == len(ids)
+    
+    def sync(self, force=False):
+        """Bring the index up to date if the refresh interval has passed (or force)"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return
+        
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+                return
+            
+            # Version first: a write landing during the reload only causes one more reload
+            version = get_data_versions(['products'])['products']
+            if self._version is None or force:
+                # Nothing to serve yet (or asked to wait), so build in place
+                self._swap(self._build(), version, now)
+            elif self._reloading is not None:
+                pass  # keep serving the current index until the reload swaps in
+            elif version != self._loaded_version and now - self._loaded_at >= self.full_reload_seconds:
+                # Picks up writes that committed too late for the watermark
+                self._reload(version)
+            elif version != self._version:
+                if self._load_changed():
+                    self._version = version
+                else:
+                    self._reload(version)
+            self._checked_at = now
+    
+    def warm(self):
+        """Build the index now rather than on the first scan"""
+        self.sync(force=True)
+        return len(self._records)
+    
+    def get(self, sku):
+        """Record of the product with this SKU (case and surrounding spaces ignored), or None"""
+        self.sync()
+        return self._records.get(normalize_sku(sku))
+
+
+product_lookup = ProductLookup()
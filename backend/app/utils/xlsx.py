@@ -0,0 +1,59 @@
+"""
+Constant-memory XLSX export
+Rows are written one at a time with XlsxWriter's constant_memory mode into a
+temporary file, which is then sent back in chunks and removed. Memory stays
+flat no matter how many rows the query yields.
+"""
+import os
+import tempfile
+from datetime import datetime
+import xlsxwriter
+from flask import Response
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CHUNK_SIZE = 64 * 1024
+
+# Rows fetched per round trip when streaming export queries
+EXPORT_BATCH_SIZE = 2000
+
+
+def write_xlsx(path, sheet_name, headers, rows):
+    """Write headers and an iterable of row sequences to a single-sheet workbook"""
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, headers, workbook.add_format({'bold': True}))
+        
+        for row_number, row in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+
+def _stream_file(path):
+    try:
+        with open(path, 'rb') as handle:
+            while True:
+                chunk = handle.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def xlsx_response(name, sheet_name, headers, rows):
+    """Build the workbook from rows and return it as a chunked attachment named name_<timestamp>.xlsx"""
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    
+    try:
+        write_xlsx(path, sheet_name, headers, rows)
+    except Exception:
+        os.remove(path)
+        raise
+    
+    filename = f'{name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    response = Response(_stream_file(path), mimetype=XLSX_MIMETYPE, direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,332 @@
+"""
+Benchmark of the hot API endpoints against a generated dataset
+Times each endpoint through the Flask test client (report cache and financial
+snapshot memo off, so every call does the full work), counts its SQL statements
+and writes the results as JSON, tagged with the git commit and the dataset's
+row counts, so runs can be compared across commits. Imports run last, inline,
+on freshly generated sheets; they add rows to the dataset (new SKUs, BENCH-
+invoices and payroll periods after the latest one), so regenerate it for
+strictly repeatable runs.
+
+Usage:
+    python generate_data.py 10k                       # dataset first
+    python benchmark.py run 10k                       # bench/results/10k-<commit>.json
+    python benchmark.py run 1m --repeat 10 --skip-imports
+    python benchmark.py compare bench/results/1m-abc1234.json bench/results/1m-def5678.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import event, select, func
+from app import db
+from app.models import Product, Customer, Sale, SaleItem, User, UserRole, PayrollRecord, InventoryLog, Expense
+from app.utils.xlsx import write_xlsx
+from generate_data import SCALES, BENCH_DIR, database_url, make_app
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# name -> path; every call must answer 200
+ENDPOINTS = {
+    'dashboard_metrics': '/api/v1/dashboard/metrics',
+    'financial_statements': '/api/v1/financial/statements',
+    'financial_statements_last_year': f'/api/v1/financial/statements?year={datetime.now().year - 1}',
+    'sales_list': '/api/v1/sales/?per_page=50',
+    'sales_list_deep_page': '/api/v1/sales/?per_page=50&page=100',
+    'product_search': '/api/v1/products/?search=GEN-0012&per_page=20',
+    'products_export': '/api/v1/excel/products/export',
+    'sales_export': '/api/v1/excel/sales/export',
+    'payroll_export': '/api/v1/excel/payroll/export'
+}
+
+# import type -> rows per generated sheet
+IMPORT_ROWS = {
+    'products': 5_000,
+    'sales': 10_000,
+    'payroll': 2_000
+}
+
+COUNTED_TABLES = (Product, Customer, User, Sale, SaleItem, InventoryLog, Expense, PayrollRecord)
+
+
+# ==================== TIMING ====================
+
+class QueryCounter:
+    """Counts SQL statements run on the engine between reset() calls"""
+    
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+    
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+    
+    def reset(self):
+        self.count = 0
+
+
+def _summary(durations, queries, size):
+    ordered = sorted(durations)
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 2),
+        'median_ms': round(statistics.median(ordered) * 1000, 2),
+        'p95_ms': round(float(np.percentile(ordered, 95)) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'queries': queries,
+        'response_bytes': size
+    }
+
+
+def time_endpoint(client, counter, path, headers, repeat, warmup=1):
+    """Median/p95 of repeat GETs after warmup calls; reads the whole (possibly streamed) body"""
+    durations = []
+    for run in range(warmup + repeat):
+        counter.reset()
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}: {body[:200]!r}')
+        if run >= warmup:
+            durations.append(elapsed)
+    return _summary(durations, counter.count, len(body))
+
+
+# ==================== IMPORT SHEETS ====================
+
+def _products_sheet(path, rows, run_id):
+    categories = ['Building Materials', 'Electrical', 'Plumbing', 'Hardware']
+    write_xlsx(path, 'Products', ['SKU', 'Name', 'Category', 'Item Cost', 'Selling Price', 'Current Stock'], (
+        [f'BENCH-{run_id}-{number:06d}', f'Bench product {number}', categories[number % len(categories)],
+         10 + number % 90, 25 + number % 200, number % 100]
+        for number in range(rows)
+    ))
+
+
+def _sales_sheet(path, rows, run_id):
+    skus, prices = zip(*db.session.execute(
+        select(Product.sku, Product.selling_price).where(Product.is_active.is_(True)).order_by(Product.id).limit(500)
+    ).all())
+    sale_date = datetime.now().strftime('%Y-%m-%d')
+    
+    def lines():
+        # Two lines of two units per invoice
+        for invoice in range(rows // 2):
+            picks = [(invoice * 2 + line) % len(skus) for line in range(2)]
+            line_totals = [round(float(prices[pick]) * 2, 2) for pick in picks]
+            invoice_total = round(sum(line_totals), 2)
+            for pick, line_total in zip(picks, line_totals):
+                yield [f'BENCH-{run_id}-{invoice:06d}', sale_date, f'Bench customer {invoice % 200}', 'paid',
+                       invoice_total, 0, invoice_total, skus[pick], 2, float(prices[pick]), 0, line_total]
+    
+    write_xlsx(path, 'Sales', [
+        'Invoice Number', 'Sale Date', 'Customer', 'Payment Status', 'Sale Subtotal', 'Sale Tax', 'Sale Total',
+        'SKU', 'Quantity', 'Unit Price', 'Discount %', 'Line Total'
+    ], lines())
+
+
+def _payroll_sheet(path, rows, run_id):
+    emails = db.session.execute(
+        select(User.email).where(User.role == UserRole.EMPLOYEE).order_by(User.id)
+    ).scalars().all()
+    # Periods after the latest stored one, so no row is rejected as an overlap
+    latest = db.session.execute(select(func.max(PayrollRecord.pay_period_end))).scalar() or datetime.now().date()
+    
+    def records():
+        for number in range(rows):
+            period, employee = divmod(number, len(emails))
+            start = latest + timedelta(days=1 + 14 * period)
+            yield [emails[employee], start.isoformat(), (start + timedelta(days=13)).isoformat(), 'No',
+                   80, 0, 20, 1600, 0, 0, 1600, 192, 45, 237, 1363]
+    
+    write_xlsx(path, 'Payroll', [
+        'Employee Email', 'Period Start', 'Period End', 'Is Paid', 'Regular Hours', 'Overtime Hours',
+        'Hourly Rate', 'Regular Pay', 'Overtime Pay', 'Bonuses', 'Gross Pay', 'Tax Deductions',
+        'Insurance Deductions', 'Total Deductions', 'Net Pay'
+    ], records())
+
+
+SHEETS = {
+    'products': _products_sheet,
+    'sales': _sales_sheet,
+    'payroll': _payroll_sheet
+}
+
+
+def time_import(client, counter, import_type, headers, rows):
+    """One inline import of a generated sheet; the POST returns once every batch is committed"""
+    run_id = uuid.uuid4().hex[:8]
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    
+    try:
+        SHEETS[import_type](path, rows, run_id)
+        counter.reset()
+        with open(path, 'rb') as sheet:
+            started = time.perf_counter()
+            response = client.post(f'/api/v1/excel/{import_type}/import', headers=headers,
+                                   data={'file': (sheet, f'{import_type}.xlsx')},
+                                   content_type='multipart/form-data')
+            elapsed = time.perf_counter() - started
+    finally:
+        os.remove(path)
+    
+    job = (response.get_json() or {}).get('job') or {}
+    if response.status_code != 202 or job.get('status') != 'processed':
+        raise RuntimeError(f'{import_type} import failed: {response.get_data(as_text=True)[:300]}')
+    
+    result = _summary([elapsed], counter.count, None)
+    result.update(rows=rows, rows_per_second=round(rows / elapsed), counts=job.get('counts'),
+                  errors=job.get('error_count'))
+    return result
+
+
+# ==================== RUN ====================
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale, database=None, repeat=5, imports=True, only=None):
+    url = database_url(scale, database)
+    app = make_app(url)
+    app.config['IMPORT_WORKERS'] = 0
+    app.config['FINANCIAL_SNAPSHOT_TTL'] = 0
+    client = app.test_client()
+    
+    with app.app_context():
+        if not db.session.execute(select(func.count(Sale.id))).scalar():
+            raise RuntimeError(f'No sales in {url}; run generate_data.py {scale} first')
+        row_counts = {
+            model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+            for model in COUNTED_TABLES
+        }
+        
+        login = client.post('/api/v1/auth/login', json={'username': 'admin', 'password': 'admin123'})
+        if login.status_code != 200:
+            raise RuntimeError('Could not log in as admin/admin123')
+        headers = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+        counter = QueryCounter(db.engine)
+        
+        results = {}
+        for name, path in ENDPOINTS.items():
+            if only and not any(part in name for part in only):
+                continue
+            print(f"  {name}")
+            results[name] = dict(path=path, **time_endpoint(client, counter, path, headers, repeat))
+        
+        if imports:
+            for import_type, rows in IMPORT_ROWS.items():
+                name = f'{import_type}_import'
+                if only and not any(part in name for part in only):
+                    continue
+                print(f"  {name}")
+                results[name] = time_import(client, counter, import_type, headers, rows)
+        
+        dialect = db.engine.dialect.name
+    
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'scale': scale,
+        'database': dialect,
+        'repeat': repeat,
+        'row_counts': row_counts,
+        'versions': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'pandas': pd.__version__,
+            'numpy': np.__version__
+        },
+        'results': results
+    }
+
+
+# ==================== COMPARE ====================
+
+def compare(before, after, threshold=10.0):
+    """Print median latency and query changes; returns the names that got slower by more than threshold %"""
+    print(f"\n{'endpoint':<32}{'before ms':>12}{'after ms':>12}{'change':>10}{'queries':>12}")
+    regressions = []
+    
+    for name in sorted(set(before['results']) | set(after['results'])):
+        old, new = before['results'].get(name), after['results'].get(name)
+        if old is None or new is None:
+            print(f"{name:<32}{'only in ' + ('after' if old is None else 'before'):>34}")
+            continue
+        
+        change = (new['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0.0
+        queries = f"{old['queries']} -> {new['queries']}" if old['queries'] != new['queries'] else str(new['queries'])
+        flag = ' !' if change > threshold else ''
+        print(f"{name:<32}{old['median_ms']:>12.1f}{new['median_ms']:>12.1f}{change:>+9.1f}%{queries:>12}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    
+    if before.get('row_counts') != after.get('row_counts'):
+        print("\nNote: the runs used datasets with different row counts")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot API endpoints')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = commands.add_parser('run', help='benchmark a generated dataset')
+    run_parser.add_argument('scale', choices=SCALES)
+    run_parser.add_argument('--database', help='SQLAlchemy URL (default: bench/<scale>.db)')
+    run_parser.add_argument('--repeat', type=int, default=5, help='timed calls per endpoint')
+    run_parser.add_argument('--skip-imports', action='store_true', help='leave the dataset untouched')
+    run_parser.add_argument('--only', nargs='+', help='benchmark names containing any of these')
+    run_parser.add_argument('--output', help='results file (default: bench/results/<scale>-<commit>.json)')
+    
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='slowdown %% reported as a regression')
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == 'compare':
+        with open(args.before, encoding='utf-8') as before, open(args.after, encoding='utf-8') as after:
+            regressions = compare(json.load(before), json.load(after), args.threshold)
+        if regressions:
+            print(f"\nSlower by more than {args.threshold:g}%: {', '.join(regressions)}")
+            return 1
+        return 0
+    
+    print(f"\n=== BENCHMARKING {args.scale} DATASET ===")
+    try:
+        report = run(args.scale, args.database, args.repeat, not args.skip_imports, args.only)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.scale}-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    
+    for name, result in report['results'].items():
+        print(f"  {name:<32}{result['median_ms']:>10.1f} ms{result['queries']:>6} queries")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
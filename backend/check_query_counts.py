@@ -0,0 +1,143 @@
+"""
+Query-count check for serialized list/detail endpoints
+Seeds a throwaway SQLite database twice (small and larger), calls each endpoint
+and fails if any issues more queries than its budget, which must not grow
+with the number of rows returned.
+
+Usage: python check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, date, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import (Category, Product, Customer, Sale, SaleItem, InventoryLog, InventoryStatus,
+                        PayrollRecord, User, Expense, ExpenseCategory)
+from config import TestingConfig
+
+# Maximum queries per request; permission checks read token claims and cost none
+BUDGETS = {
+    '/api/v1/sales/?per_page=50': 3,
+    '/api/v1/sales/{sale_id}': 2,
+    '/api/v1/dashboard/recent-activity?limit=20': 4,
+    '/api/v1/inventory/logs?per_page=50': 2,
+    '/api/v1/inventory/low-stock': 2,
+    '/api/v1/products/?per_page=50': 2,
+    '/api/v1/payroll/records?per_page=50': 2,
+    '/api/v1/payroll/summary': 1,
+    '/api/v1/excel/products/export': 1,
+    '/api/v1/excel/sales/export': 1,
+    '/api/v1/excel/payroll/export': 1
+}
+
+
+def seed(scale):
+    """Create categories, products, sales, logs, expenses and payroll rows"""
+    categories = [Category(name=f'Category {i}') for i in range(scale)]
+    db.session.add_all(categories)
+    db.session.flush()
+    
+    products = [
+        Product(name=f'Product {i}', sku=f'QC-{i:05d}', category_id=categories[i % scale].id,
+                item_cost=10 + i, selling_price=25 + i, tax_amount=0, other_costs=0,
+                current_stock=i % 12, low_stock_threshold=10)
+        for i in range(scale * 10)
+    ]
+    customers = [Customer(name=f'Customer {i}') for i in range(scale * 3)]
+    db.session.add_all(products + customers)
+    db.session.flush()
+    
+    salesperson = User.query.first()
+    now = datetime.now()
+    
+    for i in range(scale * 30):
+        sale = Sale(invoice_number=f'QC-{i:06d}', sale_date=now - timedelta(hours=i),
+                    customer_id=customers[i % len(customers)].id, salesperson_id=salesperson.id,
+                    subtotal=0, total_amount=0)
+        db.session.add(sale)
+        db.session.flush()
+        
+        total = 0
+        for offset in range(1 + i % 3):
+            product = products[(i + offset) % len(products)]
+            db.session.add(SaleItem(sale_id=sale.id, product_id=product.id, quantity=1,
+                                    unit_price=product.selling_price, line_total=product.selling_price))
+            total += product.selling_price
+        sale.subtotal = total
+        sale.total_amount = total
+    
+    for i in range(scale * 30):
+        db.session.add(InventoryLog(product_id=products[i % len(products)].id, quantity=1, type='in',
+                                    stock_date=now - timedelta(hours=i), status=InventoryStatus.COMPLETED))
+        db.session.add(Expense(expense_date=date.today() - timedelta(days=i % 30),
+                               category=ExpenseCategory.OPERATIONAL, description='Supplies', amount=10))
+    
+    for user in User.query.all():
+        for i in range(scale * 5):
+            start = date.today() - timedelta(days=14 * (i + 1))
+            db.session.add(PayrollRecord(employee_id=user.id, pay_period_start=start,
+                                         pay_period_end=start + timedelta(days=13),
+                                         regular_pay=1000, gross_pay=1000, net_pay=900))
+    
+    db.session.commit()
+
+
+def measure(scale):
+    """Return {endpoint: query count} for a database seeded at the given scale"""
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    
+    class QueryCountConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    
+    try:
+        app = create_app(QueryCountConfig)
+        client = app.test_client()
+        
+        with app.app_context():
+            seed(scale)
+            sale_id = Sale.query.order_by(Sale.id).first().id
+            
+            login = client.post('/api/v1/auth/login', json={'username': 'admin', 'password': 'admin123'})
+            headers = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+            
+            # Load the worker's permission version cache, as in steady state
+            client.get('/api/v1/auth/me', headers=headers)
+            
+            statements = []
+            
+            def count(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            
+            event.listen(db.engine, 'before_cursor_execute', count)
+            
+            counts = {}
+            for endpoint in BUDGETS:
+                statements.clear()
+                response = client.get(endpoint.format(sale_id=sale_id), headers=headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{endpoint} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+                counts[endpoint] = len(statements)
+            
+            event.remove(db.engine, 'before_cursor_execute', count)
+            db.session.remove()
+            db.engine.dispose()
+        
+        return counts
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    small = measure(2)
+    large = measure(6)
+    
+    failed = False
+    print(f"{'Endpoint':<48} {'Small':>6} {'Large':>6} {'Budget':>7}")
+    for endpoint, budget in BUDGETS.items():
+        ok = small[endpoint] <= budget and large[endpoint] <= budget
+        failed = failed or not ok
+        print(f"{endpoint:<48} {small[endpoint]:>6} {large[endpoint]:>6} {budget:>7}  {'OK' if ok else 'FAIL'}")
+    
+    sys.exit(1 if failed else 0)
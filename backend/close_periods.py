@@ -0,0 +1,46 @@
+"""
+Close every ended month that is not closed yet, from the first sale up to a
+given month, so financial reports read those months from their snapshots
+
+Balances are recorded as they are now, so backfilled months share today's
+balance sheet; their income and cash flow figures are computed per month.
+
+Usage:
+    python close_periods.py             # through last month
+    python close_periods.py 2025-12     # through December 2025
+"""
+import sys
+from datetime import date
+from sqlalchemy import func
+from app import create_app, db
+from app.models import Sale, PeriodClose
+from app.services.financial import close_period
+from app.utils.periods import add_months
+
+app = create_app()
+
+with app.app_context():
+    last_month = add_months(date.today(), -1)
+    if len(sys.argv) > 1:
+        year, month = map(int, sys.argv[1].split('-'))
+        last_month = min(date(year, month, 1), last_month)
+    
+    first_sale = db.session.query(func.min(Sale.sale_date)).scalar()
+    if first_sale is None:
+        print("No sales recorded; nothing to close")
+        sys.exit(0)
+    
+    closed = {row.period_start for row in PeriodClose.query.all()}
+    
+    print("\n=== CLOSING FINANCIAL PERIODS ===")
+    count = 0
+    month = date(first_sale.year, first_sale.month, 1)
+    while month <= last_month:
+        if month not in closed:
+            close_period(month.year, month.month)
+            db.session.commit()
+            count += 1
+            print(f"  closed {month.isoformat()[:7]}")
+        month = add_months(month, 1)
+    
+    print(f"Closed {count} month(s) through {last_month.isoformat()[:7]}")
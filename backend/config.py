@@ -21,6 +21,9 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Seconds a worker may keep using its cached permission versions, i.e. how
+    # long a token revoked by a role or tab lock change can still be used
+    AUTH_PERMISSIONS_REFRESH = 30
     
     # File Upload Configuration - Unified Storage
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
@@ -34,6 +37,48 @@ class Config:
     # Pagination
     ITEMS_PER_PAGE = 50
     
+    # Report cache - 'memory' is per worker, 'filesystem' is shared by all
+    # gunicorn workers on the host, 'null' disables caching
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'memory')
+    REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(basedir, 'cache', 'reports')
+    REPORT_CACHE_MAX_ENTRIES = 512
+    REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64MB per worker for the memory backend
+    # Seconds an entry may be served. Writes outside the API (expenses, assets,
+    # liabilities, equity, cash flows, settings, budgets) bump no version, so
+    # this is the only bound on how stale reports over them can get
+    REPORT_CACHE_TTL = 300
+    # Seconds a worker reuses a memoized financial period snapshot, for the same
+    # reason; 0 recomputes on every request
+    FINANCIAL_SNAPSHOT_TTL = 300
+    
+    # Request metrics - 'memory' is per worker, 'filesystem' sums all gunicorn
+    # workers on the host, 'null' disables them; GET /metrics needs
+    # "Authorization: Bearer <METRICS_TOKEN>", and without a token answers only
+    # loopback peers (set a token when scraping through a proxy)
+    METRICS_BACKEND = os.environ.get('METRICS_BACKEND', 'memory')
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(basedir, 'cache', 'metrics')
+    METRICS_FLUSH_SECONDS = 5
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Background Excel imports - threads per worker process; 0 runs the import
+    # inside the upload request (hosts without thread support)
+    IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+    IMPORT_BATCH_ROWS = 5000  # rows committed per progress update
+    IMPORT_STALE_SECONDS = 600  # a job silent this long lost its worker
+    
+    # Inventory analysis - default lookback for slow movers (?days= / ?slow_days= override)
+    INVENTORY_SLOW_MOVER_DAYS = 30
+    
+    # Seconds a worker's SKU lookup index may serve before checking the products
+    # data version; bounds how stale a scanned price or stock level can be
+    PRODUCT_LOOKUP_REFRESH = 1
+    # Seconds before the newest updated_at an incremental refresh re-reads from,
+    # for writes that commit after their stamp; once the products version has
+    # moved, a full reload every PRODUCT_LOOKUP_FULL_RELOAD seconds catches the rest
+    PRODUCT_LOOKUP_SLACK = 30
+    PRODUCT_LOOKUP_FULL_RELOAD = 300
+    
     # CORS
     CORS_HEADERS = 'Content-Type'
 
@@ -46,11 +91,15 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
+    # gunicorn runs several workers; /metrics should cover all of them
+    METRICS_BACKEND = os.environ.get('METRICS_BACKEND', 'filesystem')
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'test.db')
+    REPORT_CACHE_BACKEND = 'null'
+    IMPORT_WORKERS = 0
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,453 @@
+"""
+Synthetic dataset generator for load and benchmark testing
+Bulk-loads realistic data at a chosen scale into an empty database: products,
+customers, employees, sales with their sale items and inventory logs, restocks,
+expenses and semi-monthly payroll. Rows are sampled with NumPy a chunk of sales
+at a time and written with bulk INSERTs, then the daily rollups are rebuilt.
+
+The database defaults to bench/<scale>.db next to this script so a configured
+production DATABASE_URL is never touched by accident.
+
+Usage:
+    python generate_data.py 10k                      # 10,000 sales
+    python generate_data.py 1m --days 1095 --seed 7
+    python generate_data.py 10m --database postgresql://localhost/bench
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, date, timedelta
+import numpy as np
+from sqlalchemy import insert, select, func, text
+from app import create_app, db, bcrypt
+from app.models import (Category, Product, Customer, Sale, SaleItem, User, UserRole, PayrollRecord,
+                        InventoryLog, InventoryStatus, Expense, ExpenseCategory)
+from app.services.rollups import refresh_rollups
+from app.utils.cache import bump_data_version
+from config import Config
+
+# Number of sales per scale; everything else is derived from it
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000
+}
+
+SALES_PER_CHUNK = 100_000
+INSERT_BATCH = 20_000
+
+CATEGORIES = [
+    'Building Materials', 'Steel & Metals', 'Wood & Timber', 'Electrical', 'Plumbing', 'Paint & Finishes',
+    'Tools & Equipment', 'Safety Gear', 'Office Supplies', 'Electronics', 'Hardware', 'Services'
+]
+
+EXPENSE_CATEGORIES = list(ExpenseCategory)
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench')
+
+
+def database_url(scale, database=None):
+    return database or 'sqlite:///' + os.path.join(BENCH_DIR, f'{scale}.db')
+
+
+def make_app(url):
+    class GeneratorConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        REPORT_CACHE_BACKEND = 'null'
+        METRICS_BACKEND = 'null'
+    
+    if url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+    return create_app(GeneratorConfig)
+
+
+# ==================== HELPERS ====================
+
+def _insert(model, columns):
+    """Bulk insert from a dict of equal-length arrays, as native Python values"""
+    names = list(columns)
+    values = [columns[name].tolist() if hasattr(columns[name], 'tolist') else list(columns[name]) for name in names]
+    rows = [dict(zip(names, row)) for row in zip(*values)]
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(model), rows[start:start + INSERT_BATCH])
+    return len(rows)
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _money(values):
+    return np.round(values, 2)
+
+
+def _datetimes(start, seconds):
+    """numpy datetime64[us] array start + seconds, which tolist() turns into datetimes"""
+    return np.datetime64(start, 'us') + (np.asarray(seconds) * 1_000_000).astype('timedelta64[us]')
+
+
+def _popularity(rng, count, exponent=0.9):
+    """Zipf-like weights so a few products and customers account for most sales"""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _day_weights(days):
+    """More sales on weekdays and a gentle upward trend over the span"""
+    day_numbers = np.arange(days)
+    weekday = (np.datetime64(date.today() - timedelta(days=days), 'D') + day_numbers).astype('datetime64[D]').view('int64')
+    weekend = ((weekday + 3) % 7) >= 5  # 1970-01-01 was a Thursday
+    weights = (1.0 + day_numbers / days) * np.where(weekend, 0.6, 1.0)
+    return weights / weights.sum()
+
+
+# ==================== MASTER DATA ====================
+
+def generate_master_data(rng, sales_count):
+    products_count = int(np.clip(sales_count // 50, 200, 20_000))
+    customers_count = int(np.clip(sales_count // 20, 100, 200_000))
+    employees_count = int(np.clip(sales_count // 2_000, 20, 5_000))
+    
+    _insert(Category, {'name': np.array(CATEGORIES), 'description': np.array([f'{name} products' for name in CATEGORIES])})
+    category_ids = np.array(db.session.execute(select(Category.id).order_by(Category.id)).scalars().all())
+    
+    first_product = _next_id(Product)
+    selling_price = _money(rng.lognormal(mean=4.0, sigma=1.1, size=products_count).clip(1, 50_000))
+    is_service = rng.random(products_count) < 0.08
+    product_ids = np.arange(first_product, first_product + products_count)
+    _insert(Product, {
+        'id': product_ids,
+        'name': np.char.add('Product ', product_ids.astype(str)),
+        'sku': np.char.add('GEN-', np.char.zfill(product_ids.astype(str), 6)),
+        'description': np.full(products_count, 'Generated product'),
+        'category_id': rng.choice(category_ids, products_count),
+        'item_cost': _money(selling_price * rng.uniform(0.4, 0.8, products_count)),
+        'tax_amount': np.zeros(products_count),
+        'other_costs': np.zeros(products_count),
+        'selling_price': selling_price,
+        'is_service': is_service,
+        'track_inventory': ~is_service,
+        'current_stock': np.where(is_service, 0, rng.integers(0, 500, products_count)),
+        'low_stock_threshold': rng.choice([5, 10, 20, 50], products_count),
+        'is_active': np.ones(products_count, dtype=bool)
+    })
+    
+    first_customer = _next_id(Customer)
+    customer_ids = np.arange(first_customer, first_customer + customers_count)
+    _insert(Customer, {
+        'id': customer_ids,
+        'name': np.char.add('Customer ', customer_ids.astype(str)),
+        'email': np.char.add(np.char.add('customer', customer_ids.astype(str)), '@example.com')
+    })
+    
+    # One bcrypt hash shared by every generated employee (password: password123)
+    password_hash = bcrypt.generate_password_hash('password123').decode('utf-8')
+    first_user = _next_id(User)
+    user_ids = np.arange(first_user, first_user + employees_count)
+    hourly_rate = _money(rng.uniform(8, 60, employees_count))
+    _insert(User, {
+        'id': user_ids,
+        'username': np.char.add('gen_employee_', user_ids.astype(str)),
+        'email': np.char.add(np.char.add('employee', user_ids.astype(str)), '@example.com'),
+        'password_hash': np.full(employees_count, password_hash),
+        'first_name': np.full(employees_count, 'Employee'),
+        'last_name': user_ids.astype(str),
+        'role': [UserRole.EMPLOYEE] * employees_count,
+        'is_active': np.ones(employees_count, dtype=bool),
+        'department': rng.choice(['Sales', 'Warehouse', 'Operations', 'Finance', 'Engineering'], employees_count),
+        'position': rng.choice(['Staff', 'Senior Staff', 'Supervisor', 'Manager'], employees_count),
+        'hourly_rate': hourly_rate
+    })
+    
+    db.session.commit()
+    
+    return {
+        'product_ids': product_ids,
+        'product_price': selling_price,
+        'product_tracked': ~is_service,
+        'product_weights': _popularity(rng, products_count),
+        'customer_ids': customer_ids,
+        'customer_weights': _popularity(rng, customers_count, exponent=0.7),
+        'salesperson_ids': db.session.execute(
+            select(User.id).where(User.role.in_([UserRole.ADMIN, UserRole.OPERATIONS_MANAGER]))
+        ).scalars().all() or user_ids[:5].tolist(),
+        'employee_ids': user_ids,
+        'hourly_rate': hourly_rate
+    }
+
+
+# ==================== SALES ====================
+
+def generate_sales(rng, master, sales_count, days):
+    """Sales, their items and the matching stock-out logs, a chunk of sales at a time"""
+    start = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    day_weights = _day_weights(days)
+    
+    # Sale days for the whole run, sorted so invoice numbers follow the date
+    sale_days = np.sort(rng.choice(days, size=sales_count, p=day_weights))
+    seconds = sale_days * 86_400 + rng.integers(8 * 3_600, 20 * 3_600, sales_count)
+    seconds.sort()
+    # Per-day sequence numbers for INV-YYYYMMDD-NNNN
+    day_starts = np.searchsorted(sale_days, sale_days, side='left')
+    day_sequence = np.arange(sales_count) - day_starts + 1
+    
+    first_sale = _next_id(Sale)
+    first_item = _next_id(SaleItem)
+    totals = {'sales': 0, 'sale_items': 0, 'inventory_logs': 0}
+    
+    for chunk_start in range(0, sales_count, SALES_PER_CHUNK):
+        chunk_end = min(chunk_start + SALES_PER_CHUNK, sales_count)
+        count = chunk_end - chunk_start
+        sale_ids = np.arange(first_sale + chunk_start, first_sale + chunk_end)
+        sale_dates = _datetimes(start, seconds[chunk_start:chunk_end])
+        day_text = sale_dates.astype('datetime64[D]').astype(str)
+        invoice_numbers = [
+            f"INV-{day.replace('-', '')}-{number:04d}"
+            for day, number in zip(day_text.tolist(), day_sequence[chunk_start:chunk_end].tolist())
+        ]
+        
+        # Items: 1-6 lines per sale, popular products more often
+        lines = np.minimum(rng.geometric(0.45, count), 6)
+        item_sale = np.repeat(np.arange(count), lines)
+        item_product = rng.choice(len(master['product_ids']), size=len(item_sale), p=master['product_weights'])
+        quantity = np.minimum(rng.geometric(0.5, len(item_sale)), 20)
+        unit_price = master['product_price'][item_product]
+        discount = np.where(rng.random(len(item_sale)) < 0.1, rng.choice([5, 10, 15], len(item_sale)), 0)
+        line_total = _money(unit_price * quantity * (1 - discount / 100))
+        
+        subtotal = _money(np.bincount(item_sale, weights=line_total, minlength=count))
+        tax_rate = np.where(rng.random(count) < 0.5, 12.0, 0.0)
+        tax_amount = _money(subtotal * tax_rate / 100)
+        total_amount = _money(subtotal + tax_amount)
+        
+        status = rng.choice(['paid', 'pending', 'partial'], count, p=[0.9, 0.07, 0.03])
+        amount_paid = np.select(
+            [status == 'paid', status == 'partial'],
+            [total_amount, _money(total_amount * rng.uniform(0.2, 0.8, count))],
+            0
+        )
+        walk_in = rng.random(count) < 0.3
+        customer = rng.choice(master['customer_ids'], size=count, p=master['customer_weights'])
+        
+        totals['sales'] += _insert(Sale, {
+            'id': sale_ids,
+            'invoice_number': invoice_numbers,
+            'sale_date': sale_dates,
+            'customer_id': [None if none else value for none, value in zip(walk_in.tolist(), customer.tolist())],
+            'salesperson_id': rng.choice(master['salesperson_ids'], count),
+            'subtotal': subtotal,
+            'discount_percentage': np.zeros(count),
+            'discount_amount': np.zeros(count),
+            'tax_rate': tax_rate,
+            'tax_amount': tax_amount,
+            'total_amount': total_amount,
+            'payment_status': status,
+            'amount_paid': amount_paid,
+            'created_at': sale_dates,
+            'updated_at': sale_dates
+        })
+        
+        item_count = len(item_sale)
+        totals['sale_items'] += _insert(SaleItem, {
+            'id': np.arange(first_item, first_item + item_count),
+            'sale_id': sale_ids[item_sale],
+            'product_id': master['product_ids'][item_product],
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'discount_percentage': discount.astype(float),
+            'line_total': line_total
+        })
+        first_item += item_count
+        
+        # Stock-out log per tracked line, as the sale endpoints write
+        tracked = master['product_tracked'][item_product]
+        log_dates = sale_dates[item_sale[tracked]]
+        totals['inventory_logs'] += _insert(InventoryLog, {
+            'product_id': master['product_ids'][item_product[tracked]],
+            'stock_date': log_dates,
+            'quantity': quantity[tracked],
+            'type': np.full(int(tracked.sum()), 'out'),
+            'status': [InventoryStatus.COMPLETED] * int(tracked.sum()),
+            'reference_number': np.array(invoice_numbers, dtype=object)[item_sale[tracked]],
+            'balance_after': rng.integers(0, 500, int(tracked.sum())),
+            'notes': np.full(int(tracked.sum()), 'Generated sale'),
+            'created_at': log_dates
+        })
+        
+        db.session.commit()
+        print(f"  sales {chunk_end:,}/{sales_count:,}")
+    
+    return totals
+
+
+def generate_restocks(rng, master, sales_count, days):
+    tracked_ids = master['product_ids'][master['product_tracked']]
+    count = max(sales_count // 20, 100)
+    start = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    stock_dates = _datetimes(start, np.sort(rng.integers(0, days * 86_400, count)))
+    
+    inserted = _insert(InventoryLog, {
+        'product_id': rng.choice(tracked_ids, count),
+        'stock_date': stock_dates,
+        'quantity': rng.integers(10, 500, count),
+        'type': np.full(count, 'in'),
+        'status': [InventoryStatus.COMPLETED] * count,
+        'reference_number': np.char.add('PO-', np.arange(1, count + 1).astype(str)),
+        'balance_after': rng.integers(10, 1_000, count),
+        'notes': np.full(count, 'Generated restock'),
+        'created_at': stock_dates
+    })
+    db.session.commit()
+    return inserted
+
+
+def generate_expenses(rng, sales_count, days):
+    count = max(sales_count // 20, 100)
+    expense_days = rng.integers(0, days, count)
+    categories = rng.integers(0, len(EXPENSE_CATEGORIES), count)
+    first_day = np.datetime64(date.today() - timedelta(days=days), 'D')
+    
+    inserted = _insert(Expense, {
+        'expense_date': (first_day + expense_days).astype('datetime64[D]'),
+        'category': [EXPENSE_CATEGORIES[index] for index in categories.tolist()],
+        'description': np.full(count, 'Generated expense'),
+        'amount': _money(rng.lognormal(5.0, 1.0, count).clip(5, 100_000)),
+        'payment_method': rng.choice(['cash', 'bank_transfer', 'credit_card', 'check'], count),
+        'vendor': np.char.add('Vendor ', rng.integers(1, 500, count).astype(str))
+    })
+    db.session.commit()
+    return inserted
+
+
+def generate_payroll(rng, master, days):
+    """Semi-monthly payroll for every generated employee over the span"""
+    periods = []
+    day = date.today() - timedelta(days=days)
+    day = day.replace(day=1 if day.day <= 15 else 16)
+    while day < date.today():
+        end = day.replace(day=15) if day.day == 1 else (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        periods.append((day, end))
+        day = end + timedelta(days=1)
+    
+    employees = master['employee_ids']
+    starts = np.array([start for start, _ in periods], dtype='datetime64[D]')
+    ends = np.array([end for _, end in periods], dtype='datetime64[D]')
+    employee = np.repeat(employees, len(periods))
+    rate = np.repeat(master['hourly_rate'], len(periods))
+    period = np.tile(np.arange(len(periods)), len(employees))
+    count = len(employee)
+    
+    regular_hours = _money(rng.normal(80, 6, count).clip(40, 88))
+    overtime_hours = _money(np.where(rng.random(count) < 0.3, rng.uniform(1, 12, count), 0))
+    regular_pay = _money(regular_hours * rate)
+    overtime_pay = _money(overtime_hours * rate * 1.5)
+    bonuses = _money(np.where(rng.random(count) < 0.05, rng.uniform(50, 500, count), 0))
+    gross_pay = _money(regular_pay + overtime_pay + bonuses)
+    tax = _money(gross_pay * 0.12)
+    insurance = _money(np.full(count, 45.0))
+    deductions = _money(tax + insurance)
+    # Everything but the latest period has been paid
+    is_paid = period < len(periods) - 1
+    payment_date = (ends[period] + np.timedelta64(1, 'D')).astype(object)
+    
+    inserted = _insert(PayrollRecord, {
+        'employee_id': employee,
+        'pay_period_start': starts[period],
+        'pay_period_end': ends[period],
+        'regular_hours': regular_hours,
+        'overtime_hours': overtime_hours,
+        'hourly_rate': rate,
+        'overtime_rate': _money(rate * 1.5),
+        'regular_pay': regular_pay,
+        'overtime_pay': overtime_pay,
+        'bonuses': bonuses,
+        'gross_pay': gross_pay,
+        'tax_deductions': tax,
+        'insurance_deductions': insurance,
+        'other_deductions': np.zeros(count),
+        'total_deductions': deductions,
+        'net_pay': _money(gross_pay - deductions),
+        'is_paid': is_paid,
+        'payment_date': [paid_on if paid else None for paid, paid_on in zip(is_paid.tolist(), payment_date.tolist())],
+        'payment_method': np.where(is_paid, 'bank_transfer', None)
+    })
+    db.session.commit()
+    return inserted
+
+
+# ==================== DRIVER ====================
+
+def _sync_sequences():
+    """PostgreSQL serial sequences do not see explicit ids; move them past the loaded rows"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in (Product, Customer, User, Sale, SaleItem):
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+    db.session.commit()
+
+
+def generate(sales_count, days=730, seed=42):
+    """Load a dataset of sales_count sales over the last days days; returns row counts per table"""
+    if db.session.execute(select(func.count(Sale.id))).scalar():
+        raise RuntimeError('The target database already has sales; generate into an empty database')
+    
+    if db.engine.dialect.name == 'sqlite':
+        # Bulk loading only; the file is rebuilt if the load is interrupted
+        db.session.execute(text('PRAGMA synchronous = OFF'))
+        db.session.execute(text('PRAGMA journal_mode = WAL'))
+    
+    rng = np.random.default_rng(seed)
+    counts = {}
+    
+    started = time.perf_counter()
+    master = generate_master_data(rng, sales_count)
+    counts.update(products=len(master['product_ids']), customers=len(master['customer_ids']),
+                  employees=len(master['employee_ids']))
+    
+    counts.update(generate_sales(rng, master, sales_count, days))
+    counts['inventory_logs'] += generate_restocks(rng, master, sales_count, days)
+    counts['expenses'] = generate_expenses(rng, sales_count, days)
+    counts['payroll_records'] = generate_payroll(rng, master, days)
+    _sync_sequences()
+    
+    print("  rebuilding daily rollups")
+    refresh_rollups()
+    bump_data_version('products', 'sales', 'inventory_logs', 'expenses', 'payroll_records')
+    db.session.commit()
+    
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load a synthetic dataset')
+    parser.add_argument('scale', choices=SCALES, help='number of sales to generate')
+    parser.add_argument('--database', help='SQLAlchemy URL (default: bench/<scale>.db)')
+    parser.add_argument('--days', type=int, default=730, help='span of sale dates ending today')
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible datasets')
+    args = parser.parse_args(argv)
+    
+    url = database_url(args.scale, args.database)
+    print(f"\n=== GENERATING {args.scale} DATASET INTO {url} ===")
+    
+    app = make_app(url)
+    with app.app_context():
+        try:
+            counts = generate(SCALES[args.scale], days=args.days, seed=args.seed)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+    
+    for table, count in counts.items():
+        print(f"  {table:<16} {count:>12,}" if table != 'seconds' else f"  done in {count}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Rebuild the daily sales/expense rollup tables from the raw sales and expenses
+
+Usage:
+    python rebuild_rollups.py                          # all days
+    python rebuild_rollups.py 2025-01-01 2025-12-31    # inclusive date range
+"""
+import sys
+from datetime import date
+from app import create_app, db
+from app.services.rollups import refresh_rollups
+from app.utils.cache import bump_data_version
+
+app = create_app()
+
+with app.app_context():
+    start = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    end = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+    
+    print("\n=== REBUILDING DAILY ROLLUPS ===")
+    days = refresh_rollups(start, end)
+    bump_data_version('sales', 'expenses')
+    db.session.commit()
+    print(f"Rebuilt {days} day(s) from {start or 'the first sale'} to {end or 'today'}")
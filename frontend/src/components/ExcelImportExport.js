@@ -10,6 +10,7 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
   const [downloading, setDownloading] = useState(false);
   const [uploadResult, setUploadResult] = useState(null);
   const [error, setError] = useState('');
+  const [progress, setProgress] = useState(null);
 
   const handleFileUpload = async (event) => {
     const file = event.target.files[0];
@@ -40,7 +41,12 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
           },
         });
 
-        setUploadResult(response.data);
+        // The import runs in the background; poll the job until it finishes
+        const job = await waitForImport(response.data.job);
+        if (job.status === 'failed') {
+          setError(job.message || 'Import failed');
+        }
+        setUploadResult({ ...job.counts, errors: job.errors, errorCount: job.error_count, jobId: job.id, hasErrorReport: job.has_error_report });
         
         // Call parent callback to refresh data
         if (onImportSuccess) {
@@ -50,7 +56,7 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
         // Store in IndexedDB for offline access
         if ('indexedDB' in window) {
           const db = await openDB();
-          await saveToIndexedDB(db, module, response.data);
+          await saveToIndexedDB(db, module, job);
         }
       } else {
         // Offline: Queue for later sync
@@ -84,6 +90,35 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
     }
   };
 
+  const waitForImport = async (job) => {
+    while (job.status === 'uploaded' || job.status === 'processing') {
+      setProgress(job);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = (await api.get(`/excel/imports/${job.id}`)).data;
+    }
+    setProgress(null);
+    return job;
+  };
+
+  const handleErrorReport = async (jobId) => {
+    try {
+      const response = await api.get(`/excel/imports/${jobId}/errors`, {
+        responseType: 'blob',
+      });
+
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', `${module}_import_errors.xlsx`);
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+    } catch (err) {
+      setError('Failed to download error report');
+    }
+  };
+
   const handleExport = async () => {
     setDownloading(true);
     setError('');
@@ -206,7 +241,7 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
           startIcon={uploading ? <CircularProgress size={20} color="inherit" /> : <UploadFileIcon />}
           disabled={uploading}
         >
-          {uploading ? 'Uploading...' : 'Import Excel'}
+          {uploading ? (progress ? `Importing... ${progress.progress}%` : 'Uploading...') : 'Import Excel'}
           <input
             type="file"
             hidden
@@ -257,6 +292,12 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
               {uploadResult.updated > 0 && (
                 <Typography variant="body2">✓ Updated: {uploadResult.updated} records</Typography>
               )}
+              {uploadResult.merged > 0 && (
+                <Typography variant="body2">✓ Merged: {uploadResult.merged} records</Typography>
+              )}
+              {uploadResult.skipped > 0 && (
+                <Typography variant="body2">Skipped: {uploadResult.skipped} existing records</Typography>
+              )}
               {uploadResult.errors && uploadResult.errors.length > 0 && (
                 <Box sx={{ mt: 1 }}>
                   <Typography variant="body2" color="error">
@@ -267,11 +308,16 @@ const ExcelImportExport = ({ module, onImportSuccess }) => {
                       • {err}
                     </Typography>
                   ))}
-                  {uploadResult.errors.length > 5 && (
+                  {(uploadResult.errorCount || uploadResult.errors.length) > 5 && (
                     <Typography variant="caption" color="text.secondary">
-                      ... and {uploadResult.errors.length - 5} more errors
+                      ... and {(uploadResult.errorCount || uploadResult.errors.length) - 5} more errors
                     </Typography>
                   )}
+                  {uploadResult.hasErrorReport && (
+                    <Button size="small" onClick={() => handleErrorReport(uploadResult.jobId)}>
+                      Download error report
+                    </Button>
+                  )}
                 </Box>
               )}
             </>